@@ -0,0 +1,6 @@
+"""Performance benchmarks for canlogconvert
+
+Generate a synthetic trace with ``python -m benchmarks.generate``, or run the
+whole suite with ``python -m benchmarks.run``, which writes its results as
+JSON so that they can be compared across versions.
+"""
@@ -0,0 +1,243 @@
+"""Generate synthetic TRC files
+
+The output only depends on the options and the seed, so the same trace can
+be regenerated to compare results across versions.
+"""
+from __future__ import print_function
+
+import argparse
+import random
+import sys
+
+# The data length of every CAN FD DLC
+_FD_DATA_LENGTHS = [0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20, 24, 32, 48, 64]
+
+_HEADER = """\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+;
+;   Start time: 2019-01-09 18:34:16.883.5
+;   Generated by canlogconvert benchmarks
+;---+--- ------+------ +- +- --+----- +- +- +--- +- -- -- -- -- -- -- --
+"""
+
+DEFAULT_DLC_WEIGHTS = {dlc: 1 for dlc in range(9)}
+
+
+class TraceOptions(object):
+    """The shape of a generated trace
+
+    Attributes:
+        rows (int): the number of messages
+        buses (int): the number of buses messages are spread across
+        ids (int): the number of distinct arbitration IDs
+        extended_share (float): the share of IDs that are extended (29-bit)
+        dlc_weights (dict): the relative weight of every classic CAN DLC
+        fd_share (float): the share of IDs that are sent as CAN FD frames
+        seed (int): the seed of the random number generator
+    """
+
+    def __init__(
+        self,
+        rows=100000,
+        buses=1,
+        ids=100,
+        extended_share=0.2,
+        dlc_weights=None,
+        fd_share=0.0,
+        seed=0,
+    ):
+        self.rows = rows
+        self.buses = buses
+        self.ids = ids
+        self.extended_share = extended_share
+        self.dlc_weights = dlc_weights or DEFAULT_DLC_WEIGHTS
+        self.fd_share = fd_share
+        self.seed = seed
+
+    def as_dict(self):
+        """dict: the options, for reporting alongside results"""
+        return {
+            "rows": self.rows,
+            "buses": self.buses,
+            "ids": self.ids,
+            "extended_share": self.extended_share,
+            "dlc_weights": {str(k): v for k, v in sorted(self.dlc_weights.items())},
+            "fd_share": self.fd_share,
+            "seed": self.seed,
+        }
+
+
+def _make_senders(options, rng):
+    """Pick the bus, ID, direction, type and DLC of every distinct ID
+
+    Like on a real bus, every ID is always sent with the same DLC.
+    """
+    dlcs = sorted(options.dlc_weights)
+    weights = [options.dlc_weights[dlc] for dlc in dlcs]
+
+    senders = []
+    for _ in range(options.ids):
+        if rng.random() < options.extended_share:
+            arbitration_id = "%08X" % rng.randint(0x800, 0x1FFFFFFF)
+        else:
+            arbitration_id = "%04X" % rng.randint(0, 0x7FF)
+
+        if rng.random() < options.fd_share:
+            message_type = rng.choice(["FD", "FB"])
+            dlc = rng.randint(0, 15)
+            length = _FD_DATA_LENGTHS[dlc]
+        else:
+            message_type = "DT"
+            dlc = rng.choices(dlcs, weights)[0]
+            length = min(dlc, 8)
+
+        senders.append(
+            (
+                rng.randint(1, options.buses),
+                arbitration_id,
+                rng.choice(["Rx", "Tx"]),
+                message_type,
+                dlc,
+                length,
+            )
+        )
+    return senders
+
+
+def _random_bytes(rng, length):
+    # The same bytes as Random.randbytes, which needs Python 3.9
+    if not length:
+        return b""
+    return rng.getrandbits(length * 8).to_bytes(length, "little")
+
+
+def iter_lines(options):
+    """Generate the lines of a TRC file
+
+    Args:
+        options (TraceOptions): the shape of the trace
+
+    Returns:
+        iterator: the lines of the file, including their line terminators
+    """
+    rng = random.Random(options.seed)
+    senders = _make_senders(options, rng)
+
+    yield _HEADER
+    timestamp = 0.0
+    for number in range(1, options.rows + 1):
+        timestamp += rng.expovariate(1.0)
+        bus, arbitration_id, direction, message_type, dlc, length = rng.choice(senders)
+        data = " ".join("%02X" % byte for byte in _random_bytes(rng, length))
+        yield "%8d%14.3f %s %-2d%9s %s -  %-4d %s\n" % (
+            number,
+            timestamp,
+            message_type,
+            bus,
+            arbitration_id,
+            direction,
+            dlc,
+            data,
+        )
+
+
+def generate_string(options):
+    """Generate a TRC file as a string
+
+    Args:
+        options (TraceOptions): the shape of the trace
+
+    Returns:
+        str
+    """
+    return "".join(iter_lines(options))
+
+
+def generate_file(path, options):
+    """Generate a TRC file at the given path
+
+    Args:
+        path (str): the path of the file
+        options (TraceOptions): the shape of the trace
+    """
+    with open(path, "w") as fout:
+        fout.writelines(iter_lines(options))
+
+
+def _parse_dlc_weight(value):
+    dlc, weight = value.split("=")
+    return int(dlc), float(weight)
+
+
+def add_options_arguments(parser):
+    """Add the options of TraceOptions to an argument parser
+
+    Args:
+        parser (argparse.ArgumentParser): the parser to add the options to
+    """
+    defaults = TraceOptions()
+    parser.add_argument("--rows", type=int, default=defaults.rows)
+    parser.add_argument("--buses", type=int, default=defaults.buses)
+    parser.add_argument(
+        "--ids", type=int, default=defaults.ids, help="Number of distinct IDs."
+    )
+    parser.add_argument(
+        "--extended-share",
+        type=float,
+        default=defaults.extended_share,
+        help="Share of extended (29-bit) IDs.",
+    )
+    parser.add_argument(
+        "--dlc",
+        dest="dlc_weights",
+        metavar="DLC=WEIGHT",
+        type=_parse_dlc_weight,
+        action="append",
+        help="Relative weight of a classic CAN DLC. May be given more than "
+        "once (default: all DLCs equally likely).",
+    )
+    parser.add_argument(
+        "--fd-share",
+        type=float,
+        default=defaults.fd_share,
+        help="Share of IDs sent as CAN FD frames.",
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def options_from_args(args):
+    """Create TraceOptions from the arguments added by add_options_arguments"""
+    return TraceOptions(
+        rows=args.rows,
+        buses=args.buses,
+        ids=args.ids,
+        extended_share=args.extended_share,
+        dlc_weights=dict(args.dlc_weights) if args.dlc_weights else None,
+        fd_share=args.fd_share,
+        seed=args.seed,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic TRC file.")
+    parser.add_argument(
+        "-O",
+        metavar="outfile",
+        dest="outfile",
+        default="-",
+        help="Output trace file, or '-' for stdout (default).",
+    )
+    add_options_arguments(parser)
+    args = parser.parse_args(argv)
+
+    options = options_from_args(args)
+    if args.outfile == "-":
+        sys.stdout.writelines(iter_lines(options))
+    else:
+        generate_file(args.outfile, options)
+
+
+if __name__ == "__main__":
+    main()
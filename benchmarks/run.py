@@ -0,0 +1,367 @@
+"""Run the benchmark suite and report the results as JSON
+
+Every benchmark is timed ``--repeat`` times and the fastest run is
+reported. Peak memory is measured by a separate run under tracemalloc, so it
+does not slow down the timed runs. The end-to-end benchmarks run the
+``canlogconvert convert`` command in a child process, and report its wall
+time including interpreter start up, and its peak resident set size.
+
+The start-up benchmarks measure the time taken to import canlogconvert with
+``python -X importtime``, and check that the modules which are only needed by
+some conversions, such as pyparsing and Jinja, are not imported up front.
+
+Example:
+
+    python -m benchmarks.run --rows 100000 -O results.json
+"""
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+from benchmarks import generate
+from canlogconvert.traces.formats import asc
+from canlogconvert.traces.formats import trc
+
+
+class Result(object):
+    """The measurements of a single benchmark
+
+    Benchmarks that do not process a trace have no rows or size.
+    """
+
+    def __init__(self, name, group, seconds, rows, size, peak_memory, details=None):
+        self.name = name
+        self.group = group
+        self.seconds = seconds
+        self.rows = rows
+        self.size = size
+        self.peak_memory = peak_memory
+        self.details = details
+
+    def as_dict(self):
+        result = {
+            "name": self.name,
+            "group": self.group,
+            "seconds": self.seconds,
+            "rows_per_second": self._rate(self.rows),
+            "bytes_per_second": self._rate(self.size),
+            "peak_memory_bytes": self.peak_memory,
+        }
+        if self.details is not None:
+            result["details"] = self.details
+        return result
+
+    def _rate(self, amount):
+        if amount is None or not self.seconds:
+            return None
+        return amount / self.seconds
+
+
+def _time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+_PEAK_RSS_PREFIX = "peak_rss="
+
+# Runs canlogconvert and reports its peak resident set size. The peak is read
+# from /proc rather than getrusage, which carries over the peak of the forked
+# benchmark process.
+_END_TO_END_SCRIPT = """
+import sys
+from canlogconvert import _main
+
+sys.argv[0] = "canlogconvert"
+try:
+    _main()
+finally:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    kib = int(line.split()[1])
+                    sys.stderr.write("peak_rss=%d\\n" % (kib * 1024))
+    except IOError:
+        pass
+"""
+
+
+# Modules that canlogconvert only imports once they are needed. They take a
+# good part of the start-up time, so importing any of them up front is a
+# start-up regression.
+DEFERRED_MODULES = ("jinja2", "pyparsing", "multiprocessing", "json", "numpy")
+
+_IMPORT_TIME_PREFIX = "import time:"
+
+
+def import_times(module="canlogconvert"):
+    """Import a module in a new interpreter, and time the imports
+
+    Args:
+        module (str): the module to import
+
+    Returns:
+        dict: the cumulative import time in seconds of every module that was
+            imported, by name, as reported by ``python -X importtime``
+    """
+    command = [sys.executable, "-X", "importtime", "-c", "import " + module]
+    process = subprocess.Popen(command, stderr=subprocess.PIPE)
+    _, stderr = process.communicate()
+    if process.returncode:
+        raise RuntimeError("import {} failed: {}".format(module, stderr.decode()))
+
+    times = {}
+    for line in stderr.decode().splitlines():
+        if not line.startswith(_IMPORT_TIME_PREFIX):
+            continue
+        _, cumulative, name = line[len(_IMPORT_TIME_PREFIX) :].split("|")
+        # Skip the heading of the report
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def _consume(messages):
+    for _ in messages:
+        pass
+
+
+class Suite(object):
+    """The benchmarks, run against a single generated trace"""
+
+    def __init__(self, options, directory, repeat=3):
+        self._options = options
+        self._directory = directory
+        self._repeat = repeat
+
+        self._trc_path = os.path.join(directory, "trace.trc")
+        generate.generate_file(self._trc_path, options)
+        with open(self._trc_path) as fin:
+            self._trc_string = fin.read()
+        self._size = os.path.getsize(self._trc_path)
+        self._trace = trc.load_string(self._trc_string)
+        self._messages = list(self._trace.messages)
+
+    @property
+    def size(self):
+        """int: the size of the generated trace in bytes"""
+        return self._size
+
+    def _in_process(self, name, group, function):
+        return Result(
+            name,
+            group,
+            _time(function, self._repeat),
+            self._options.rows,
+            self._size,
+            _peak_memory(function),
+        )
+
+    def _end_to_end(self, name, arguments, group="convert", rows=True):
+        command = [sys.executable, "-W", "ignore", "-c", _END_TO_END_SCRIPT]
+        command += arguments
+        best = None
+        peak_memory = None
+        for _ in range(self._repeat):
+            started = time.perf_counter()
+            process = subprocess.Popen(
+                command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+            )
+            _, stderr = process.communicate()
+            elapsed = time.perf_counter() - started
+            if process.returncode:
+                raise RuntimeError(
+                    "{} failed: {}".format(" ".join(arguments), stderr.decode())
+                )
+
+            best = elapsed if best is None else min(best, elapsed)
+            for line in stderr.decode().splitlines():
+                if line.startswith(_PEAK_RSS_PREFIX):
+                    peak_memory = max(
+                        peak_memory or 0, int(line[len(_PEAK_RSS_PREFIX) :])
+                    )
+        return Result(
+            name,
+            group,
+            best,
+            self._options.rows if rows else None,
+            self._size if rows else None,
+            peak_memory,
+        )
+
+    def parse(self):
+        def load_stream():
+            with open(self._trc_path) as fin:
+                _consume(trc.iter_messages(fin))
+
+        def load_buffer():
+            with open(self._trc_path, "rb") as fin:
+                _consume(trc.iter_messages(fin.read()))
+
+        return [
+            self._in_process(
+                "load_string", "parse", lambda: trc.load_string(self._trc_string)
+            ),
+            self._in_process("iter_messages_text", "parse", load_stream),
+            self._in_process("iter_messages_buffer", "parse", load_buffer),
+            self._in_process(
+                "load_path", "parse", lambda: trc.load_path(self._trc_path)
+            ),
+        ]
+
+    def serialize(self):
+        def write(writer, messages):
+            with writer(io.StringIO(), self._trace.start_timestamp) as output:
+                output.write_messages(messages)
+
+        return [
+            self._in_process("as_trc_string", "serialize", self._trace.as_trc_string),
+            self._in_process("as_asc_string", "serialize", self._trace.as_asc_string),
+            self._in_process(
+                "TrcWriter", "serialize", lambda: write(trc.TrcWriter, self._messages)
+            ),
+            self._in_process(
+                "AscWriter", "serialize", lambda: write(asc.AscWriter, self._messages)
+            ),
+            self._in_process(
+                "AscWriter_columns",
+                "serialize",
+                lambda: write(asc.AscWriter, self._trace.messages),
+            ),
+        ]
+
+    def convert(self):
+        results = []
+        for extension in (".trc", ".asc", ".cltb"):
+            output = os.path.join(self._directory, "output" + extension)
+            results.append(
+                self._end_to_end(
+                    "convert_trc_to_" + extension[1:],
+                    ["convert", "-I", self._trc_path, "-O", output],
+                )
+            )
+        return results
+
+    def startup(self):
+        best = None
+        for _ in range(self._repeat):
+            times = import_times()
+            if best is None or times["canlogconvert"] < best["canlogconvert"]:
+                best = times
+
+        return [
+            Result(
+                "import_canlogconvert",
+                "startup",
+                best["canlogconvert"],
+                None,
+                None,
+                None,
+                details={
+                    "deferred_modules_imported": [
+                        module for module in DEFERRED_MODULES if module in best
+                    ]
+                },
+            ),
+            self._end_to_end("version", ["--version"], "startup", rows=False),
+        ]
+
+
+# The groups of benchmarks, in the order they are run
+GROUPS = ["parse", "serialize", "convert", "startup"]
+
+
+def run(options, groups=GROUPS, repeat=3):
+    """Run the benchmark suite
+
+    Args:
+        options (generate.TraceOptions): the shape of the generated trace
+        groups (list): the groups of benchmarks to run
+        repeat (int): the number of timed runs of every benchmark
+
+    Returns:
+        dict: the results, ready to be serialized as JSON
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        suite = Suite(options, directory, repeat)
+        results = []
+        for group in groups:
+            results.extend(getattr(suite, group)())
+        size = suite.size
+    finally:
+        shutil.rmtree(directory)
+
+    return {
+        "python": platform.python_implementation() + " " + platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "trace": dict(options.as_dict(), bytes=size),
+        "repeat": repeat,
+        "results": [result.as_dict() for result in results],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument(
+        "-O",
+        metavar="outfile",
+        dest="outfile",
+        default="-",
+        help="Output JSON file, or '-' for stdout (default).",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--group",
+        dest="groups",
+        action="append",
+        choices=GROUPS,
+        help="Only run this group of benchmarks. May be given more than once.",
+    )
+    generate.add_options_arguments(parser)
+    args = parser.parse_args(argv)
+
+    # The grammar's deprecation warnings would be counted in the timings
+    warnings.simplefilter("ignore")
+    report = run(
+        generate.options_from_args(args),
+        groups=args.groups or GROUPS,
+        repeat=args.repeat,
+    )
+
+    if args.outfile == "-":
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+    else:
+        with open(args.outfile, "w") as fout:
+            json.dump(report, fout, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,22 @@ import argparse
 import sys
 
 from .subparsers import convert as _convert
+from .subparsers import convert_batch as _convert_batch
+from .subparsers import index as _index
+from .subparsers import merge as _merge
+from .subparsers import split as _split
 
 
 def _main():
     parser = argparse.ArgumentParser(description="CAN Trace format converter")
 
     parser.add_argument("-d", "--debug", action="store_true")
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="Profile the subcommand with cProfile, and dump the statistics "
+        "to FILE for use with pstats.",
+    )
     parser.add_argument(
         "--version", action="version", version="1.0.0", help="Print version information"
     )
@@ -18,13 +28,33 @@ def _main():
     subparsers.required = True
 
     _convert.add_subparser(subparsers)
+    _convert_batch.add_subparser(subparsers)
+    _index.add_subparser(subparsers)
+    _merge.add_subparser(subparsers)
+    _split.add_subparser(subparsers)
 
     args = parser.parse_args()
 
     if args.debug:
-        args.func(args)
+        _run(args)
     else:
         try:
-            args.func(args)
+            _run(args)
         except BaseException as e:
             sys.exit("error: {}".format(e))
+
+
+def _run(args):
+    if not args.profile:
+        args.func(args)
+        return
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        args.func(args)
+    finally:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
@@ -1,13 +1,121 @@
 from __future__ import print_function
 
 from ..traces import formats as trace_formats
+from ..traces.formats import asc
+from ..traces.formats import buffer
+from ..traces.formats import cltb
+from ..traces.formats import compression
 from ..traces.formats import trc
+from ..traces.formats.internal_trace import MessageFilter
+from ..traces.formats.internal_trace import TRC_STRING_TO_DIRECTION
+from ..traces.formats.internal_trace import TRC_STRING_TO_MESSAGE_TYPE
+from ..traces.stats import ConversionStats
 
+import contextlib
 import os
+import sys
 
+# Input readers, by file extension
+_INPUT_READERS = {".trc": trace_formats.trc, ".asc": asc, ".cltb": cltb}
 
-def _do_convert(args):
+# Output writers, by file extension. Writing to stdout uses the TRC format.
+_OUTPUT_WRITERS = {
+    ".trc": trc.TrcWriter,
+    ".asc": asc.AscWriter,
+    ".cltb": cltb.CltbWriter,
+}
+
+
+def _input_reader(infile):
+    """Look up the reader of an input file
+
+    Returns:
+        tuple: the reader module, and the compression of the file or None
+    """
+    filename, file_extension, input_compression = compression.split_extension(infile)
+    if input_compression is None:
+        input_compression = compression.detect_compression(infile)
+
+    try:
+        return _INPUT_READERS[file_extension], input_compression
+    except KeyError:
+        raise ValueError("Unsupported input file extension '{}'".format(file_extension))
+
+
+def _output_writer(outfile):
+    """Look up the writer of an output file
+
+    Returns:
+        tuple: the writer class, and the compression of the file or None
+    """
+    if outfile == "-":
+        return _OUTPUT_WRITERS[".trc"], None
+
+    filename, output_extension, output_compression = compression.split_extension(
+        outfile
+    )
+    try:
+        return _OUTPUT_WRITERS[output_extension], output_compression
+    except KeyError:
+        raise ValueError(
+            "Unsupported output file extension '{}'".format(output_extension)
+        )
+
+
+def _check_output(infile, outfile):
+    """Raise a ValueError if outfile is infile
+
+    The input is read while the output is written, and opening the output
+    would truncate it first.
     """
+    if outfile == "-" or not os.path.exists(outfile):
+        return
+    if os.path.samefile(infile, outfile):
+        raise ValueError("The output file '{}' is the input file".format(outfile))
+
+
+@contextlib.contextmanager
+def _open_input(infile, input_reader, input_compression=None):
+    if input_compression is None:
+        with buffer.open_mmap(infile) as source:
+            yield source
+    elif input_reader is cltb:
+        # CLTB files are loaded out of a single buffer
+        with compression.open_file(infile, "rb", input_compression) as fin:
+            yield fin.read()
+    else:
+        # Decompressed lines are streamed straight into the parser
+        with compression.open_file(
+            infile, "rt", input_compression, encoding="latin-1"
+        ) as fin:
+            yield fin
+
+
+@contextlib.contextmanager
+def _open_output(outfile, binary=False, output_compression=None):
+    if outfile == "-":
+        yield sys.stdout.buffer if binary else sys.stdout
+    else:
+        with compression.open_file(
+            outfile, "wb" if binary else "w", output_compression
+        ) as fout:
+            yield fout
+
+
+def _do_convert(args):
+    stats = ConversionStats() if args.stats or args.stats_json else None
+    convert_file(args, stats)
+
+    if args.stats:
+        stats.write_text(sys.stderr)
+    if args.stats_json:
+        with open(args.stats_json, "w") as fout:
+            stats.write_json(fout)
+
+
+def convert_file(args, stats=None):
+    """Convert args.infile to args.outfile
+
     +-----------+--------------------+
     | Extension | Database format    |
     +===========+====================+
@@ -15,23 +123,259 @@ def _do_convert(args):
     +-----------+--------------------+
     | .asc      | ASCII logging file |
     +-----------+--------------------+
+    | .cltb     | Binary trace cache |
+    +-----------+--------------------+
+
+    All of these formats can be read and written, and may be compressed with
+    gzip (.gz), bzip2 (.bz2) or xz (.xz), such as ``trace.trc.gz``. Compressed
+    input is also recognised by its magic bytes.
+
+    Args:
+        args (argparse.Namespace): the parsed convert options
+        stats (ConversionStats): record the time spent in each phase of the
+            conversion
     """
-    filename, file_extension = os.path.splitext(args.infile)
+    input_reader, input_compression = _input_reader(args.infile)
+    output_writer, output_compression = _output_writer(args.outfile)
+    _check_output(args.infile, args.outfile)
+
+    follow = getattr(args, "follow", False)
+    if follow:
+        if input_reader is not trace_formats.trc or input_compression is not None:
+            raise ValueError("--follow is only supported for uncompressed TRC input")
+        if args.jobs > 1:
+            raise ValueError("--follow can't be combined with --jobs")
 
-    # Register all Input Readers
-    input_readers = {".trc": trace_formats.trc}
+    if stats is not None:
+        stats.input_bytes = os.path.getsize(args.infile)
+        stats.start()
 
-    with open(args.infile, "r") as fin:
-        try:
-            internal_trace = input_readers[file_extension].load_string(fin.read())
-        except KeyError:
-            raise Error("Unsupported input file extension '{}'".format(file_extension))
+    if follow:
+        output_file = _open_output(
+            args.outfile, output_writer.binary, output_compression
+        )
+        with open(args.infile, "rb") as fin, output_file as fout:
+            _follow_trace(args, fin, output_writer, fout, stats)
+        if stats is not None:
+            stats.stop()
+        return
+
+    input_file = _open_input(args.infile, input_reader, input_compression)
+    output_file = _open_output(args.outfile, output_writer.binary, output_compression)
+    with input_file as source, output_file as fout:
+        internal_trace = _load_trace(
+            args, input_reader, source, stats, input_compression is not None
+        )
 
         # Then write the Internal Representation to the output format
-        print(internal_trace.as_trc_string())
+        _write_trace(internal_trace, output_writer, fout, stats)
+
+    if stats is not None:
+        stats.stop()
     return
 
 
+def _message_filter(args):
+    if not (args.ids or args.message_types or args.directions):
+        if args.id_mask is not None:
+            raise ValueError("--id-mask requires --id")
+        return None
+
+    return MessageFilter(
+        arbitration_ids=args.ids,
+        id_mask=args.id_mask,
+        message_types=[TRC_STRING_TO_MESSAGE_TYPE[t] for t in args.message_types or []]
+        or None,
+        directions=[TRC_STRING_TO_DIRECTION[d] for d in args.directions or []] or None,
+    )
+
+
+def _load_up_front(stats, load, *args, **kwargs):
+    if stats is None:
+        return load(*args, **kwargs)
+    with stats.phase("load"):
+        return load(*args, **kwargs)
+
+
+def _load_trace(args, input_reader, source, stats=None, compressed=False):
+    message_filter = _message_filter(args)
+    windowed = args.start is not None or args.end is not None
+    # Compressed files can't be seeked into, so windows of them are filtered
+    # out of the stream instead
+    if windowed and input_reader is trace_formats.trc and not compressed:
+        # Seek straight to the window using the timestamp index
+        return _load_up_front(
+            stats,
+            input_reader.load_window,
+            args.infile,
+            args.start,
+            args.end,
+            message_filter=message_filter,
+        )
+
+    if args.jobs > 1:
+        if input_reader is not trace_formats.trc:
+            raise ValueError("--jobs is only supported for TRC input")
+        if compressed:
+            raise ValueError("--jobs is not supported for compressed input")
+
+        # Parse the whole file in parallel before writing it out
+        return _load_up_front(
+            stats,
+            input_reader.load_path,
+            args.infile,
+            jobs=args.jobs,
+            message_filter=message_filter,
+        )
+
+    internal_trace = _stream_trace(input_reader, source, message_filter, stats)
+    if windowed:
+        internal_trace.messages = _filter_window(
+            internal_trace.messages, args.start, args.end
+        )
+    return internal_trace
+
+
+def _stream_trace(input_reader, source, message_filter=None, stats=None):
+    # Messages are streamed from the memory-mapped (or decompressed) input
+    # file as they are written out
+    if input_reader is trace_formats.trc:
+        # Rejected rows are skipped before they are decoded, and the fields
+        # of the others are only decoded once they are written
+        return input_reader.load_file(
+            source, message_filter=message_filter, stats=stats, lazy=True
+        )
+    if input_reader is asc:
+        # Rejected rows are skipped before they are decoded
+        return input_reader.load_file(
+            source, message_filter=message_filter, stats=stats
+        )
+
+    internal_trace = _load_up_front(stats, input_reader.load_file, source)
+    if message_filter is not None:
+        internal_trace.messages = (
+            message
+            for message in internal_trace.messages
+            if message_filter.accepts(message)
+        )
+    return internal_trace
+
+
+def _filter_window(messages, start, end):
+    for message in messages:
+        timestamp = float(message.timestamp)
+        if start is not None and timestamp < start:
+            continue
+        if end is not None and timestamp >= end:
+            continue
+        yield message
+
+
+def _write_trace(internal_trace, output_writer, fout, stats=None):
+    def open_writer():
+        return output_writer(
+            fout,
+            internal_trace.start_timestamp,
+            start_time=internal_trace.start_time,
+            buses=internal_trace.buses,
+        )
+
+    if stats is None:
+        with open_writer() as writer:
+            writer.write_messages(internal_trace.messages)
+        return
+
+    with stats.phase("write"):
+        with open_writer() as writer:
+            writer.write_messages(stats.count(internal_trace.messages))
+
+
+def _follow_trace(args, fin, output_writer, fout, stats=None):
+    """Convert the rows appended to a TRC file until it stops growing, or
+    until interrupted"""
+    follower = trc.TrcFollower(fin, _message_filter(args))
+    windowed = args.start is not None or args.end is not None
+
+    writer = None
+    try:
+        for messages in follower.follow(args.poll_interval, args.idle_timeout):
+            if writer is None:
+                # The start time is known once the first row has been written
+                writer = output_writer(
+                    fout,
+                    follower.start_timestamp,
+                    start_time=follower.start_time,
+                    buses=follower.buses,
+                )
+            if windowed:
+                messages = _filter_window(messages, args.start, args.end)
+            if stats is None:
+                writer.write_messages(messages)
+            else:
+                with stats.phase("write"):
+                    writer.write_messages(stats.count(messages))
+    except KeyboardInterrupt:
+        # Interrupting is the usual way to stop following, finish the output
+        pass
+
+    if writer is None:
+        writer = output_writer(
+            fout,
+            follower.start_timestamp,
+            start_time=follower.start_time,
+            buses=follower.buses,
+        )
+    writer.close()
+    if stats is not None:
+        stats.input_bytes = follower.position
+
+
+def add_selection_arguments(parser):
+    """Add the options selecting which messages are converted
+
+    Args:
+        parser (argparse.ArgumentParser): the parser to add the options to
+    """
+    parser.add_argument(
+        "--start",
+        type=float,
+        help="Only convert messages at or after this time offset, in ms.",
+    )
+    parser.add_argument(
+        "--end",
+        type=float,
+        help="Only convert messages before this time offset, in ms.",
+    )
+    parser.add_argument(
+        "--id",
+        dest="ids",
+        action="append",
+        type=lambda value: int(value, 16),
+        help="Only convert messages with this hexadecimal arbitration ID. "
+        "May be given more than once.",
+    )
+    parser.add_argument(
+        "--id-mask",
+        type=lambda value: int(value, 16),
+        help="Hexadecimal mask applied to arbitration IDs before comparing "
+        "them against --id.",
+    )
+    parser.add_argument(
+        "--type",
+        dest="message_types",
+        action="append",
+        choices=sorted(TRC_STRING_TO_MESSAGE_TYPE),
+        help="Only convert messages of this type. May be given more than once.",
+    )
+    parser.add_argument(
+        "--direction",
+        dest="directions",
+        action="append",
+        choices=sorted(TRC_STRING_TO_DIRECTION),
+        help="Only convert messages in this direction. May be given more than once.",
+    )
+
+
 def add_subparser(subparsers):
     convert_parser = subparsers.add_parser(
         "convert", description="Convert given Trace from one format to another."
@@ -48,6 +392,46 @@ def add_subparser(subparsers):
         metavar="outfile",
         dest="outfile",
         required=True,
-        help="Output trace file (default stdout).",
+        help="Output trace file, or '-' for stdout.",
+    )
+    convert_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes used to parse the input (default 1).",
+    )
+    add_selection_arguments(convert_parser)
+    convert_parser.add_argument(
+        "-f",
+        "--follow",
+        action="store_true",
+        help="Keep converting rows as they are appended to a TRC input that is "
+        "still being written, until it stops growing for --idle-timeout "
+        "seconds or until interrupted.",
+    )
+    convert_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=0.5,
+        help="Seconds between checks for new rows with --follow (default 0.5).",
+    )
+    convert_parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        help="Stop following once the input has not grown for this many "
+        "seconds (default: follow until interrupted).",
+    )
+    convert_parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print the time spent in each phase of the conversion, the "
+        "throughput, the number of messages of each type and the peak memory "
+        "usage to stderr.",
+    )
+    convert_parser.add_argument(
+        "--stats-json",
+        metavar="FILE",
+        help="Write the statistics printed by --stats to FILE as JSON.",
     )
     convert_parser.set_defaults(func=_do_convert)
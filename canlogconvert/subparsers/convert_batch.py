@@ -0,0 +1,188 @@
+from __future__ import print_function
+
+from . import convert as _convert
+from ..traces.formats import compression
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+# Input extensions picked up when a directory is given, with or without a
+# compression suffix
+_INPUT_EXTENSIONS = tuple(sorted(_convert._INPUT_READERS))
+
+
+def _expand_inputs(inputs):
+    """Expand globs and directories into a sorted list of input files"""
+    infiles = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            matches = [
+                os.path.join(pattern, name)
+                for name in os.listdir(pattern)
+                if compression.split_extension(name)[1] in _INPUT_EXTENSIONS
+            ]
+        else:
+            matches = glob.glob(pattern)
+            if not matches:
+                raise ValueError("No input files match '{}'".format(pattern))
+        infiles.extend(sorted(matches))
+
+    # The same file may be matched by several patterns
+    seen = set()
+    return [f for f in infiles if not (f in seen or seen.add(f))]
+
+
+def _output_path(infile, output_dir, pattern):
+    name = os.path.basename(infile)
+    # The stem of trace.trc.gz is trace, and its extension .trc.gz
+    stem = compression.split_extension(name)[0]
+    ext = name[len(stem) :]
+    parent = os.path.basename(os.path.dirname(os.path.abspath(infile)))
+    return os.path.join(
+        output_dir, pattern.format(name=name, stem=stem, ext=ext, parent=parent)
+    )
+
+
+def _convert_one(args):
+    """Convert a single file in a worker, reporting rather than raising errors"""
+    started = time.time()
+    try:
+        directory = os.path.dirname(args.outfile)
+        if directory and not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Another worker created it first
+                if not os.path.isdir(directory):
+                    raise
+        _convert.convert_file(args)
+    except Exception as e:
+        # Don't leave a partially written output behind
+        if os.path.exists(args.outfile):
+            os.remove(args.outfile)
+        return args.infile, args.outfile, "{}".format(e), time.time() - started
+    return args.infile, args.outfile, None, time.time() - started
+
+
+def _iter_results(executor, tasks):
+    """Convert the tasks in an executor, yielding the results as they complete
+
+    If a worker process crashes, such as when it is killed, the tasks that
+    have not completed are reported as failed rather than aborting the batch.
+    """
+    from concurrent import futures
+    from concurrent.futures.process import BrokenProcessPool
+
+    pending = dict((executor.submit(_convert_one, task), task) for task in tasks)
+    for future in futures.as_completed(pending):
+        task = pending[future]
+        try:
+            yield future.result()
+        except BrokenProcessPool as e:
+            if os.path.exists(task.outfile):
+                os.remove(task.outfile)
+            yield task.infile, task.outfile, "worker crashed: {}".format(e), 0.0
+
+
+def _make_tasks(args):
+    infiles = _expand_inputs(args.inputs)
+    options = vars(args).copy()
+    for name in ("inputs", "output_dir", "pattern", "workers", "func"):
+        options.pop(name, None)
+    options["jobs"] = 1
+
+    tasks = []
+    outfiles = {}
+    for infile in infiles:
+        outfile = _output_path(infile, args.output_dir, args.pattern)
+        if outfile in outfiles:
+            raise ValueError(
+                "'{}' and '{}' would both be converted to '{}'".format(
+                    outfiles[outfile], infile, outfile
+                )
+            )
+        outfiles[outfile] = infile
+        _convert._check_output(infile, outfile)
+        tasks.append(argparse.Namespace(infile=infile, outfile=outfile, **options))
+    return tasks
+
+
+def _do_convert_batch(args):
+    tasks = _make_tasks(args)
+    started = time.time()
+
+    if args.workers == 1 or len(tasks) <= 1:
+        results = (_convert_one(task) for task in tasks)
+        executor = None
+    else:
+        from concurrent import futures
+
+        # Every worker pays the import and grammar set up costs only once
+        executor = futures.ProcessPoolExecutor(min(args.workers, len(tasks)))
+        results = _iter_results(executor, tasks)
+
+    failures = []
+    try:
+        for infile, outfile, error, elapsed in results:
+            if error is None:
+                print("{} -> {} ({:.2f}s)".format(infile, outfile, elapsed))
+            else:
+                failures.append(infile)
+                print("{}: error: {}".format(infile, error), file=sys.stderr)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    print(
+        "Converted {} of {} files in {:.2f}s, {} failed".format(
+            len(tasks) - len(failures), len(tasks), time.time() - started, len(failures)
+        )
+    )
+    if failures:
+        raise ValueError(
+            "{} of {} files failed to convert".format(len(failures), len(tasks))
+        )
+
+
+def add_subparser(subparsers):
+    batch_parser = subparsers.add_parser(
+        "convert-batch",
+        description="Convert many traces using a pool of worker processes. "
+        "Conversion carries on past files that fail, and a summary is printed "
+        "at the end.",
+    )
+    batch_parser.add_argument(
+        "inputs",
+        metavar="input",
+        nargs="+",
+        help="Input trace files, globs, or directories containing "
+        "{} files.".format(" or ".join(_INPUT_EXTENSIONS)),
+    )
+    batch_parser.add_argument(
+        "-O",
+        metavar="outdir",
+        dest="output_dir",
+        required=True,
+        help="Output directory.",
+    )
+    batch_parser.add_argument(
+        "--pattern",
+        default="{stem}.trc",
+        help="Output file name, relative to the output directory, in which "
+        "{name}, {stem}, {ext} and {parent} are replaced by the input file "
+        "name, the name without its extension, the extension and the name of "
+        "the input directory. The extension picks the output format "
+        "(default '{stem}.trc').",
+    )
+    batch_parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes (default: the number of CPUs).",
+    )
+    _convert.add_selection_arguments(batch_parser)
+    batch_parser.set_defaults(func=_do_convert_batch)
@@ -0,0 +1,29 @@
+from __future__ import print_function
+
+from ..traces.formats import trc
+from ..traces.formats.index import index_path
+
+
+def _do_index(args):
+    index = trc.index_file(args.infile, stride=args.stride)
+    print("Wrote {} entries to {}".format(len(index.offsets), index_path(args.infile)))
+
+
+def add_subparser(subparsers):
+    index_parser = subparsers.add_parser(
+        "index",
+        description="Build a timestamp index for a TRC file, used to convert "
+        "time windows without parsing the whole file.",
+    )
+    index_parser.add_argument(
+        "-I", metavar="infile", dest="infile", required=True, help="Input trace file."
+    )
+    index_parser.add_argument(
+        "--stride",
+        type=int,
+        default=trc.DEFAULT_INDEX_STRIDE,
+        help="Number of rows between index entries (default {}).".format(
+            trc.DEFAULT_INDEX_STRIDE
+        ),
+    )
+    index_parser.set_defaults(func=_do_index)
@@ -0,0 +1,94 @@
+from __future__ import print_function
+
+from . import convert as _convert
+from ..traces import merge as _merge
+
+import contextlib
+
+
+def _do_merge(args):
+    merge_files(args)
+
+
+def merge_files(args):
+    """Merge args.inputs into args.outfile, in order of absolute time
+
+    The inputs may be in any of the formats read by convert, and are
+    streamed, so only the next message of every input is held in memory.
+
+    Args:
+        args (argparse.Namespace): the parsed merge options
+    """
+    if len(args.inputs) < 2:
+        raise ValueError("At least two inputs are needed to merge")
+
+    if args.buses is None:
+        # Every input is a bus of its own, numbered in the order given
+        buses = list(range(1, len(args.inputs) + 1))
+    elif args.buses == [0]:
+        buses = None
+    else:
+        buses = args.buses
+
+    readers = [_convert._input_reader(infile) for infile in args.inputs]
+    output_writer, output_compression = _convert._output_writer(args.outfile)
+    message_filter = _convert._message_filter(args)
+    for infile in args.inputs:
+        _convert._check_output(infile, args.outfile)
+
+    with contextlib.ExitStack() as stack:
+        traces = []
+        for infile, (input_reader, input_compression) in zip(args.inputs, readers):
+            source = stack.enter_context(
+                _convert._open_input(infile, input_reader, input_compression)
+            )
+            traces.append(_convert._stream_trace(input_reader, source, message_filter))
+
+        merged = _merge.merge(traces, buses)
+        messages = merged.messages
+        if args.start is not None or args.end is not None:
+            messages = _convert._filter_window(messages, args.start, args.end)
+
+        fout = stack.enter_context(
+            _convert._open_output(
+                args.outfile, output_writer.binary, output_compression
+            )
+        )
+        with output_writer(
+            fout,
+            merged.start_timestamp,
+            start_time=merged.start_time,
+            buses=merged.buses,
+        ) as writer:
+            writer.write_messages(messages)
+
+
+def _parse_buses(value):
+    return [int(bus) for bus in value.split(",")]
+
+
+def add_subparser(subparsers):
+    merge_parser = subparsers.add_parser(
+        "merge",
+        description="Merge traces recorded at the same time into a single "
+        "trace, in order of absolute time.",
+    )
+    merge_parser.add_argument(
+        "inputs", nargs="+", metavar="infile", help="Input trace files."
+    )
+    merge_parser.add_argument(
+        "-O",
+        metavar="outfile",
+        dest="outfile",
+        required=True,
+        help="Output trace file, or '-' for stdout.",
+    )
+    merge_parser.add_argument(
+        "--buses",
+        type=_parse_buses,
+        help="Comma separated bus number of every input, such as 1,2,3 "
+        "(default: the inputs are numbered from 1 in the order given). "
+        "Give 0 to keep the bus numbers recorded in the inputs.",
+    )
+    _convert.add_selection_arguments(merge_parser)
+    merge_parser.set_defaults(func=_do_merge)
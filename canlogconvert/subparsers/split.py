@@ -0,0 +1,164 @@
+from __future__ import print_function
+
+from . import convert as _convert
+from ..traces import split as _split
+from ..traces.formats import compression
+
+import os
+import re
+import sys
+
+_SIZE_SUFFIXES = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+def _parse_size(value):
+    """Parse a size in bytes, such as 500M"""
+    match = re.match(r"^\s*(\d+)\s*([kKmMgG]?)i?[bB]?\s*$", value)
+    if match is None:
+        raise ValueError("Invalid size '{}'".format(value))
+    number, suffix = match.groups()
+    return int(number) * _SIZE_SUFFIXES[suffix.lower()]
+
+
+def _parse_id_range(value):
+    """Parse an inclusive range of hexadecimal arbitration IDs, such as
+    100-1FF"""
+    low, separator, high = value.partition("-")
+    low = int(low, 16)
+    high = int(high, 16) if separator else low
+    if high < low:
+        raise ValueError("Invalid ID range '{}'".format(value))
+    return low, high
+
+
+def _shard_opener(args, pattern):
+    name = os.path.basename(args.infile)
+    stem = compression.split_extension(name)[0]
+    ext = name[len(stem) :]
+
+    def open_shard(key, index):
+        path = os.path.join(
+            args.output_dir,
+            pattern.format(
+                stem=stem, ext=ext, shard=index, key="" if key is None else key
+            ),
+        )
+        output_writer, output_compression = _convert._output_writer(path)
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        fileobj = compression.open_file(
+            path, "wb" if output_writer.binary else "w", output_compression
+        )
+        return output_writer, fileobj
+
+    return open_shard
+
+
+def _do_split(args):
+    shards = split_file(args)
+    print("Wrote {} shards".format(len(shards)), file=sys.stderr)
+
+
+def split_file(args):
+    """Split args.infile into shards in args.output_dir
+
+    The input is read once, as a stream.
+
+    Args:
+        args (argparse.Namespace): the parsed split options
+
+    Returns:
+        list: the Shards that were written
+    """
+    if args.by_bus:
+        key = _split.bus_key
+    elif args.id_ranges:
+        key = _split.IdRangeKey(args.id_ranges)
+    else:
+        key = None
+    if not (key or args.rows or args.bytes or args.span):
+        raise ValueError(
+            "Give at least one of --rows, --bytes, --span, --by-bus or --id-range"
+        )
+
+    pattern = args.pattern
+    if pattern is None:
+        pattern = "{stem}_{shard:04d}.trc"
+        if key is not None:
+            pattern = "{stem}_{key}_{shard:04d}.trc"
+
+    input_reader, input_compression = _convert._input_reader(args.infile)
+    with _convert._open_input(args.infile, input_reader, input_compression) as source:
+        trace = _convert._stream_trace(
+            input_reader, source, _convert._message_filter(args)
+        )
+        if args.start is not None or args.end is not None:
+            trace.messages = _convert._filter_window(
+                trace.messages, args.start, args.end
+            )
+
+        return _split.split(
+            trace,
+            _shard_opener(args, pattern),
+            key=key,
+            max_rows=args.rows,
+            max_bytes=args.bytes,
+            max_span=args.span,
+        )
+
+
+def add_subparser(subparsers):
+    split_parser = subparsers.add_parser(
+        "split",
+        description="Split a trace into shards by size, time span, bus or ID "
+        "range, reading it once.",
+    )
+    split_parser.add_argument("infile", help="Input trace file.")
+    split_parser.add_argument(
+        "-O",
+        metavar="output_dir",
+        dest="output_dir",
+        required=True,
+        help="Directory the shards are written to.",
+    )
+    split_parser.add_argument(
+        "--pattern",
+        help="Name of every shard, which also picks its format. {stem} and "
+        "{ext} are replaced by the input file name without and with its "
+        "extension, {shard} by the number of the shard from 0, and {key} by "
+        "its bus or ID range (default '{stem}_{shard:04d}.trc', or "
+        "'{stem}_{key}_{shard:04d}.trc' when splitting by bus or ID range).",
+    )
+    split_parser.add_argument(
+        "--rows", type=int, help="Start a new shard after this many rows."
+    )
+    split_parser.add_argument(
+        "--bytes",
+        type=_parse_size,
+        help="Start a new shard before exceeding this size, such as 500M. "
+        "Sizes are counted before compression.",
+    )
+    split_parser.add_argument(
+        "--span",
+        type=float,
+        help="Start a new shard once it spans this many milliseconds.",
+    )
+    keys = split_parser.add_mutually_exclusive_group()
+    keys.add_argument(
+        "--by-bus",
+        action="store_true",
+        help="Write the messages of every bus to shards of their own.",
+    )
+    keys.add_argument(
+        "--id-range",
+        dest="id_ranges",
+        metavar="LOW-HIGH",
+        action="append",
+        type=_parse_id_range,
+        help="Write the messages within this inclusive range of hexadecimal "
+        "arbitration IDs to shards of their own. May be given more than once, "
+        "other messages are written to the 'other' shards.",
+    )
+    _convert.add_selection_arguments(split_parser)
+    split_parser.set_defaults(func=_do_split)
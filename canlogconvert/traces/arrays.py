@@ -0,0 +1,116 @@
+"""NumPy arrays of trace messages
+
+Messages are exported as a structured array with one record per message.
+The data of every message is stored in a fixed-width row of bytes, padded
+with zeros, alongside the number of bytes that are used.
+
+The columns of a ColumnarMessages are wrapped without being copied, and its
+payload is spread over the data rows in a single vectorized assignment, so no
+Python object is created per message. NumPy is an optional dependency, which
+is only imported once an array is created.
+"""
+from canlogconvert.traces.formats.internal_trace import ColumnarMessages
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError(
+            "Exporting traces to arrays requires NumPy, install it with "
+            "'pip install canlogconvert[numpy]'"
+        )
+    return numpy
+
+
+def message_dtype(data_width):
+    """The dtype of the records of an exported trace
+
+    Args:
+        data_width (int): the number of bytes of data stored per message
+
+    Returns:
+        numpy.dtype
+    """
+    numpy = _import_numpy()
+    return numpy.dtype(
+        [
+            ("timestamp", "f8"),
+            ("arbitration_id", "u4"),
+            ("dlc", "u2"),
+            ("message_type", "u1"),
+            ("direction", "u1"),
+            ("bus", "u1"),
+            ("length", "u2"),
+            ("data", "u1", (data_width,)),
+        ]
+    )
+
+
+def _column(numpy, column):
+    # Columns are arrays, or memoryviews of a buffer that was loaded without
+    # copying it
+    dtype = getattr(column, "typecode", None) or column.format
+    return numpy.frombuffer(column, dtype=dtype)
+
+
+def columns_to_numpy(messages, data_width=None):
+    """Export a ColumnarMessages as a structured array
+
+    Args:
+        messages (ColumnarMessages): the messages
+        data_width (int): the number of bytes of data stored per message.
+            Defaults to the length of the longest data.
+
+    Returns:
+        numpy.ndarray: a record per message, see message_dtype
+
+    Raises:
+        ValueError: if the data of a message is longer than data_width
+    """
+    numpy = _import_numpy()
+
+    offsets = _column(numpy, messages.payload_offsets)
+    lengths = numpy.diff(offsets)
+    longest = int(lengths.max()) if len(lengths) else 0
+    if data_width is None:
+        data_width = longest
+    elif longest > data_width:
+        raise ValueError(
+            "Data of {} bytes does not fit in a width of {} bytes".format(
+                longest, data_width
+            )
+        )
+
+    records = numpy.zeros(len(messages), dtype=message_dtype(data_width))
+    records["timestamp"] = _column(numpy, messages.timestamps)
+    records["arbitration_id"] = _column(numpy, messages.arbitration_ids)
+    records["dlc"] = _column(numpy, messages.dlcs)
+    records["message_type"] = _column(numpy, messages.message_types)
+    records["direction"] = _column(numpy, messages.directions)
+    records["bus"] = _column(numpy, messages.buses)
+    records["length"] = lengths
+
+    # The payload holds the data of all messages back to back, which are the
+    # leading bytes of every data row in row-major order
+    payload = numpy.frombuffer(messages.payload, dtype="u1")
+    used = numpy.arange(data_width) < lengths[:, numpy.newaxis]
+    records["data"][used] = payload[offsets[0] : offsets[-1]]
+    return records
+
+
+def to_numpy(messages, data_width=None):
+    """Export messages as a structured array
+
+    Args:
+        messages (iterable): the messages. A ColumnarMessages is exported
+            without creating any InternalMessages, other messages are stored
+            in one first.
+        data_width (int): see columns_to_numpy
+
+    Returns:
+        numpy.ndarray: a record per message, see message_dtype
+    """
+    if not isinstance(messages, ColumnarMessages):
+        messages = ColumnarMessages(messages)
+    return columns_to_numpy(messages, data_width)
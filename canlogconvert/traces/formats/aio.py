@@ -0,0 +1,182 @@
+"""Reading traces from asyncio streams
+
+Traces that are forwarded live, such as PCAN output sent to a collector over
+a local TCP socket, are parsed as their bytes arrive by a TrcParser or an
+AscParser, which decode rows with the same decoders as the readers of whole
+files.
+
+Data is only read from a stream when the messages read so far have been
+consumed. Once the stream's buffer is full its transport stops reading, so a
+slow consumer holds back the sender rather than buffering without bounds.
+Likewise ``write_trace`` waits for its output stream to drain before reading
+on. Every stream is handled by a task of its own, so a single event loop can
+serve many feeds at once.
+"""
+from canlogconvert.traces.formats.asc import AscParser
+from canlogconvert.traces.formats.trc import TrcParser
+
+# The most bytes read from a stream at a time
+_READ_SIZE = 64 * 1024
+
+_TEXT_ENCODING = "latin-1"
+
+
+class AsyncTraceReader(object):
+    """Parse the messages of a trace from an asyncio.StreamReader
+
+    Iterating over the reader with ``async for`` yields every message,
+    and ``batches`` yields them in the lists decoded from every read.
+    """
+
+    def __init__(self, reader, parser, read_size=_READ_SIZE):
+        """Create a new AsyncTraceReader
+
+        Args:
+            reader (asyncio.StreamReader): the stream to read
+            parser: the TrcParser or AscParser that parses the stream's data
+            read_size (int): the most bytes read from the stream at a time
+        """
+        self._reader = reader
+        self._parser = parser
+        self._read_size = read_size
+        # Messages decoded while reading the header
+        self._pending = []
+        self._at_eof = False
+
+    @property
+    def header(self):
+        """dict: the parsed header, or None until it has been read"""
+        return self._parser.header
+
+    @property
+    def start_timestamp(self):
+        """str: the start time of the trace, or None if it is not known
+        (yet)"""
+        return self._parser.start_timestamp
+
+    @property
+    def start_time(self):
+        """datetime.datetime: the absolute start time of the trace, or None
+        if it is not known (yet)"""
+        return getattr(self._parser, "start_time", None)
+
+    @property
+    def buses(self):
+        """list: the buses listed in the header of the trace, or None if
+        they are not known (yet)"""
+        return getattr(self._parser, "buses", None)
+
+    async def read_header(self):
+        """Read the stream up to its first row, and parse the header
+
+        Returns:
+            dict: the parsed header
+        """
+        while self._parser.header is None and not self._at_eof:
+            self._pending.extend(await self._read())
+        return self._parser.header
+
+    async def _read(self):
+        data = await self._reader.read(self._read_size)
+        if not data:
+            self._at_eof = True
+            return self._parser.close()
+        return self._parser.feed(data)
+
+    async def batches(self):
+        """Iterate over the messages, in the lists decoded from every read
+
+        Returns:
+            asynchronous iterator: non-empty lists of InternalMessages
+        """
+        if self._pending:
+            messages, self._pending = self._pending, []
+            yield messages
+        while not self._at_eof:
+            messages = await self._read()
+            if messages:
+                yield messages
+
+    async def __aiter__(self):
+        async for messages in self.batches():
+            for message in messages:
+                yield message
+
+
+def read_trc(reader, message_filter=None, read_size=_READ_SIZE):
+    """Parse a TRC trace from an asyncio.StreamReader
+
+    Args:
+        reader (asyncio.StreamReader): the stream to read
+        message_filter (MessageFilter): only return the accepted messages
+        read_size (int): the most bytes read from the stream at a time
+
+    Returns:
+        AsyncTraceReader
+    """
+    return AsyncTraceReader(reader, TrcParser(message_filter), read_size)
+
+
+def read_asc(reader, message_filter=None, read_size=_READ_SIZE):
+    """Parse an ASC trace from an asyncio.StreamReader
+
+    Args:
+        reader (asyncio.StreamReader): the stream to read
+        message_filter (MessageFilter): only return the accepted messages
+        read_size (int): the most bytes read from the stream at a time
+
+    Returns:
+        AsyncTraceReader
+    """
+    return AsyncTraceReader(reader, AscParser(message_filter), read_size)
+
+
+class _StreamFile(object):
+    """Write the text written to a file object to an asyncio.StreamWriter"""
+
+    def __init__(self, writer):
+        self._writer = writer
+
+    def write(self, data):
+        self._writer.write(data.encode(_TEXT_ENCODING))
+
+    def flush(self):
+        pass
+
+
+async def write_trace(trace_reader, writer, writer_class, **options):
+    """Write the messages of an AsyncTraceReader to an asyncio.StreamWriter
+
+    Every batch of messages is written out as soon as it has been read, then
+    the output is drained before the next batch is read.
+
+    Args:
+        trace_reader (AsyncTraceReader): the trace to write
+        writer (asyncio.StreamWriter): the stream to write it to, which is
+            left open
+        writer_class (type): a TraceWriter class of a text format, such as
+            TrcWriter or AscWriter. A TrcWriter holds back the rows until the
+            end of the trace unless its buses are known, either from the
+            header or from the buses option.
+        options: passed on to the writer_class
+
+    Returns:
+        int: the number of messages written
+    """
+    if writer_class.binary:
+        raise ValueError("Binary formats can't be written to a stream")
+
+    await trace_reader.read_header()
+    options.setdefault("buses", trace_reader.buses)
+    trace_writer = writer_class(
+        _StreamFile(writer),
+        trace_reader.start_timestamp,
+        start_time=trace_reader.start_time,
+        **options
+    )
+    async for messages in trace_reader.batches():
+        trace_writer.write_messages(messages)
+        await writer.drain()
+    trace_writer.close()
+    await writer.drain()
+    return trace_writer.count
@@ -0,0 +1,742 @@
+"""Operations on a Vector ASC file
+
+An ASC file starts with a header giving the start time of the trace, the
+number base and the timestamp mode::
+
+    date Wed Jan 09 06:34:16.883 pm 2019
+    base hex  timestamps absolute
+    no internal events logged
+    // version 7.0.0
+
+followed by one event per line. Only CAN frames, CAN FD frames and error
+frames are loaded, other events such as statistics and status changes are
+skipped::
+
+       0.039488 1  401             Rx   d 6 0A 00 66 98 0B 00
+       0.040012 1  18FEF100x       Tx   d 0
+       0.041100 1  402             Rx   r
+       0.042000 1  ErrorFrame
+       0.043000 CANFD   1 Rx        403  1 0 9 12 01 02 03 04 05 06 07 08 09 0A 0B 0C
+
+CAN FD frames give their bit rate switch and error state indicator bits, the
+DLC and the number of data bytes, followed by the data. Frames with more or
+fewer data bytes than their DLC allows can't be represented, and raise a
+ValueError rather than being truncated.
+
+ASC timestamps are in seconds, they are loaded as offsets in milliseconds
+like TRC timestamps.
+"""
+import datetime
+import itertools
+import operator
+
+from canlogconvert.traces.formats import buffer
+from canlogconvert.traces.formats.internal_trace import ColumnarMessages
+from canlogconvert.traces.formats.internal_trace import InternalMessage
+from canlogconvert.traces.formats.internal_trace import InternalMessageDirection
+from canlogconvert.traces.formats.internal_trace import InternalMessageType
+from canlogconvert.traces.formats.internal_trace import InternalTrace
+from canlogconvert.traces.formats.internal_trace import DIRECTION_TO_TRC_STRING
+from canlogconvert.traces.formats.internal_trace import FD_DATA_LENGTHS
+from canlogconvert.traces.formats.internal_trace import MAX_STANDARD_ARBITRATION_ID
+from canlogconvert.traces.formats.internal_trace import TRC_STRING_TO_DIRECTION
+from canlogconvert.traces.formats.internal_trace import format_data
+from canlogconvert.traces.formats.writer import TraceWriter
+
+# The formats of the date keyword, with runs of whitespace collapsed
+_DATE_FORMATS = [
+    "%a %b %d %I:%M:%S.%f %p %Y",
+    "%a %b %d %I:%M:%S %p %Y",
+    "%a %b %d %H:%M:%S.%f %Y",
+    "%a %b %d %H:%M:%S %Y",
+]
+
+_FRAME_TYPES = {"d": InternalMessageType.DT, "r": InternalMessageType.RR}
+
+# The message types of CAN FD frames, by their bit rate switch and error
+# state indicator bits
+_FD_FRAME_TYPES = {
+    ("0", "0"): InternalMessageType.FD,
+    ("1", "0"): InternalMessageType.FB,
+    ("0", "1"): InternalMessageType.FE,
+    ("1", "1"): InternalMessageType.BI,
+}
+
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+
+# ASC files are plain ASCII, but comments may be in any encoding. Decoding
+# as latin-1 never fails and leaves the frames intact.
+_BINARY_ENCODING = "latin-1"
+
+
+def _load_date(date):
+    """Convert the value of the date keyword to a TRC style start time
+
+    Returns:
+        str: the start time formatted like the ``Start time`` comment of a TRC
+            file, or the date unchanged if it could not be parsed
+    """
+    date = " ".join(date.split())
+    for date_format in _DATE_FORMATS:
+        try:
+            start = datetime.datetime.strptime(date, date_format)
+        except ValueError:
+            continue
+        return "{}.{:03d}.{:d}".format(
+            start.strftime("%Y-%m-%d %H:%M:%S"),
+            start.microsecond // 1000,
+            start.microsecond % 1000 // 100,
+        )
+    return date
+
+
+def _is_event(tokens):
+    # Events start with their timestamp, header lines start with a keyword
+    try:
+        float(tokens[0])
+    except ValueError:
+        return False
+    return True
+
+
+def _load_header(lines):
+    """Consume the header of an ASC file
+
+    Args:
+        lines (iterator): an iterator over the lines of the file, as str
+
+    Returns:
+        tuple: a dict with the ``date``, ``base`` and ``timestamps`` of the
+            file, and the tokens of the first event (or None if the file has
+            no events)
+    """
+    header = {"date": None, "base": "hex", "timestamps": "absolute"}
+    for line in lines:
+        tokens = line.split()
+        if not tokens:
+            continue
+        if _is_event(tokens):
+            return header, tokens
+
+        keyword = tokens[0].lower()
+        if keyword == "date":
+            header["date"] = line.split(None, 1)[1].strip() if len(tokens) > 1 else None
+        elif keyword == "base" and len(tokens) >= 2:
+            header["base"] = tokens[1].lower()
+            if len(tokens) >= 4 and tokens[2].lower() == "timestamps":
+                header["timestamps"] = tokens[3].lower()
+    return header, None
+
+
+def _check_header(header):
+    if header["base"] not in ("hex", "dec"):
+        raise ValueError("Unsupported ASC number base", header["base"])
+    if header["timestamps"] not in ("absolute", "relative"):
+        raise ValueError("Unsupported ASC timestamps", header["timestamps"])
+
+
+class _EventDecoder(object):
+    """Decode the events of an ASC file from their whitespace separated tokens
+
+    Lines are only split, never matched against a grammar, and the payload is
+    only decoded for frames accepted by the MessageFilter.
+    """
+
+    def __init__(self, header, message_filter=None):
+        self._base = 16 if header["base"] == "hex" else 10
+        self._relative = header["timestamps"] == "relative"
+        self._message_filter = message_filter
+        self._previous_timestamp = 0.0
+
+    def _is_byte(self, token):
+        if self._base == 16:
+            return len(token) <= 2 and all(c in _HEX_DIGITS for c in token)
+        return len(token) <= 3 and token.isdigit()
+
+    def _frame_data(self, tokens, start, length):
+        """Decode the data bytes of a frame, which may be followed by other
+        fields such as its bit count"""
+        end = start + length
+        if len(tokens) < end:
+            raise ValueError(
+                "ASC frame has fewer than {} data bytes".format(length), tokens
+            )
+        return self._decode_data(tokens[start:end])
+
+    def _decode_data(self, tokens):
+        if self._base == 16:
+            try:
+                return bytearray.fromhex(" ".join(tokens))
+            except ValueError:
+                # Bytes written without a leading zero
+                pass
+        return bytearray(int(token, self._base) for token in tokens)
+
+    def fields(self, tokens):
+        """Decode the tokens of an event line into the fields of a message
+
+        Returns:
+            tuple: the timestamp, arbitration ID, DLC, direction, message
+                type, bus and data, or None for events that are not frames
+        """
+        timestamp = float(tokens[0]) * 1000.0
+        if self._relative:
+            timestamp += self._previous_timestamp
+            self._previous_timestamp = timestamp
+
+        if tokens[1] == "CANFD":
+            return self._fd_fields(timestamp, tokens)
+        if len(tokens) < 3 or not tokens[1].isdigit():
+            # Not associated with a CAN channel, such as a log trigger
+            return None
+        bus = int(tokens[1])
+
+        if tokens[2] == "ErrorFrame":
+            message_type = InternalMessageType.ER
+            if not self._accepts(0, message_type, InternalMessageDirection.RX):
+                return None
+            return (
+                timestamp,
+                0,
+                0,
+                InternalMessageDirection.RX,
+                message_type,
+                bus,
+                bytearray(),
+            )
+
+        if len(tokens) < 5:
+            return None
+        direction = TRC_STRING_TO_DIRECTION.get(tokens[3])
+        message_type = _FRAME_TYPES.get(tokens[4])
+        if direction is None or message_type is None:
+            # Some other event on the channel, such as statistics
+            return None
+
+        arbitration_id = tokens[2]
+        if arbitration_id[-1] in "xX":
+            arbitration_id = arbitration_id[:-1]
+        arbitration_id = int(arbitration_id, self._base)
+        if not self._accepts(arbitration_id, message_type, direction):
+            return None
+
+        dlc = int(tokens[5], 16) if len(tokens) > 5 else 0
+        if message_type == InternalMessageType.RR:
+            data = bytearray()
+        else:
+            # DLCs above 8 mean 8 bytes for classic CAN frames
+            length = min(dlc, 8)
+            if len(tokens) > 6 + length and self._is_byte(tokens[6 + length]):
+                # Such as a CAN FD frame written as a classic one
+                raise ValueError(
+                    "ASC frame has more than {} data bytes".format(length), tokens
+                )
+            data = self._frame_data(tokens, 6, length)
+        return timestamp, arbitration_id, dlc, direction, message_type, bus, data
+
+    def _fd_fields(self, timestamp, tokens):
+        """Decode the tokens of a CANFD event line, see fields"""
+        if len(tokens) < 5 or not tokens[2].isdigit():
+            return None
+        bus = int(tokens[2])
+        direction = TRC_STRING_TO_DIRECTION.get(tokens[3])
+        if direction is None:
+            return None
+
+        if tokens[4] == "ErrorFrame":
+            message_type = InternalMessageType.ER
+            if not self._accepts(0, message_type, direction):
+                return None
+            return timestamp, 0, 0, direction, message_type, bus, bytearray()
+
+        arbitration_id = tokens[4]
+        if arbitration_id[-1] in "xX":
+            arbitration_id = arbitration_id[:-1]
+        arbitration_id = int(arbitration_id, self._base)
+
+        # The ID may be followed by a symbolic name
+        position = 5 if tokens[5:6] in (["0"], ["1"]) else 6
+        if len(tokens) < position + 4:
+            raise ValueError("Truncated ASC CAN FD frame", tokens)
+        message_type = _FD_FRAME_TYPES.get(tuple(tokens[position : position + 2]))
+        if message_type is None:
+            raise ValueError("Invalid ASC CAN FD frame bits", tokens)
+        if not self._accepts(arbitration_id, message_type, direction):
+            return None
+
+        dlc = int(tokens[position + 2], self._base)
+        length = int(tokens[position + 3])
+        if dlc > 15 or length != FD_DATA_LENGTHS[dlc]:
+            raise ValueError(
+                "ASC CAN FD frame has {} data bytes for a DLC of {}".format(
+                    length, dlc
+                ),
+                tokens,
+            )
+        data = self._frame_data(tokens, position + 4, length)
+        return timestamp, arbitration_id, dlc, direction, message_type, bus, data
+
+    def _accepts(self, arbitration_id, message_type, direction):
+        if self._message_filter is None:
+            return True
+        return self._message_filter.accepts_fields(
+            arbitration_id, message_type, direction
+        )
+
+    def __call__(self, tokens):
+        fields = self.fields(tokens)
+        if fields is None:
+            return None
+
+        timestamp, arbitration_id, dlc, direction, message_type, bus, data = fields
+        message = InternalMessage(
+            arbitration_id=arbitration_id,
+            data=data,
+            dlc=dlc,
+            direction=direction,
+            timestamp=timestamp,
+        )
+        message.message_type = message_type
+        message.bus = bus
+        return message
+
+
+def _iter_text_lines(source):
+    if buffer.is_buffer(source):
+        return (line.decode(_BINARY_ENCODING) for line in buffer.iter_lines(source))
+    return iter(source)
+
+
+def _iter_event_tokens(first_tokens, lines):
+    if first_tokens is not None:
+        yield first_tokens
+
+    for line in lines:
+        tokens = line.split()
+        if tokens and _is_event(tokens):
+            yield tokens
+
+
+def _load_source(source, message_filter, stats=None):
+    """Parse the header of an ASC source, and prepare to parse its events
+
+    Returns:
+        tuple: the parsed header, the decoder for its events and an iterator
+            over the tokens of every event
+    """
+    lines = _iter_text_lines(source)
+    header, first_tokens = _load_header(lines)
+    _check_header(header)
+
+    decoder = _EventDecoder(header, message_filter)
+    if stats is not None:
+        lines = stats.timed(lines, "read")
+        return (
+            header,
+            decoder,
+            stats.timed(_iter_event_tokens(first_tokens, lines), "tokenize"),
+        )
+    return header, decoder, _iter_event_tokens(first_tokens, lines)
+
+
+def _iter_messages(decoder, events, stats=None):
+    if stats is not None:
+        return _iter_messages_with_stats(decoder, events, stats)
+    return (message for message in map(decoder, events) if message is not None)
+
+
+def _iter_messages_with_stats(decoder, events, stats):
+    for tokens in events:
+        stats.enter("build")
+        message = decoder(tokens)
+        stats.exit()
+        if message is not None:
+            yield message
+
+
+class AscParser(object):
+    """Incrementally parse ASC data that arrives in pieces
+
+    Every call to ``feed`` parses the complete events among the bytes given
+    so far. A partial last line is kept until the rest of it arrives, so the
+    data can be split anywhere, such as into the reads of a socket.
+
+    The header is parsed once, as soon as the first event has arrived.
+    """
+
+    def __init__(self, message_filter=None):
+        """Create a new AscParser
+
+        Args:
+            message_filter (MessageFilter): only return the accepted messages
+        """
+        self._message_filter = message_filter
+        # The bytes of the last line received so far, which is not complete
+        self._pending = b""
+        self._header = None
+        self._header_lines = []
+        self._decoder = None
+
+    @property
+    def header(self):
+        """dict: the parsed header, or None until the first event has
+        arrived"""
+        return self._header
+
+    @property
+    def start_timestamp(self):
+        """str: the start time of the trace, or None until the header has
+        been parsed or if it has no date"""
+        if self._header is None or not self._header["date"]:
+            return None
+        return _load_date(self._header["date"])
+
+    def feed(self, data):
+        """Parse the complete events among the bytes received so far
+
+        Args:
+            data (bytes): the bytes received since the last call
+
+        Returns:
+            list: the new InternalMessages, which is empty if no complete
+                frame has been received
+        """
+        end = data.rfind(b"\n")
+        if end == -1:
+            self._pending += data
+            return []
+        lines = (self._pending + data[: end + 1]).splitlines(True)
+        self._pending = data[end + 1 :]
+        return self._load_lines(lines)
+
+    def close(self):
+        """Parse the last line, once no more data will arrive
+
+        Returns:
+            list: the InternalMessages of the last line, if it is a frame
+        """
+        lines = [self._pending] if self._pending else []
+        self._pending = b""
+        messages = self._load_lines(lines)
+        if self._decoder is None and self._header_lines:
+            # There are no events, but the header can still be parsed
+            self._parse_header()
+        return messages
+
+    def _load_lines(self, lines):
+        lines = [line.decode(_BINARY_ENCODING) for line in lines]
+        if self._decoder is None:
+            lines = self._load_header(lines)
+            if self._decoder is None:
+                return []
+        return list(_iter_messages(self._decoder, _iter_event_tokens(None, lines)))
+
+    def _load_header(self, lines):
+        """Collect header lines until the first event, then parse them
+
+        Returns:
+            list: the lines from the first event on
+        """
+        for number, line in enumerate(lines):
+            tokens = line.split()
+            if tokens and _is_event(tokens):
+                break
+            self._header_lines.append(line)
+        else:
+            return []
+
+        self._parse_header()
+        return lines[number:]
+
+    def _parse_header(self):
+        self._header, first_tokens = _load_header(iter(self._header_lines))
+        _check_header(self._header)
+        self._decoder = _EventDecoder(self._header, self._message_filter)
+        self._header_lines = None
+
+
+def iter_messages(fileobj, message_filter=None, stats=None):
+    """Lazily parse the CAN frames of an ASC file
+
+    The header is parsed once up front, then every event is decoded as it is
+    read, so memory usage does not depend on the size of the file.
+
+    Args:
+        fileobj (file): a file object opened in text mode, any other
+            iterable of lines, or a byte buffer such as a memory-mapped file
+        message_filter (MessageFilter): only return the accepted messages
+        stats (ConversionStats): record the time spent reading, tokenizing
+            and building messages
+
+    Returns:
+        iterator: an iterator over the InternalMessages in the file
+    """
+    header, decoder, events = _load_source(fileobj, message_filter, stats)
+    return _iter_messages(decoder, events, stats)
+
+
+def load_file(fileobj, message_filter=None, stats=None):
+    """Parse the given ASC file object
+
+    The returned trace's messages are a one-shot iterator that is backed by
+    the file object, so it must remain open until the messages have been
+    consumed.
+
+    Args:
+        fileobj: see iter_messages
+        message_filter (MessageFilter): see iter_messages
+        stats (ConversionStats): see iter_messages
+
+    Returns:
+        InternalTrace
+    """
+    header, decoder, events = _load_source(fileobj, message_filter, stats)
+    return InternalTrace(
+        messages=_iter_messages(decoder, events, stats),
+        start_timestamp=_load_date(header["date"]) if header["date"] else None,
+    )
+
+
+def load_string(string):
+    """Parse the given string
+
+    The messages are stored in a ColumnarMessages.
+
+    Args:
+        string (str): a string containing the ASC file's contents
+
+    Returns:
+        InternalTrace
+    """
+    header, decoder, events = _load_source(string.splitlines(), None)
+
+    messages = ColumnarMessages()
+    for tokens in events:
+        fields = decoder.fields(tokens)
+        if fields is not None:
+            messages.append_row(*fields)
+
+    return InternalTrace(
+        messages=messages,
+        start_timestamp=_load_date(header["date"]) if header["date"] else None,
+    )
+
+
+# Equivalent to the header, rows and footer of the asc.j2 template
+_ASC_HEADER_FORMAT = """\
+date {date}
+base hex  timestamps absolute
+no internal events logged
+// version 7.0.0
+Begin Triggerblock {date}
+   0.000000 Start of measurement
+"""
+# Rows are formatted from the timestamp and the rest of the row, which only
+# depends on the message's bus, ID, direction, type, DLC and data length and
+# is cached
+_ASC_ROW_FORMAT = "%11.6f %s%s\n"
+_ASC_FRAME_FORMAT = "%-2d %-15s %-4s d %X"
+_ASC_FD_FRAME_FORMAT = "CANFD %3d %-4s %8s  %s %X %2d"
+_ASC_REMOTE_FRAME_FORMAT = "%-2d %-15s %-4s r %X"
+_ASC_ERROR_FRAME_FORMAT = "%-2d ErrorFrame"
+_ASC_FOOTER = "End TriggerBlock\n"
+
+# The bit rate switch and error state indicator bits of CAN FD frames
+_FD_FRAME_BITS = dict(
+    (message_type, " ".join(bits)) for bits, message_type in _FD_FRAME_TYPES.items()
+)
+
+# Message types that are not written to ASC files
+_SKIPPED_MESSAGE_TYPES = frozenset(
+    [InternalMessageType.ST, InternalMessageType.EC, InternalMessageType.EV]
+)
+
+_message_fields = operator.attrgetter(
+    "timestamp",
+    "bus_number",
+    "arbitration_id",
+    "direction",
+    "message_type",
+    "dlc",
+    "data",
+)
+
+# Message types that are written without their data
+_DATALESS_MESSAGE_TYPES = frozenset([InternalMessageType.RR, InternalMessageType.ER])
+
+# The maximum number of cached row prefixes
+_MAX_PREFIXES = 65536
+
+
+def _format_prefix(bus, arbitration_id, direction, message_type, dlc, length):
+    if message_type in _SKIPPED_MESSAGE_TYPES:
+        return ""
+    if message_type == InternalMessageType.ER:
+        return _ASC_ERROR_FRAME_FORMAT % bus
+
+    if arbitration_id > MAX_STANDARD_ARBITRATION_ID:
+        arbitration_id = "%Xx" % arbitration_id
+    else:
+        arbitration_id = "%X" % arbitration_id
+    direction = DIRECTION_TO_TRC_STRING[direction]
+
+    if message_type == InternalMessageType.RR:
+        return _ASC_REMOTE_FRAME_FORMAT % (bus, arbitration_id, direction, dlc)
+
+    if message_type in _FD_FRAME_BITS:
+        if dlc > 15 or length != FD_DATA_LENGTHS[dlc]:
+            raise ValueError(
+                "A CAN FD frame with a DLC of {} can't hold {} data "
+                "bytes".format(dlc, length)
+            )
+        bits = _FD_FRAME_BITS[message_type]
+        return _ASC_FD_FRAME_FORMAT % (
+            bus,
+            direction,
+            arbitration_id,
+            bits,
+            dlc,
+            length,
+        )
+
+    # DLCs above 8 mean 8 bytes for classic CAN frames
+    if length != min(dlc, 8):
+        raise ValueError(
+            "A CAN frame with a DLC of {} can't hold {} data bytes".format(dlc, length)
+        )
+    return _ASC_FRAME_FORMAT % (bus, arbitration_id, direction, dlc)
+
+
+class AscWriter(TraceWriter):
+    """Stream messages to a file object in the ASC format
+
+    The output is identical to InternalTrace.as_asc_string, followed by a
+    trailing newline.
+
+    Rows are formatted a batch at a time: the payloads of a batch are
+    hex-encoded together, and the batch is formatted by a single string
+    formatting operation. A ColumnarMessages is formatted straight from its
+    columns, without creating any InternalMessages.
+    """
+
+    def __init__(self, fileobj, start_timestamp=None, buffer_size=4096, **kwargs):
+        self._prefixes = {}
+        super(AscWriter, self).__init__(fileobj, start_timestamp, buffer_size, **kwargs)
+
+    def _format_header(self):
+        trace = InternalTrace(start_timestamp=self._start_timestamp, messages=[])
+        return _ASC_HEADER_FORMAT.format(date=trace.start_timestamp_as_asc_string)
+
+    def _format_footer(self):
+        return _ASC_FOOTER
+
+    def _format_row(self, index, message):
+        return self._format_rows(index, [message])[0]
+
+    def _format_rows(self, index, messages):
+        (
+            timestamps,
+            buses,
+            arbitration_ids,
+            directions,
+            message_types,
+            dlcs,
+            payloads,
+        ) = zip(*map(_message_fields, messages))
+        payloads = list(map(bytes, payloads))
+        return [
+            self._format_columns(
+                list(map(float, timestamps)),
+                buses,
+                arbitration_ids,
+                directions,
+                message_types,
+                dlcs,
+                list(itertools.accumulate(map(len, payloads))),
+                b"".join(payloads),
+            )
+        ]
+
+    def _format_columns(
+        self,
+        timestamps,
+        buses,
+        arbitration_ids,
+        directions,
+        message_types,
+        dlcs,
+        ends,
+        payload,
+    ):
+        """Format a batch of messages given as columns
+
+        Args:
+            ends (list): the end offset of every message's data in payload
+            payload (bytes): the data of all of the messages, back to back
+        """
+        # Every byte of the payload takes up three characters, including the
+        # space in front of it
+        hex_payload = " " + format_data(payload) if payload else ""
+
+        prefixes = self._prefixes
+        if len(prefixes) > _MAX_PREFIXES:
+            prefixes.clear()
+        lengths = map(operator.sub, ends, itertools.chain([0], ends))
+        keys = list(
+            zip(buses, arbitration_ids, directions, message_types, dlcs, lengths)
+        )
+        row_prefixes = list(map(prefixes.get, keys))
+        if None in row_prefixes:
+            for index, key in enumerate(keys):
+                if row_prefixes[index] is None:
+                    prefix = prefixes.get(key)
+                    if prefix is None:
+                        prefix = prefixes[key] = _format_prefix(*key)
+                    row_prefixes[index] = prefix
+
+        data = [
+            hex_payload[3 * start : 3 * end]
+            for start, end in zip(itertools.chain([0], ends), ends)
+        ]
+        if not _DATALESS_MESSAGE_TYPES.isdisjoint(message_types):
+            data = [
+                "" if message_type in _DATALESS_MESSAGE_TYPES else row_data
+                for message_type, row_data in zip(message_types, data)
+            ]
+        seconds = [timestamp / 1000.0 for timestamp in timestamps]
+
+        if "" in row_prefixes:
+            rows = [row for row in zip(seconds, row_prefixes, data) if row[1]]
+        else:
+            rows = zip(seconds, row_prefixes, data)
+        values = tuple(itertools.chain.from_iterable(rows))
+        return (_ASC_ROW_FORMAT * (len(values) // 3)) % values
+
+    def write_messages(self, messages):
+        """Write all of the given messages
+
+        Args:
+            messages (iterable): the messages to write
+        """
+        if not isinstance(messages, ColumnarMessages):
+            super(AscWriter, self).write_messages(messages)
+            return
+
+        offsets = messages.payload_offsets
+        for start in range(0, len(messages), self._buffer_size):
+            end = min(start + self._buffer_size, len(messages))
+            base = offsets[start]
+            self._buffer.append(
+                self._format_columns(
+                    messages.timestamps[start:end],
+                    messages.buses[start:end],
+                    messages.arbitration_ids[start:end],
+                    messages.directions[start:end],
+                    messages.message_types[start:end],
+                    messages.dlcs[start:end],
+                    [offset - base for offset in offsets[start + 1 : end + 1]],
+                    messages.payload[base : offsets[end]],
+                )
+            )
+            self._count += end - start
+            self.flush()
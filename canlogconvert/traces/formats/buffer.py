@@ -0,0 +1,130 @@
+"""Byte-level access to trace files
+
+Readers can work on any object supporting the buffer protocol, such as
+``bytes`` or a memory-mapped file. Rows are sliced out of the buffer one at
+a time, so the file is never copied or decoded as a whole, and several
+passes over the same mapping share the operating system's page cache.
+"""
+import contextlib
+import mmap
+
+
+def is_buffer(source):
+    """Whether the given source should be read as a byte buffer
+
+    Args:
+        source: a file object, an iterable of lines, or a byte buffer
+
+    Returns:
+        bool
+    """
+    return isinstance(source, (bytes, bytearray, mmap.mmap))
+
+
+@contextlib.contextmanager
+def open_mmap(path):
+    """Memory-map the file at the given path for reading
+
+    Args:
+        path (str): the path to the file
+
+    Yields:
+        mmap.mmap: the mapped file, or an empty bytes object for empty files,
+            which cannot be mapped
+    """
+    with open(path, "rb") as fin:
+        try:
+            buffer = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield b""
+            return
+
+        try:
+            yield buffer
+        finally:
+            try:
+                buffer.close()
+            except BufferError:
+                # Zero-copy views into the mapping are still alive, it will
+                # be unmapped once they have been garbage collected
+                pass
+
+
+def iter_lines(buffer, start=0, end=None, block_size=1024 * 1024):
+    """Iterate over the lines of a byte buffer
+
+    Lines are split out of blocks of about ``block_size`` bytes at a time,
+    so only a single block is copied out of the buffer at once.
+
+    Args:
+        buffer: the byte buffer
+        start (int): the offset of the first line
+        end (int): the offset at which to stop, which should be at a line
+            boundary (defaults to the end of the buffer)
+        block_size (int): the approximate number of bytes to split at once
+
+    Returns:
+        iterator: the lines as bytes, without their line terminator
+    """
+    if end is None:
+        end = len(buffer)
+
+    position = start
+    while position < end:
+        block_end = find_line_start(buffer, min(position + block_size, end), end)
+        lines = buffer[position:block_end].split(b"\n")
+        if not lines[-1]:
+            # The block ends with a newline
+            lines.pop()
+        for line in lines:
+            yield line
+        position = block_end
+
+
+def iter_lines_with_offsets(buffer, start=0, end=None, block_size=1024 * 1024):
+    """Iterate over the lines of a byte buffer along with their offsets
+
+    Args:
+        see iter_lines
+
+    Returns:
+        iterator: tuples of the offset of each line, and the line as bytes
+            without its line terminator
+    """
+    if end is None:
+        end = len(buffer)
+
+    position = start
+    while position < end:
+        block_end = find_line_start(buffer, min(position + block_size, end), end)
+        lines = buffer[position:block_end].split(b"\n")
+        if not lines[-1]:
+            # The block ends with a newline
+            lines.pop()
+        for line in lines:
+            yield position, line
+            position += len(line) + 1
+        position = block_end
+
+
+def find_line_start(buffer, position, end=None):
+    """Find the start of the first line that begins at or after position
+
+    Args:
+        buffer: the byte buffer
+        position (int): the offset to search from
+        end (int): the offset at which to stop searching
+
+    Returns:
+        int: the offset of the line, or end if there are no more lines
+    """
+    if end is None:
+        end = len(buffer)
+
+    if position <= 0:
+        return 0
+
+    newline = buffer.find(b"\n", position - 1, end)
+    if newline == -1:
+        return end
+    return newline + 1
@@ -0,0 +1,371 @@
+"""Operations on a CLTB file
+
+CLTB (canlogconvert trace binary) is a compact cache of an InternalTrace,
+meant to be reloaded much faster than re-parsing the original trace. All
+values are little-endian, and every section starts on an 8 byte boundary.
+
+    +-----------------+---------------------------------------------------+
+    | Section         | Contents                                          |
+    +=================+===================================================+
+    | Header          | magic ``CLTB``, format version (uint16), bus      |
+    |                 | bitmask (uint16), frame count (uint64), payload   |
+    |                 | size (uint64), start time (int64), start          |
+    |                 | timestamp length (uint32)                         |
+    +-----------------+---------------------------------------------------+
+    | Start timestamp | UTF-8 encoded InternalTrace.start_timestamp       |
+    +-----------------+---------------------------------------------------+
+    | Timestamps      | float64 per frame                                 |
+    +-----------------+---------------------------------------------------+
+    | Arbitration IDs | uint32 per frame                                  |
+    +-----------------+---------------------------------------------------+
+    | DLCs            | uint16 per frame                                  |
+    +-----------------+---------------------------------------------------+
+    | Directions      | uint8 per frame (InternalMessageDirection)        |
+    +-----------------+---------------------------------------------------+
+    | Message types   | uint8 per frame (InternalMessageType)             |
+    +-----------------+---------------------------------------------------+
+    | Buses           | uint8 per frame                                   |
+    +-----------------+---------------------------------------------------+
+    | Payload offsets | uint64 per frame, followed by the payload size    |
+    +-----------------+---------------------------------------------------+
+    | Payload         | the payloads of all frames, back to back          |
+    +-----------------+---------------------------------------------------+
+
+Bit ``n - 1`` of the bus bitmask is set if any frame was on bus ``n``, or
+if bus ``n`` was listed in the buses of the trace. The bitmask is 0 if a
+frame was on a bus it can't represent, outside of 1 to 16, in which case the
+buses are collected from the frames when the file is loaded.
+
+The start time is the absolute start time of the trace (such as the
+``;$STARTTIME`` of a TRC file) in microseconds since 1970-01-01, or the
+smallest int64 if it is not known. Version 1 files have no start time.
+
+Each per-frame field is stored as a fixed-width column rather than as an
+interleaved record, so a mapped file can be viewed as typed arrays without
+copying or unpacking anything.
+"""
+import array
+import datetime
+import shutil
+import struct
+import sys
+import tempfile
+
+from canlogconvert.traces.formats import buffer
+from canlogconvert.traces.formats.internal_trace import ColumnarMessages
+from canlogconvert.traces.formats.internal_trace import InternalTrace
+
+MAGIC = b"CLTB"
+FORMAT_VERSION = 2
+
+_PREFIX = struct.Struct("<4sH")
+
+# The header of every supported format version
+_HEADERS = {1: struct.Struct("<4sHHQQI"), 2: struct.Struct("<4sHHQQqI")}
+
+# The buses that can be recorded in the bitmask
+_MASK_BUSES = range(1, 17)
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# The start time of traces whose start time is not known
+_NO_START_TIME = -(1 << 63)
+
+# (typecode, width in bytes) of every column, in file order
+_COLUMNS = [
+    ("d", 8),  # timestamps
+    ("I", 4),  # arbitration IDs
+    ("H", 2),  # DLCs
+    ("B", 1),  # directions
+    ("B", 1),  # message types
+    ("B", 1),  # buses
+    ("Q", 8),  # payload offsets
+]
+
+_ALIGNMENT = 8
+
+
+def _padding(size):
+    return -size % _ALIGNMENT
+
+
+def _pack_start_time(start_time):
+    if start_time is None:
+        return _NO_START_TIME
+    delta = start_time - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _unpack_start_time(start_time):
+    if start_time == _NO_START_TIME:
+        return None
+    return _EPOCH + datetime.timedelta(microseconds=start_time)
+
+
+def _to_little_endian(column):
+    if sys.byteorder == "big" and column.itemsize > 1:
+        column = array.array(column.typecode, column)
+        column.byteswap()
+    return column
+
+
+class CltbWriter(object):
+    """Stream messages to a binary file object in the CLTB format
+
+    Columns are spooled to temporary files in chunks of ``buffer_size``
+    messages, and copied to the output once the frame count is known. The
+    output does not need to be seekable.
+    """
+
+    binary = True
+
+    def __init__(
+        self,
+        fileobj,
+        start_timestamp=None,
+        buffer_size=65536,
+        start_time=None,
+        buses=None,
+    ):
+        """Create a new CltbWriter
+
+        Args:
+            fileobj (file): a file object opened in binary mode
+            start_timestamp (str): the start time of the trace
+            buffer_size (int): the number of messages to buffer between
+                writes to the spool files
+            start_time (datetime.datetime): the absolute start time of the
+                trace, if known
+            buses (list): the numbers of the buses of the trace, which are
+                recorded along with the buses of the messages
+        """
+        self._fileobj = fileobj
+        self._start_timestamp = start_timestamp
+        self._start_time = start_time
+        self._buffer_size = buffer_size
+        self._count = 0
+        self._payload_size = 0
+        self._bus_mask = 0
+        # Whether every bus is in the bitmask
+        self._masked = True
+        for bus in buses or ():
+            self._add_bus(bus)
+
+        self._columns = [array.array(typecode) for typecode, width in _COLUMNS]
+        self._payload = bytearray()
+        self._spools = [tempfile.TemporaryFile() for _ in range(len(_COLUMNS) + 1)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def count(self):
+        """int: the number of messages written so far"""
+        return self._count
+
+    def _add_bus(self, bus):
+        if bus in _MASK_BUSES:
+            self._bus_mask |= 1 << (bus - 1)
+        else:
+            self._masked = False
+
+    def write(self, message):
+        """Write a single message
+
+        Args:
+            message (InternalMessage): the message to write
+        """
+        (
+            timestamps,
+            arbitration_ids,
+            dlcs,
+            directions,
+            message_types,
+            buses,
+            payload_offsets,
+        ) = self._columns
+
+        timestamps.append(float(message.timestamp))
+        arbitration_ids.append(message.arbitration_id)
+        dlcs.append(message.dlc)
+        directions.append(message.direction)
+        message_types.append(message.message_type)
+        buses.append(message.bus_number)
+        payload_offsets.append(self._payload_size)
+
+        self._payload.extend(message.data)
+        self._payload_size += len(message.data)
+        self._add_bus(message.bus_number)
+        self._count += 1
+
+        if len(timestamps) >= self._buffer_size:
+            self.flush()
+
+    def write_messages(self, messages):
+        """Write all of the given messages
+
+        Args:
+            messages (iterable): the messages to write
+        """
+        for message in messages:
+            self.write(message)
+
+    def flush(self):
+        """Write out the buffered messages to the spool files"""
+        for spool, column in zip(self._spools, self._columns):
+            _to_little_endian(column).tofile(spool)
+            del column[:]
+
+        self._spools[-1].write(self._payload)
+        del self._payload[:]
+
+    def close(self):
+        """Write the complete file
+
+        The underlying file object is left open.
+        """
+        self.flush()
+        # Terminate the payload offsets with the payload size
+        _to_little_endian(array.array("Q", [self._payload_size])).tofile(
+            self._spools[len(_COLUMNS) - 1]
+        )
+
+        start_timestamp = (self._start_timestamp or "").encode("utf-8")
+        header = _HEADERS[FORMAT_VERSION].pack(
+            MAGIC,
+            FORMAT_VERSION,
+            self._bus_mask if self._masked else 0,
+            self._count,
+            self._payload_size,
+            _pack_start_time(self._start_time),
+            len(start_timestamp),
+        )
+        self._write_section(header + start_timestamp)
+
+        for spool in self._spools:
+            size = spool.tell()
+            spool.seek(0)
+            shutil.copyfileobj(spool, self._fileobj)
+            self._fileobj.write(b"\0" * _padding(size))
+            spool.close()
+
+        self._fileobj.flush()
+
+    def _write_section(self, data):
+        self._fileobj.write(data)
+        self._fileobj.write(b"\0" * _padding(len(data)))
+
+
+def _load_header(source):
+    if len(source) < _PREFIX.size:
+        raise ValueError("Truncated CLTB header")
+    magic, version = _PREFIX.unpack_from(source)
+    if magic != MAGIC:
+        raise ValueError("Not a CLTB file")
+    if version not in _HEADERS:
+        raise ValueError("Unsupported CLTB version", version)
+
+    header_format = _HEADERS[version]
+    if len(source) < header_format.size:
+        raise ValueError("Truncated CLTB header")
+    fields = header_format.unpack_from(source)
+    bus_mask, count, payload_size = fields[2:5]
+    start_time = fields[5] if version >= 2 else _NO_START_TIME
+    timestamp_length = fields[-1]
+
+    start = header_format.size
+    start_timestamp = bytes(source[start : start + timestamp_length]).decode("utf-8")
+
+    return {
+        "buses": [bus for bus in _MASK_BUSES if bus_mask & (1 << (bus - 1))],
+        "start_time": _unpack_start_time(start_time),
+        "count": count,
+        "payload_size": payload_size,
+        "start_timestamp": start_timestamp or None,
+        "columns_offset": start + timestamp_length + _padding(start + timestamp_length),
+    }
+
+
+def load_buffer(source, copy=False):
+    """Load a CLTB file from a byte buffer
+
+    Args:
+        source: a byte buffer such as a memory-mapped file
+        copy (bool): copy the columns into arrays. Otherwise the columns are
+            typed memoryviews into the buffer, which must stay alive as long
+            as the trace is in use. On big-endian hosts the columns are
+            always byte-swapped copies.
+
+    Returns:
+        InternalTrace: a trace whose messages are a ColumnarMessages
+    """
+    header = _load_header(source)
+    count = header["count"]
+    view = memoryview(source)
+
+    columns = []
+    position = header["columns_offset"]
+    for index, (typecode, width) in enumerate(_COLUMNS):
+        # There is one more payload offset than there are frames
+        length = count + 1 if index == len(_COLUMNS) - 1 else count
+        size = length * width
+        if position + size > len(source):
+            raise ValueError("Truncated CLTB file")
+
+        data = view[position : position + size]
+        if sys.byteorder == "big":
+            column = array.array(typecode)
+            column.frombytes(data)
+            column.byteswap()
+        else:
+            column = data.cast(typecode)
+        columns.append(column)
+        position += size + _padding(size)
+
+    payload = view[position : position + header["payload_size"]]
+    if len(payload) < header["payload_size"]:
+        raise ValueError("Truncated CLTB file")
+
+    # The payload goes between the buses and the payload offsets
+    payload_offsets = columns.pop()
+    messages = ColumnarMessages.from_columns(*(columns + [payload, payload_offsets]))
+    if copy:
+        views = messages
+        messages = ColumnarMessages()
+        messages.extend_columns(views)
+
+    return InternalTrace(
+        messages=messages,
+        start_timestamp=header["start_timestamp"],
+        start_time=header["start_time"],
+        # An empty bitmask can't be told apart from an unrepresentable one
+        buses=header["buses"] or None,
+    )
+
+
+def load_file(source):
+    """Load a CLTB file from a byte buffer without copying it
+
+    Args:
+        source: a byte buffer such as a memory-mapped file
+
+    Returns:
+        InternalTrace
+    """
+    return load_buffer(source)
+
+
+def load_path(path):
+    """Load the CLTB file at the given path into memory
+
+    Args:
+        path (str): the path to the file
+
+    Returns:
+        InternalTrace
+    """
+    with buffer.open_mmap(path) as source:
+        return load_buffer(source, copy=True)
@@ -0,0 +1,105 @@
+"""Transparent compression of trace files
+
+Compressed files are recognised by their suffix, such as ``trace.trc.gz``,
+or failing that by the magic bytes at the start of the file. They are
+decompressed and compressed as a stream, without any temporary files.
+
+    +--------+-----------+-----------------------+
+    | Suffix | Format    | Magic bytes           |
+    +========+===========+=======================+
+    | .gz    | gzip      | ``1f 8b``             |
+    +--------+-----------+-----------------------+
+    | .bz2   | bzip2     | ``BZh``               |
+    +--------+-----------+-----------------------+
+    | .xz    | xz (LZMA) | ``fd 37 7a 58 5a 00`` |
+    +--------+-----------+-----------------------+
+"""
+import bz2
+import gzip
+import lzma
+import os
+
+GZIP = "gzip"
+BZIP2 = "bz2"
+XZ = "xz"
+
+SUFFIXES = {".gz": GZIP, ".bz2": BZIP2, ".xz": XZ}
+
+_MAGIC_BYTES = [(b"\x1f\x8b", GZIP), (b"BZh", BZIP2), (b"\xfd7zXZ\x00", XZ)]
+
+# Compressing is much slower than decompressing, gzip's default level of 9
+# is rarely worth it
+_OPENERS = {
+    GZIP: lambda path, mode, **kwargs: gzip.open(path, mode, compresslevel=6, **kwargs),
+    BZIP2: bz2.open,
+    XZ: lzma.open,
+}
+
+
+def split_extension(path):
+    """Split a path into its trace format extension and its compression
+
+    Args:
+        path (str): the path to the file
+
+    Returns:
+        tuple: the path without its extensions, the extension of the trace
+            format (such as ``.trc``), and the compression given by the
+            suffix, or None
+    """
+    root, extension = os.path.splitext(path)
+    compression = SUFFIXES.get(extension.lower())
+    if compression is not None:
+        root, extension = os.path.splitext(root)
+    return root, extension, compression
+
+
+def detect_compression(path):
+    """Detect the compression of an existing file
+
+    The suffix of the path is checked first, then the magic bytes at the
+    start of the file.
+
+    Args:
+        path (str): the path to the file
+
+    Returns:
+        str: the compression, or None if the file is not compressed
+    """
+    compression = split_extension(path)[2]
+    if compression is not None:
+        return compression
+
+    with open(path, "rb") as fin:
+        head = fin.read(6)
+    for magic, compression in _MAGIC_BYTES:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def open_file(path, mode="rb", compression=None, encoding=None):
+    """Open a file, decompressing or compressing it as a stream
+
+    Args:
+        path (str): the path to the file
+        mode (str): the mode to open the file in, such as ``rb`` or ``wt``
+        compression (str): the compression, or None to open the file as is
+        encoding (str): the encoding of files opened in text mode
+
+    Returns:
+        file: a file object
+    """
+    if compression is None:
+        opener = open
+    else:
+        try:
+            opener = _OPENERS[compression]
+        except KeyError:
+            raise ValueError("Unsupported compression '{}'".format(compression))
+
+    if "b" in mode:
+        return opener(path, mode)
+    if "t" not in mode:
+        mode += "t"
+    return opener(path, mode, encoding=encoding)
@@ -0,0 +1,150 @@
+"""Sparse timestamp indexes for trace files
+
+An index records the timestamp and byte offset of every ``stride``-th
+message of a trace file, so that a time window can be read by seeking close
+to its start instead of parsing the file from the beginning. Timestamps in
+the trace are assumed to be monotonically increasing.
+
+Indexes are stored next to the trace, in a file with an ``.idx`` suffix.
+"""
+import array
+import bisect
+import os
+import struct
+import sys
+
+MAGIC = b"CLTI"
+FORMAT_VERSION = 1
+
+# magic, format version, stride, size and modification time of the trace,
+# byte offset of the first message, number of entries
+_HEADER = struct.Struct("<4sHIQdQQ")
+
+
+def index_path(path):
+    """The path of the index for the trace file at the given path"""
+    return path + ".idx"
+
+
+def _to_little_endian(column):
+    if sys.byteorder == "big":
+        column = array.array(column.typecode, column)
+        column.byteswap()
+    return column
+
+
+class TimestampIndex(object):
+    """Sparse index from message timestamps to byte offsets
+
+    Attributes:
+        stride (int): the number of messages between entries
+        body_offset (int): the byte offset of the first message
+        timestamps (array.array): the timestamp of every entry
+        offsets (array.array): the byte offset of every entry
+    """
+
+    def __init__(self, stride, body_offset=0, size=0, mtime=0.0):
+        """Create a new, empty TimestampIndex
+
+        Args:
+            stride (int): the number of messages between entries
+            body_offset (int): the byte offset of the first message
+            size (int): the size of the indexed file
+            mtime (float): the modification time of the indexed file
+        """
+        self._stride = stride
+        self._body_offset = body_offset
+        self._size = size
+        self._mtime = mtime
+        self._timestamps = array.array("d")
+        self._offsets = array.array("Q")
+
+    @property
+    def stride(self):
+        return self._stride
+
+    @property
+    def body_offset(self):
+        return self._body_offset
+
+    @property
+    def timestamps(self):
+        return self._timestamps
+
+    @property
+    def offsets(self):
+        return self._offsets
+
+    def add(self, timestamp, offset):
+        """Add an entry to the index"""
+        self._timestamps.append(timestamp)
+        self._offsets.append(offset)
+
+    def lookup(self, timestamp):
+        """Find where to start reading to find messages at a given time
+
+        Args:
+            timestamp (float): the earliest timestamp of interest
+
+        Returns:
+            int: the byte offset of the last indexed message before the
+                timestamp, or of the first message
+        """
+        position = bisect.bisect_left(self._timestamps, timestamp)
+        if position == 0:
+            return self._body_offset
+        return self._offsets[position - 1]
+
+    def matches(self, path):
+        """Whether the index is up to date with the file at the given path"""
+        stat = os.stat(path)
+        return stat.st_size == self._size and stat.st_mtime == self._mtime
+
+    def save(self, path):
+        """Write the index to the given path"""
+        with open(path, "wb") as fout:
+            fout.write(
+                _HEADER.pack(
+                    MAGIC,
+                    FORMAT_VERSION,
+                    self._stride,
+                    self._size,
+                    self._mtime,
+                    self._body_offset,
+                    len(self._timestamps),
+                )
+            )
+            _to_little_endian(self._timestamps).tofile(fout)
+            _to_little_endian(self._offsets).tofile(fout)
+
+    @classmethod
+    def load(cls, path):
+        """Read an index from the given path
+
+        Raises:
+            ValueError: if the file is not a valid index
+        """
+        with open(path, "rb") as fin:
+            header = fin.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ValueError("Truncated index header")
+
+            magic, version, stride, size, mtime, body_offset, count = _HEADER.unpack(
+                header
+            )
+            if magic != MAGIC:
+                raise ValueError("Not an index file")
+            if version != FORMAT_VERSION:
+                raise ValueError("Unsupported index version", version)
+
+            index = cls(stride, body_offset, size, mtime)
+            try:
+                index._timestamps.fromfile(fin, count)
+                index._offsets.fromfile(fin, count)
+            except EOFError:
+                raise ValueError("Truncated index file")
+
+        if sys.byteorder == "big":
+            index._timestamps.byteswap()
+            index._offsets.byteswap()
+        return index
@@ -1,8 +1,12 @@
 """Internal representation of a CAN trace.
 """
 
-from jinja2 import Environment, PackageLoader, select_autoescape
+import array
+import binascii
 import datetime
+import functools
+import os
+import re
 
 
 class InternalMessageDirection(object):
@@ -37,10 +41,232 @@ class InternalMessageType(object):
     EV = 10
 
 
+DIRECTION_TO_TRC_STRING = {
+    InternalMessageDirection.RX: "Rx",
+    InternalMessageDirection.TX: "Tx",
+}
+
+TRC_STRING_TO_DIRECTION = {
+    "Rx": InternalMessageDirection.RX,
+    "Tx": InternalMessageDirection.TX,
+}
+
+MESSAGE_TYPE_TO_TRC_STRING = {
+    InternalMessageType.DT: "DT",
+    InternalMessageType.FD: "FD",
+    InternalMessageType.FB: "FB",
+    InternalMessageType.FE: "FE",
+    InternalMessageType.BI: "BI",
+    InternalMessageType.RR: "RR",
+    InternalMessageType.ST: "ST",
+    InternalMessageType.EC: "EC",
+    InternalMessageType.ER: "ER",
+    InternalMessageType.EV: "EV",
+}
+
+TRC_STRING_TO_MESSAGE_TYPE = {
+    string: message_type for message_type, string in MESSAGE_TYPE_TO_TRC_STRING.items()
+}
+
+# Arbitration IDs above this are written as extended (29-bit) IDs
+MAX_STANDARD_ARBITRATION_ID = 0x7FF
+
+# The number of data bytes of a CAN FD frame, by DLC
+FD_DATA_LENGTHS = [0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20, 24, 32, 48, 64]
+
+_FD_DLCS = {length: dlc for dlc, length in enumerate(FD_DATA_LENGTHS)}
+
+
+def data_length_to_dlc(length):
+    """Return the DLC of a frame holding the given number of data bytes
+
+    Args:
+        length (int): the number of data bytes, above 8 for CAN FD frames
+
+    Returns:
+        int: the DLC
+
+    Raises:
+        ValueError: if no DLC stands for the number of data bytes
+    """
+    if length not in _FD_DLCS:
+        raise ValueError("No DLC stands for {} data bytes".format(length))
+    return _FD_DLCS[length]
+
+
+# The start time of a trace, as in the "Start time" comment of a TRC file:
+# 2019-01-09 18:34:16.883.5 where the last digit is in tenths of milliseconds
+_START_TIMESTAMP_PATTERN = re.compile(
+    r"\s*(\d{4}-\d{1,2}-\d{1,2} \d{1,2}:\d{2}:\d{2})(?:\.(\d{1,3})(?:\.(\d))?)?\s*$"
+)
+
+# Used when a trace does not have a start time
+_DEFAULT_START_DATETIME = datetime.datetime(2019, 1, 9, 18, 34, 16)
+
+
+def parse_start_timestamp(start_timestamp):
+    """Parse the start time of a trace
+
+    Args:
+        start_timestamp (str): the start time, formatted like the "Start
+            time" comment of a TRC file
+
+    Returns:
+        datetime.datetime: the start time, or None if it could not be parsed
+    """
+    if not start_timestamp:
+        return None
+
+    match = _START_TIMESTAMP_PATTERN.match(start_timestamp)
+    if match is None:
+        return None
+
+    seconds, milliseconds, tenths = match.groups()
+    start = datetime.datetime.strptime(seconds, "%Y-%m-%d %H:%M:%S")
+    return start.replace(
+        microsecond=int((milliseconds or "0").ljust(3, "0")) * 1000
+        + int(tenths or "0") * 100
+    )
+
+
+def format_start_timestamp(start):
+    """Format the start time of a trace like the "Start time" comment of a
+    TRC file
+
+    Args:
+        start (datetime.datetime): the start time
+
+    Returns:
+        str: such as 2019-01-09 18:34:16.883.5
+    """
+    return "{}.{:03d}.{:d}".format(
+        start.strftime("%Y-%m-%d %H:%M:%S"),
+        start.microsecond // 1000,
+        start.microsecond % 1000 // 100,
+    )
+
+
+# The ;$STARTTIME of a TRC file counts days since this date
+_TRC_EPOCH = datetime.datetime(1899, 12, 30)
+
+_MICROSECONDS_PER_DAY = 86400 * 1000000
+
+
+def parse_trc_start_time(start_time):
+    """Parse the ``;$STARTTIME`` of a TRC file
+
+    Args:
+        start_time (str): the number of days since 1899-12-30, with the time
+            of day as the fractional part
+
+    Returns:
+        datetime.datetime: the start time, or None if it could not be parsed
+    """
+    try:
+        days = float(start_time)
+    except (TypeError, ValueError):
+        return None
+    # Ten decimal places of a day resolve about 9 microseconds, round to 10
+    return _TRC_EPOCH + datetime.timedelta(
+        microseconds=round(days * _MICROSECONDS_PER_DAY, -1)
+    )
+
+
+def format_trc_start_time(start):
+    """Format a start time as the ``;$STARTTIME`` of a TRC file
+
+    Args:
+        start (datetime.datetime): the start time
+
+    Returns:
+        str: such as 43474.7738065227
+    """
+    return "%.10f" % ((start - _TRC_EPOCH) / datetime.timedelta(days=1))
+
+
+def format_data(data):
+    """Format the data of messages as hex bytes separated by spaces
+
+    Args:
+        data: a bytes-like object
+
+    Returns:
+        str: such as 0A 00 FF
+    """
+    hex_digits = binascii.hexlify(data).upper()
+    # Every byte takes up three characters, including the space after it
+    spaced = bytearray(b" ") * (len(hex_digits) // 2 * 3)
+    spaced[0::3] = hex_digits[0::2]
+    spaced[1::3] = hex_digits[1::2]
+    return spaced[:-1].decode("ascii")
+
+
+# The environment variable naming the directory of the on-disk cache of
+# compiled templates. It defaults to a directory in the temporary directory
+# that is private to the user, and an empty value disables the cache.
+TEMPLATE_CACHE_VARIABLE = "CANLOGCONVERT_TEMPLATE_CACHE"
+
+
+def _bytecode_cache():
+    from jinja2 import FileSystemBytecodeCache
+
+    directory = os.environ.get(TEMPLATE_CACHE_VARIABLE)
+    if directory == "":
+        return None
+    try:
+        return FileSystemBytecodeCache(directory)
+    except (OSError, RuntimeError):
+        # The default directory can't be created, or is not safe to use
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _environment():
+    """The Jinja environment of the templates, created on first use
+
+    Jinja is only imported when a template is rendered, as the writers
+    format rows without it. The templates ship with the package and do not
+    change, so they are not checked for updates once they are loaded.
+    """
+    from jinja2 import Environment, PackageLoader
+
+    return Environment(
+        loader=PackageLoader("canlogconvert", "templates"),
+        bytecode_cache=_bytecode_cache(),
+        auto_reload=False,
+    )
+
+
+def get_template(name):
+    """Get one of the package's templates, such as ``trc.j2``
+
+    Templates are compiled once per process. The compiled code is also
+    cached on disk, so that other processes load it instead of compiling the
+    template again, see TEMPLATE_CACHE_VARIABLE.
+
+    Args:
+        name (str): the file name of the template
+
+    Returns:
+        jinja2.Template: the template, for InternalTrace.render
+    """
+    return _environment().get_template(name)
+
+
 class InternalMessage(object):
     """
     """
 
+    __slots__ = (
+        "_arbitration_id",
+        "_data",
+        "_dlc",
+        "_direction",
+        "_timestamp",
+        "_message_type",
+        "_bus_number",
+    )
+
     def __init__(self, arbitration_id, data, dlc, direction, timestamp):
         """Create a new TraceMessage"""
         self._arbitration_id = arbitration_id
@@ -62,6 +288,14 @@ class InternalMessage(object):
     def arbitration_id(self, arbitration_id):
         self._arbitration_id = arbitration_id
 
+    @property
+    def arbitration_id_as_asc_string(self):
+        # Extended IDs are suffixed with an x
+        arbitration_id = self.arbitration_id
+        if arbitration_id > MAX_STANDARD_ARBITRATION_ID:
+            return "%Xx" % arbitration_id
+        return "%X" % arbitration_id
+
     @property
     def data(self):
         """bytearray: a bytearray containing the CAN data"""
@@ -73,7 +307,11 @@ class InternalMessage(object):
 
     @property
     def data_as_trc_string(self):
-        return " ".join(["{:02X}".format(x) for x in self._data])
+        return format_data(bytes(self.data))
+
+    @property
+    def data_as_asc_string(self):
+        return format_data(bytes(self.data))
 
     @property
     def dlc(self):
@@ -95,29 +333,41 @@ class InternalMessage(object):
 
     @property
     def direction_as_trc_string(self):
-        direction_to_str_lookup = {
-            InternalMessageDirection.RX: "Rx",
-            InternalMessageDirection.TX: "Tx",
-        }
-        return direction_to_str_lookup[self._direction]
+        return DIRECTION_TO_TRC_STRING[self.direction]
 
     @property
     def timestamp(self):
-        """when the messages was received"""
+        """float: when the messages was received, as an offset in
+        milliseconds"""
         return self._timestamp
 
     @timestamp.setter
     def timestamp(self, timestamp):
         self._timestamp = timestamp
 
+    @property
+    def timestamp_as_trc_string(self):
+        # Float timestamps are offsets in milliseconds, with microsecond
+        # resolution
+        timestamp = self.timestamp
+        if isinstance(timestamp, float):
+            return "%.3f" % timestamp
+        return str(timestamp)
+
+    @property
+    def timestamp_as_asc_string(self):
+        # ASC timestamps are in seconds
+        return "%.6f" % (float(self.timestamp) / 1000.0)
+
     @property
     def bus(self):
-        """The CAN bus that this message was received on"""
-        return self._bus
+        """int: the CAN bus that this message was received on, the same as
+        bus_number"""
+        return self.bus_number
 
     @bus.setter
     def bus(self, bus):
-        self._bus = bus
+        self._bus_number = bus
 
     @property
     def message_type(self):
@@ -125,19 +375,7 @@ class InternalMessage(object):
 
     @property
     def message_type_as_trc_string(self):
-        message_type_to_str_lookup = {
-            InternalMessageType.DT: "DT",
-            InternalMessageType.FD: "FD",
-            InternalMessageType.FB: "FB",
-            InternalMessageType.FE: "FE",
-            InternalMessageType.BI: "BI",
-            InternalMessageType.RR: "RR",
-            InternalMessageType.ST: "ST",
-            InternalMessageType.EC: "EC",
-            InternalMessageType.ER: "ER",
-            InternalMessageType.EV: "EV",
-        }
-        return message_type_to_str_lookup[self._message_type]
+        return MESSAGE_TYPE_TO_TRC_STRING[self.message_type]
 
     @message_type.setter
     def message_type(self, message_type):
@@ -145,26 +383,404 @@ class InternalMessage(object):
 
     @property
     def bus_number(self):
+        """int: the number of the CAN bus, from 1, or 0 for events that are not
+        associated with a bus"""
         return self._bus_number
 
+    @bus_number.setter
+    def bus_number(self, bus_number):
+        self._bus_number = bus_number
+
+
+class MessageFilter(object):
+    """Select messages by arbitration ID, message type and direction
+
+    Readers apply filters to raw rows before creating any objects, so that
+    rejected rows are cheap to skip.
+    """
+
+    def __init__(
+        self, arbitration_ids=None, id_mask=None, message_types=None, directions=None
+    ):
+        """Create a new MessageFilter
+
+        Each criterion is ignored if it is None.
+
+        Args:
+            arbitration_ids (iterable): the arbitration IDs to accept
+            id_mask (int): only compare the bits of the arbitration IDs that
+                are set in the mask
+            message_types (iterable): the InternalMessageTypes to accept
+            directions (iterable): the InternalMessageDirections to accept
+        """
+        if id_mask is not None and arbitration_ids is None:
+            raise ValueError("An ID mask requires arbitration IDs to compare")
+
+        self._id_mask = id_mask
+        if arbitration_ids is None:
+            self._arbitration_ids = None
+        elif id_mask is None:
+            self._arbitration_ids = frozenset(arbitration_ids)
+        else:
+            self._arbitration_ids = frozenset(
+                arbitration_id & id_mask for arbitration_id in arbitration_ids
+            )
+        self._message_types = (
+            None if message_types is None else frozenset(message_types)
+        )
+        self._directions = None if directions is None else frozenset(directions)
+
+    @property
+    def filters_arbitration_id(self):
+        return self._arbitration_ids is not None
+
+    @property
+    def filters_message_type(self):
+        return self._message_types is not None
+
+    @property
+    def filters_direction(self):
+        return self._directions is not None
+
+    def accepts_fields(self, arbitration_id, message_type, direction):
+        """Whether a message with the given fields is accepted
+
+        Fields whose criterion is not set may be passed as None.
+        """
+        if self._arbitration_ids is not None:
+            if self._id_mask is not None:
+                arbitration_id &= self._id_mask
+            if arbitration_id not in self._arbitration_ids:
+                return False
+        if self._message_types is not None:
+            if message_type not in self._message_types:
+                return False
+        if self._directions is not None:
+            if direction not in self._directions:
+                return False
+        return True
+
+    def accepts(self, message):
+        """Whether the given InternalMessage is accepted"""
+        return self.accepts_fields(
+            message.arbitration_id, message.message_type, message.direction
+        )
+
+
+class ColumnarMessage(InternalMessage):
+    """A message of a ColumnarMessages
+
+    Fields that are set are written through to the columns, so that the
+    change is kept by the ColumnarMessages.
+    """
+
+    __slots__ = ("_messages", "_index")
+
+    def __init__(self, messages, index, *args, **kwargs):
+        """Create a new ColumnarMessage
+
+        Args:
+            messages (ColumnarMessages): the messages it is stored in
+            index (int): the index of the message
+        """
+        super(ColumnarMessage, self).__init__(*args, **kwargs)
+        self._messages = messages
+        self._index = index
+
+    @InternalMessage.arbitration_id.setter
+    def arbitration_id(self, arbitration_id):
+        self._messages._set_field("_arbitration_ids", self._index, arbitration_id)
+        self._arbitration_id = arbitration_id
+
+    @InternalMessage.data.setter
+    def data(self, data):
+        self._messages._set_data(self._index, data)
+        self._data = data
+
+    @InternalMessage.dlc.setter
+    def dlc(self, dlc):
+        self._messages._set_field("_dlcs", self._index, dlc)
+        self._dlc = dlc
+
+    @InternalMessage.direction.setter
+    def direction(self, direction):
+        self._messages._set_field("_directions", self._index, direction)
+        self._direction = direction
+
+    @InternalMessage.timestamp.setter
+    def timestamp(self, timestamp):
+        timestamp = float(timestamp)
+        self._messages._set_field("_timestamps", self._index, timestamp)
+        self._timestamp = timestamp
+
+    @InternalMessage.bus.setter
+    def bus(self, bus):
+        self.bus_number = bus
+
+    @InternalMessage.message_type.setter
+    def message_type(self, message_type):
+        self._messages._set_field("_message_types", self._index, message_type)
+        self._message_type = message_type
+
+    @InternalMessage.bus_number.setter
+    def bus_number(self, bus_number):
+        self._messages._set_field("_buses", self._index, bus_number)
+        self._bus_number = bus_number
+
+
+def _writable_column(column):
+    if isinstance(column, memoryview):
+        # Typed memoryviews, such as of a memory-mapped file, may be
+        # read-only
+        return array.array(column.format, column)
+    return column
+
+
+def _extend_column(column, values):
+    if isinstance(values, array.array) and values.typecode != column.typecode:
+        # Arrays can only be extended with arrays of the same type
+        values = iter(values)
+    column.extend(values)
+
+
+class ColumnarMessages(object):
+    """Column-oriented storage for the messages of a trace
+
+    Every field is stored in a typed array, and the payloads of all messages
+    are stored back to back in a single bytearray that is indexed by
+    ``payload_offsets``. This takes a few dozen bytes per message on top of
+    the payload, and the arrays can be scanned without creating any Python
+    objects.
+
+    The container behaves like a sequence of InternalMessages, which are only
+    created when they are accessed. Timestamps are stored as floats. When the
+    payload is a bytearray, which can still be appended to, the data of every
+    message is a copy. Otherwise, such as for the blocks decoded by readers,
+    it is a read-only memoryview of the payload, so no copy is made.
+
+    Setting a field of a message that was accessed writes it to the columns,
+    so the change is kept. Columns that are views, such as of a
+    memory-mapped file, are copied the first time one of their values is set.
+
+    Attributes:
+        timestamps (array.array): the timestamps of the messages
+        arbitration_ids (array.array): the arbitration IDs of the messages
+        dlcs (array.array): the lengths of the messages
+        directions (array.array): the InternalMessageDirection of the messages
+        message_types (array.array): the InternalMessageType of the messages
+        buses (array.array): the bus numbers of the messages
+        payload (bytearray): the payloads of all messages
+        payload_offsets (array.array): the offset of each message's payload,
+            followed by the total size of the payloads
+    """
+
+    def __init__(self, messages=()):
+        """Create a new ColumnarMessages
+
+        Args:
+            messages (iterable): the messages to store initially
+        """
+        self._timestamps = array.array("d")
+        self._arbitration_ids = array.array("L")
+        self._dlcs = array.array("H")
+        self._directions = array.array("B")
+        self._message_types = array.array("B")
+        self._buses = array.array("B")
+        self._payload = bytearray()
+        self._payload_offsets = array.array("L", [0])
+        self._payload_view = None
+
+        self.extend(messages)
+
+    @classmethod
+    def from_columns(
+        cls,
+        timestamps,
+        arbitration_ids,
+        dlcs,
+        directions,
+        message_types,
+        buses,
+        payload,
+        payload_offsets,
+    ):
+        """Create a new ColumnarMessages backed by existing columns
+
+        The columns can be any sequences supporting indexing, such as arrays
+        or typed memoryviews over a memory-mapped file. They are used as-is
+        without being copied, so read-only columns cannot be appended to.
+        """
+        messages = cls()
+        messages._timestamps = timestamps
+        messages._arbitration_ids = arbitration_ids
+        messages._dlcs = dlcs
+        messages._directions = directions
+        messages._message_types = message_types
+        messages._buses = buses
+        messages._payload = payload
+        messages._payload_offsets = payload_offsets
+        if not isinstance(payload, bytearray):
+            # A bytearray can't be resized while there are views of it
+            messages._payload_view = memoryview(payload)
+        return messages
+
+    @property
+    def timestamps(self):
+        return self._timestamps
+
+    @property
+    def arbitration_ids(self):
+        return self._arbitration_ids
+
+    @property
+    def dlcs(self):
+        return self._dlcs
+
+    @property
+    def directions(self):
+        return self._directions
+
+    @property
+    def message_types(self):
+        return self._message_types
+
+    @property
+    def buses(self):
+        return self._buses
+
+    @property
+    def payload(self):
+        return self._payload
+
+    @property
+    def payload_offsets(self):
+        return self._payload_offsets
+
+    def append_row(
+        self, timestamp, arbitration_id, dlc, direction, message_type, bus, data
+    ):
+        """Append a message given its fields, without creating an
+        InternalMessage
+        """
+        self._timestamps.append(float(timestamp))
+        self._arbitration_ids.append(arbitration_id)
+        self._dlcs.append(dlc)
+        self._directions.append(direction)
+        self._message_types.append(message_type)
+        self._buses.append(bus)
+        self._payload.extend(data)
+        self._payload_offsets.append(len(self._payload))
+
+    def append(self, message):
+        """Append an InternalMessage"""
+        self.append_row(
+            message.timestamp,
+            message.arbitration_id,
+            message.dlc,
+            message.direction,
+            message.message_type,
+            message.bus_number,
+            message.data,
+        )
+
+    def extend(self, messages):
+        """Append all of the given InternalMessages"""
+        for message in messages:
+            self.append(message)
+
+    def extend_columns(self, other):
+        """Append all of the messages stored in another ColumnarMessages"""
+        base = len(self._payload)
+        _extend_column(self._timestamps, other.timestamps)
+        _extend_column(self._arbitration_ids, other.arbitration_ids)
+        _extend_column(self._dlcs, other.dlcs)
+        _extend_column(self._directions, other.directions)
+        _extend_column(self._message_types, other.message_types)
+        _extend_column(self._buses, other.buses)
+        self._payload.extend(other.payload)
+        self._payload_offsets.extend(
+            base + offset for offset in other.payload_offsets[1:]
+        )
+
+    def _set_field(self, name, index, value):
+        column = _writable_column(getattr(self, name))
+        column[index] = value
+        setattr(self, name, column)
+
+    def _set_data(self, index, data):
+        if not isinstance(self._payload, bytearray):
+            self._payload = bytearray(self._payload)
+            self._payload_view = None
+        self._payload_offsets = _writable_column(self._payload_offsets)
+
+        start = self._payload_offsets[index]
+        end = self._payload_offsets[index + 1]
+        self._payload[start:end] = data
+        # Move the payloads of the following messages along
+        shift = len(data) - (end - start)
+        if shift:
+            offsets = self._payload_offsets
+            for following in range(index + 1, len(offsets)):
+                offsets[following] += shift
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("message index out of range")
+
+        payload = self._payload_view
+        if payload is None:
+            payload = self._payload
+        message = ColumnarMessage(
+            self,
+            index,
+            arbitration_id=self._arbitration_ids[index],
+            data=payload[
+                self._payload_offsets[index] : self._payload_offsets[index + 1]
+            ],
+            dlc=self._dlcs[index],
+            direction=self._directions[index],
+            timestamp=self._timestamps[index],
+        )
+        # Set the fields directly, since they are already in the columns
+        message._message_type = self._message_types[index]
+        message._bus_number = self._buses[index]
+        return message
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
 
 class InternalTrace(object):
     """
     Internal traces
 
     Attributes:
-        messages (list)
+        messages (iterable)
     """
 
-    def __init__(self, start_timestamp, messages):
+    def __init__(self, start_timestamp, messages, start_time=None, buses=None):
         """Create a new InternalTrace
 
         Args:
-            messages (list): a list of messages
+            start_timestamp (str): the start time, formatted like the "Start
+                time" comment of a TRC file
+            messages (iterable): a list of messages, or an iterator that
+                lazily produces them
+            start_time (datetime.datetime): the absolute start time, such as
+                the ``;$STARTTIME`` of a TRC file, if known
+            buses (list): the numbers of the buses the messages were sent on,
+                if known up front
         """
         self._start_timestamp = start_timestamp
         self._messages = messages
-        self._buses = [1]
+        self._start_time = start_time
+        self._buses = buses
 
     @property
     def start_timestamp(self):
@@ -174,51 +790,145 @@ class InternalTrace(object):
     def start_timestamp(self, start_timestamp):
         self._start_timestamp = start_timestamp
 
+    @property
+    def start_time(self):
+        """datetime.datetime: the absolute start time of the trace
+
+        Falls back to parsing start_timestamp, and is None if neither is
+        known.
+        """
+        if self._start_time is not None:
+            return self._start_time
+        return parse_start_timestamp(self._start_timestamp)
+
+    @start_time.setter
+    def start_time(self, start_time):
+        self._start_time = start_time
+
+    @property
+    def buses(self):
+        """list: the sorted numbers of the buses the messages were sent on
+
+        Unless they were given, they are collected from the messages, which
+        is not possible for a one-shot iterator, in which case this is None.
+        """
+        if self._buses is not None:
+            return self._buses
+        if isinstance(self._messages, ColumnarMessages):
+            return sorted(set(self._messages.buses))
+        if isinstance(self._messages, (list, tuple)):
+            return sorted(set(message.bus_number for message in self._messages))
+        return None
+
+    @buses.setter
+    def buses(self, buses):
+        self._buses = buses
+
+    @property
+    def start_timestamp_as_asc_string(self):
+        # Such as Wed Jan 09 06:34:16.883 pm 2019
+        start = parse_start_timestamp(self._start_timestamp)
+        if start is None:
+            start = _DEFAULT_START_DATETIME
+        return "{} {}.{:03d} {} {}".format(
+            start.strftime("%a %b %d"),
+            start.strftime("%I:%M:%S"),
+            start.microsecond // 1000,
+            "pm" if start.hour >= 12 else "am",
+            start.year,
+        )
+
     @property
     def messages(self):
-        """list: a list of messages"""
+        """iterable: the messages of the trace
+
+        When the trace is backed by a reader this is a one-shot iterator.
+        """
         return self._messages
 
     @messages.setter
     def messages(self, messages):
         self._messages = messages
 
-    def as_trc_string(self):
+    def as_trc_string(self, start_time=None):
         """Convert to a TRC file
 
+        Args:
+            start_time (datetime.datetime): the absolute start time written as
+                the ``;$STARTTIME``. A fixed date is written by default.
+
         Returns:
             str: a string representing a TRC file
         """
-        env = Environment(loader=PackageLoader("canlogconvert", "templates"))
-        template = env.get_template("trc.j2")
+        return self.render(get_template("trc.j2"), start_time)
+
+    def as_asc_string(self):
+        """Convert to an ASC file
+
+        Returns:
+            str: a string representing an ASC file
+        """
+        return self.render(get_template("asc.j2"))
+
+    def render(self, template, start_time=None):
+        """Render the trace with a template that has already been loaded
+
+        Rendering many traces, such as excerpts of a longer trace, with the
+        same template skips looking it up every time. Both the ``trc.j2``
+        and the ``asc.j2`` templates can be rendered.
+
+        Args:
+            template (jinja2.Template): the template, see get_template
+            start_time (datetime.datetime): see as_trc_string
+
+        Returns:
+            str: the rendered template
+        """
+        if start_time is None:
+            days_since_epoch = (
+                datetime.date(2019, 5, 4) - datetime.date(1899, 12, 30)
+            ).days
+            fractional_elapsed_day_ms = 1
+        else:
+            days_since_epoch, fractional_elapsed_day_ms = format_trc_start_time(
+                start_time
+            ).split(".")
 
         return template.render(
             trc={
                 "file_version": "2.1",
-                "days_since_epoch": (
-                    datetime.date(2019, 5, 4) - datetime.date(1899, 12, 30)
-                ).days,
-                "fractional_elapsed_day_ms": 1,
+                "days_since_epoch": days_since_epoch,
+                "fractional_elapsed_day_ms": fractional_elapsed_day_ms,
                 "start_timestamp": self._start_timestamp,
+                # The header lists a connection for every bus
+                "buses": self.buses or [1],
             },
+            date=self.start_timestamp_as_asc_string,
             messages=self._messages,
         )
 
-    def as_asc_string(self):
-        """Convert to an ASC file
+    def as_log_string(self):
+        """Convert to a log file
 
         Returns:
-            str: a string representing an ASC file
+            str: a string representing a log file
         """
-        env = Environment(loader=PackageLoader("canlogconvert", "templates"))
-        template = env.get_template("asc.j2")
+        return self._messages
 
-        return template.render(messages=self._messages)
+    def to_numpy(self, data_width=None):
+        """Export the messages as a NumPy structured array
 
-    def as_log_string(self):
-        """Convert to a log file
+        Requires NumPy. When the messages are a one-shot iterator they are
+        consumed.
+
+        Args:
+            data_width (int): the number of bytes of data stored per message.
+                Defaults to the length of the longest data.
 
         Returns:
-            str: a string representing a log file
+            numpy.ndarray: a record per message, see
+                canlogconvert.traces.arrays.message_dtype
         """
-        return self._messages
+        from canlogconvert.traces.arrays import to_numpy
+
+        return to_numpy(self._messages, data_width)
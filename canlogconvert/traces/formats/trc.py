@@ -1,185 +1,254 @@
 """Operations on a TRC file
 """
-import pyparsing as pp
-import pprint
+import array
+import binascii
+import functools
+import itertools
+import os
+import re
+import shutil
+import tempfile
+import time
 
 from canlogconvert.traces.formats.internal_trace import InternalTrace
 from canlogconvert.traces.formats.internal_trace import InternalMessage
 from canlogconvert.traces.formats.internal_trace import InternalMessageDirection
+from canlogconvert.traces.formats.internal_trace import ColumnarMessages
+from canlogconvert.traces.formats.internal_trace import DIRECTION_TO_TRC_STRING
+from canlogconvert.traces.formats.internal_trace import MESSAGE_TYPE_TO_TRC_STRING
+from canlogconvert.traces.formats.internal_trace import TRC_STRING_TO_DIRECTION
+from canlogconvert.traces.formats.internal_trace import TRC_STRING_TO_MESSAGE_TYPE
+from canlogconvert.traces.formats.internal_trace import data_length_to_dlc
+from canlogconvert.traces.formats.internal_trace import format_data
+from canlogconvert.traces.formats.internal_trace import parse_trc_start_time
+from canlogconvert.traces.formats import buffer
+from canlogconvert.traces.formats.index import TimestampIndex
+from canlogconvert.traces.formats.index import index_path
+from canlogconvert.traces.formats.writer import TraceWriter
 
-#  pp.ParserElement.setDefaultWhitespaceChars(" \t")
-
-# According to PEAK's "PEAK CAN TRC File Format" PDF document, these are the
-# only valid version numbers supported
-ValidVersions = pp.Or(
-    pp.Literal("1.0")
-    ^ pp.Literal("1.1")
-    ^ pp.Literal("1.2")
-    ^ pp.Literal("1.3")
-    ^ pp.Literal("2.0")
-    ^ pp.Literal("2.1")
-)
-FileVersion = (
-    pp.Keyword(";$FILEVERSION")
-    + pp.Literal("=")
-    + pp.Combine(ValidVersions).setResultsName("FileVersion")
-    + pp.LineEnd()
-)
-StartTime = (
-    pp.Keyword(";$STARTTIME")
-    + pp.Literal("=")
-    + pp.Combine(
-        pp.ZeroOrMore(pp.Word(pp.nums))
-        + pp.Literal(".")
-        + pp.ZeroOrMore(pp.Word(pp.nums))
-    ).setResultsName("StartTime")
-    + pp.LineEnd()
-)
-Columns = (
-    pp.Keyword(";$COLUMNS")
-    + pp.Literal("=")
-    + pp.Group(
-        pp.Combine(
-            # Message Number
-            pp.Optional(pp.Literal("N") + pp.Literal(","))
-            # Time Offset (ms)
-            + pp.Literal("O")
-            + pp.Literal(",")
-            # Type
-            + pp.Literal("T")
-            + pp.Literal(",")
-            # Bus (1-16)
-            # If Bus column is included, for events the Bus number can be specified as
-            # '-' if the event is not associated with a specific bus
-            + pp.Optional(pp.Literal("B") + pp.Literal(","))
-            # CAN-ID (Hex)
-            # 4 digits for 11-bit CAN-IDs (0000-07FF).
-            # 8 digits for 29-bit CAN-IDs (00000000-1FFFFFFF).
-            # Contains '-' for the message types EC, ER, ST, see 'T' column.
-            + pp.Literal("I")
-            + pp.Literal(",")
-            # Direction.
-            # Indicates whether the message was received ('Rx') or transmitted ('Tx').
-            + pp.Literal("d")
-            + pp.Literal(",")
-            + pp.Optional(pp.Literal("R") + pp.Literal(","))
-            + pp.oneOf("l L")
-            + pp.Literal(",")
-            + pp.Literal("D")
-        )
-    ).setResultsName("Columns", listAllMatches=True)
-    + pp.LineEnd()
+# The names of the elements of the pyparsing grammar, which is only built the
+# first time it is used, see _grammar
+_GRAMMAR_NAMES = (
+    "ValidVersions",
+    "FileVersion",
+    "StartTime",
+    "Columns",
+    "StartTimeComment",
+    "StartTimeLineComment",
+    "LineComment",
+    "Header",
+    "HeaderLine",
+    "ColumnBusNumber",
+    "ColumnDirection",
+    "ColumnData",
+    "ColumnMessageType",
+    "ColumnMessageNumber",
+    "ColumnTimeOffset",
+    "ColumnArbitrationID",
+    "ColumnReserved",
+    "ColumnDLC",
+    "LineData",
+    "TrcFileFormat",
 )
 
-StartTimeComment = pp.Literal(";") + pp.Literal("Start time: ")
-
-StartTimeLineComment = (
-    StartTimeComment
-    + pp.Combine(
-        pp.Combine(
-            pp.Word(pp.nums)
-            + pp.Literal("-")
-            + pp.Word(pp.nums)
-            + pp.Literal("-")
-            + pp.Word(pp.nums)
-        )
+
+@functools.lru_cache(maxsize=None)
+def _grammar():
+    """Build the pyparsing grammar of a TRC file
+
+    Importing pyparsing and building the grammar takes a good part of the
+    start-up time, and data rows are decoded without it (see _RowDecoder), so
+    it is only built once it is needed.
+
+    Returns:
+        dict: the elements of the grammar, by name
+    """
+    import pyparsing as pp
+
+    #  pp.ParserElement.setDefaultWhitespaceChars(" \t")
+
+    # According to PEAK's "PEAK CAN TRC File Format" PDF document, these are the
+    # only valid version numbers supported
+    ValidVersions = pp.Or(
+        pp.Literal("1.0")
+        ^ pp.Literal("1.1")
+        ^ pp.Literal("1.2")
+        ^ pp.Literal("1.3")
+        ^ pp.Literal("2.0")
+        ^ pp.Literal("2.1")
+    )
+    FileVersion = (
+        pp.Keyword(";$FILEVERSION")
+        + pp.Literal("=")
+        + pp.Combine(ValidVersions).setResultsName("FileVersion")
+        + pp.LineEnd()
+    )
+    StartTime = (
+        pp.Keyword(";$STARTTIME")
+        + pp.Literal("=")
         + pp.Combine(
-            pp.Word(pp.nums)
-            + pp.Literal(":")
-            + pp.Word(pp.nums)
-            + pp.Literal(":")
-            + pp.Word(pp.nums)
-            + pp.Literal(".")
-            + pp.Word(pp.nums)
+            pp.ZeroOrMore(pp.Word(pp.nums))
             + pp.Literal(".")
-            + pp.Word(pp.nums)
-        ),
-        joinString=" ",
-        # TODO: Fix this hack
-        adjacent=False,
-    ).setResultsName("StartTimeLineComment")
-    + pp.LineEnd()
-)
+            + pp.ZeroOrMore(pp.Word(pp.nums))
+        ).setResultsName("StartTime")
+        + pp.LineEnd()
+    )
+    Columns = (
+        pp.Keyword(";$COLUMNS")
+        + pp.Literal("=")
+        + pp.Group(
+            pp.Combine(
+                # Message Number
+                pp.Optional(pp.Literal("N") + pp.Literal(","))
+                # Time Offset (ms)
+                + pp.Literal("O")
+                + pp.Literal(",")
+                # Type
+                + pp.Literal("T")
+                + pp.Literal(",")
+                # Bus (1-16)
+                # If Bus column is included, for events the Bus number can be specified as
+                # '-' if the event is not associated with a specific bus
+                + pp.Optional(pp.Literal("B") + pp.Literal(","))
+                # CAN-ID (Hex)
+                # 4 digits for 11-bit CAN-IDs (0000-07FF).
+                # 8 digits for 29-bit CAN-IDs (00000000-1FFFFFFF).
+                # Contains '-' for the message types EC, ER, ST, see 'T' column.
+                + pp.Literal("I")
+                + pp.Literal(",")
+                # Direction.
+                # Indicates whether the message was received ('Rx') or transmitted ('Tx').
+                + pp.Literal("d")
+                + pp.Literal(",")
+                + pp.Optional(pp.Literal("R") + pp.Literal(","))
+                + pp.oneOf("l L")
+                + pp.Literal(",")
+                + pp.Literal("D")
+            )
+        ).setResultsName("Columns", listAllMatches=True)
+        + pp.LineEnd()
+    )
 
-LineComment = pp.Group(
-    pp.NotAny(pp.Or(FileVersion ^ StartTime ^ Columns ^ StartTimeLineComment))
-    + pp.Literal(";")
-    + pp.Regex(r".*")
-    + pp.LineEnd()
-).setResultsName("LineComment", listAllMatches=True)
-
-
-Header = FileVersion + StartTime + Columns
-
-# [N],O,T,[B],I,d,[R],l/L,D
-ColumnBusNumber = pp.Or(
-    pp.Literal("1")
-    ^ pp.Literal("2")
-    ^ pp.Literal("3")
-    ^ pp.Literal("4")
-    ^ pp.Literal("5")
-    ^ pp.Literal("6")
-    ^ pp.Literal("7")
-    ^ pp.Literal("8")
-    ^ pp.Literal("9")
-    ^ pp.Literal("10")
-    ^ pp.Literal("11")
-    ^ pp.Literal("12")
-    ^ pp.Literal("13")
-    ^ pp.Literal("14")
-    ^ pp.Literal("15")
-    ^ pp.Literal("16")
-    ^ pp.Literal("-")
-)
+    StartTimeComment = pp.Literal(";") + pp.Literal("Start time: ")
 
-ColumnDirection = pp.Or(pp.Literal("Rx") ^ pp.Literal("Tx"))
+    StartTimeLineComment = (
+        StartTimeComment
+        + pp.Combine(
+            pp.Combine(
+                pp.Word(pp.nums)
+                + pp.Literal("-")
+                + pp.Word(pp.nums)
+                + pp.Literal("-")
+                + pp.Word(pp.nums)
+            )
+            + pp.Combine(
+                pp.Word(pp.nums)
+                + pp.Literal(":")
+                + pp.Word(pp.nums)
+                + pp.Literal(":")
+                + pp.Word(pp.nums)
+                + pp.Literal(".")
+                + pp.Word(pp.nums)
+                + pp.Literal(".")
+                + pp.Word(pp.nums)
+            ),
+            joinString=" ",
+            # TODO: Fix this hack
+            adjacent=False,
+        ).setResultsName("StartTimeLineComment")
+        + pp.LineEnd()
+    )
 
-ColumnData = pp.Optional(pp.Word(pp.hexnums)) + pp.ZeroOrMore(
-    pp.Literal(" ") + pp.Word(pp.hexnums)
-)
-#  ColumnCanId = pp.Literal()
-
-ColumnMessageType = pp.Or(
-    pp.Literal("DT")
-    ^ pp.Literal("FD")
-    ^ pp.Literal("FB")
-    ^ pp.Literal("FE")
-    ^ pp.Literal("BI")
-    ^ pp.Literal("RR")
-    ^ pp.Literal("ST")
-    ^ pp.Literal("EC")
-    ^ pp.Literal("ER")
-)
+    LineComment = pp.Group(
+        pp.NotAny(pp.Or(FileVersion ^ StartTime ^ Columns ^ StartTimeLineComment))
+        + pp.Literal(";")
+        + pp.Regex(r".*")
+        + pp.LineEnd()
+    ).setResultsName("LineComment", listAllMatches=True)
 
-ColumnMessageNumber = pp.Word(pp.nums)
+    Header = FileVersion + StartTime + Columns
 
-ColumnTimeOffset = pp.Combine(pp.Word(pp.nums) + pp.Literal(".") + pp.Word(pp.nums))
+    HeaderLine = pp.Or(FileVersion ^ StartTime ^ Columns ^ StartTimeLineComment)
 
-ColumnArbitrationID = pp.Combine(pp.OneOrMore(pp.Word(pp.hexnums)))
+    # [N],O,T,[B],I,d,[R],l/L,D
+    ColumnBusNumber = pp.Or(
+        pp.Literal("1")
+        ^ pp.Literal("2")
+        ^ pp.Literal("3")
+        ^ pp.Literal("4")
+        ^ pp.Literal("5")
+        ^ pp.Literal("6")
+        ^ pp.Literal("7")
+        ^ pp.Literal("8")
+        ^ pp.Literal("9")
+        ^ pp.Literal("10")
+        ^ pp.Literal("11")
+        ^ pp.Literal("12")
+        ^ pp.Literal("13")
+        ^ pp.Literal("14")
+        ^ pp.Literal("15")
+        ^ pp.Literal("16")
+        ^ pp.Literal("-")
+    )
 
-ColumnReserved = pp.Literal("-")
-ColumnDLC = pp.Word(pp.nums)
-ColumnData = pp.Combine(
-    pp.Optional(pp.Word(pp.hexnums))
-    + pp.ZeroOrMore(pp.Literal(" ") + pp.Word(pp.hexnums))
-)
+    ColumnDirection = pp.Or(pp.Literal("Rx") ^ pp.Literal("Tx"))
+
+    ColumnData = pp.Optional(pp.Word(pp.hexnums)) + pp.ZeroOrMore(
+        pp.Literal(" ") + pp.Word(pp.hexnums)
+    )
+    #  ColumnCanId = pp.Literal()
+
+    ColumnMessageType = pp.Or(
+        pp.Literal("DT")
+        ^ pp.Literal("FD")
+        ^ pp.Literal("FB")
+        ^ pp.Literal("FE")
+        ^ pp.Literal("BI")
+        ^ pp.Literal("RR")
+        ^ pp.Literal("ST")
+        ^ pp.Literal("EC")
+        ^ pp.Literal("ER")
+    )
+
+    ColumnMessageNumber = pp.Word(pp.nums)
+
+    ColumnTimeOffset = pp.Combine(pp.Word(pp.nums) + pp.Literal(".") + pp.Word(pp.nums))
+
+    ColumnArbitrationID = pp.Combine(pp.OneOrMore(pp.Word(pp.hexnums)))
+
+    ColumnReserved = pp.Literal("-")
+    ColumnDLC = pp.Word(pp.nums)
+    ColumnData = pp.Combine(
+        pp.Optional(pp.Word(pp.hexnums))
+        + pp.ZeroOrMore(pp.Literal(" ") + pp.Word(pp.hexnums))
+    )
+
+    LineData = pp.Group(
+        ColumnMessageNumber.setResultsName("ColumnMessageNumber")
+        + ColumnTimeOffset.setResultsName("ColumnTimeOffset")
+        + ColumnMessageType.setResultsName("ColumnMessageType")
+        + ColumnBusNumber.setResultsName("ColumnBusNumber")
+        + ColumnArbitrationID.setResultsName("ColumnArbitrationID")
+        + ColumnDirection.setResultsName("ColumnDirection")
+        + ColumnReserved.setResultsName("ColumnReserved")
+        + ColumnDLC.setResultsName("ColumnDLC")
+        + ColumnData.setResultsName("ColumnData")
+        + pp.LineEnd()
+    ).setResultsName("LineData", listAllMatches=True)
+
+    TrcFileFormat = Header + pp.ZeroOrMore(
+        pp.Or(LineComment ^ LineData ^ StartTimeLineComment)
+    )
+
+    return {name: value for name, value in locals().items() if name in _GRAMMAR_NAMES}
+
+
+def __getattr__(name):
+    # The elements of the grammar are built on first access
+    if name in _GRAMMAR_NAMES:
+        return _grammar()[name]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
-LineData = pp.Group(
-    ColumnMessageNumber.setResultsName("ColumnMessageNumber")
-    + ColumnTimeOffset.setResultsName("ColumnTimeOffset")
-    + ColumnMessageType.setResultsName("ColumnMessageType")
-    + ColumnBusNumber.setResultsName("ColumnBusNumber")
-    + ColumnArbitrationID.setResultsName("ColumnArbitrationID")
-    + ColumnDirection.setResultsName("ColumnDirection")
-    + ColumnReserved.setResultsName("ColumnReserved")
-    + ColumnDLC.setResultsName("ColumnDLC")
-    + ColumnData.setResultsName("ColumnData")
-    + pp.LineEnd()
-).setResultsName("LineData", listAllMatches=True)
-
-TrcFileFormat = Header + pp.ZeroOrMore(
-    pp.Or(LineComment ^ LineData ^ StartTimeLineComment)
-)
 
 # T: Type of message
 class TraceMessageType:
@@ -317,10 +386,23 @@ def _load_start_time_comment(tokens):
     return tokens.get("StartTimeLineComment")
 
 
+def _load_start_datetime(tokens):
+    return parse_trc_start_time(_load_start_time(tokens))
+
+
 def _load_columns(tokens):
     return tokens.get("Columns")
 
 
+def _load_buses(tokens):
+    """Return the buses listed in the header's connection table, or None if
+    it has none"""
+    buses = tokens.get("Buses")
+    if not buses:
+        return None
+    return sorted(set(buses))
+
+
 def _load_message_arbitration_id(message):
     return int(message.get("ColumnArbitrationID"), 16)
 
@@ -345,35 +427,1469 @@ def _load_message_direction(message):
     raise ValueError("Unsupported Direction")
 
 
+def _load_message_type(message):
+    return TRC_STRING_TO_MESSAGE_TYPE[message.get("ColumnMessageType")]
+
+
+def _load_message_bus_number(message):
+    return _BUS_LOOKUP[message.get("ColumnBusNumber")]
+
+
+def _load_message(message):
+    msg = InternalMessage(
+        arbitration_id=_load_message_arbitration_id(message),
+        data=_load_message_data(message),
+        dlc=_load_message_dlc(message),
+        direction=_load_message_direction(message),
+        timestamp=float(message.get("ColumnTimeOffset")),
+    )
+    msg.message_type = _load_message_type(message)
+    msg.bus_number = _load_message_bus_number(message)
+    return msg
+
+
 def _load_rows(tokens):
-    result = []
-    for message in tokens.get("LineData"):
-        msg = InternalMessage(
-            arbitration_id=_load_message_arbitration_id(message),
-            data=_load_message_data(message),
-            dlc=_load_message_dlc(message),
-            direction=_load_message_direction(message),
-            timestamp=message.get("ColumnTimeOffset"),
+    return [_load_message(message) for message in tokens.get("LineData")]
+
+
+# Regular expressions for each column of a data row, mirroring the LineData
+# grammar
+_COLUMN_PATTERNS = {
+    "N": r"\d+",
+    "O": r"\d+\.\d+",
+    "T": r"DT|FD|FB|FE|BI|RR|ST|EC|ER",
+    "B": r"1[0-6]|[1-9]|-",
+    "I": r"[0-9A-Fa-f]+",
+    "d": r"Rx|Tx",
+    "R": r"-",
+    "l": r"\d+",
+    "L": r"\d+",
+    # Two digits per byte, separated by single spaces. Other data is left to
+    # the grammar, which reports it.
+    "D": r"(?:[0-9A-Fa-f]{2}(?: [0-9A-Fa-f]{2})*)?",
+}
+
+# The columns that are loaded into an InternalMessage. The ;$COLUMNS grammar
+# fixes the order of the columns, so these are always captured in this order.
+_DECODED_COLUMNS = frozenset("OTBIdlLD")
+
+# The columns that a MessageFilter looks at
+_FILTERED_COLUMNS = frozenset("TId")
+
+
+def _compile_row_pattern(column_names, captured):
+    pattern = r"\s*"
+    for index, column in enumerate(column_names):
+        separator = r"\s+" if index else ""
+        if column in captured:
+            column_pattern = "(" + _COLUMN_PATTERNS[column] + ")"
+        else:
+            column_pattern = "(?:" + _COLUMN_PATTERNS[column] + ")"
+
+        if column == "D":
+            # The data column is empty for messages without a payload
+            pattern += "(?:" + separator + column_pattern + ")?"
+        else:
+            pattern += separator + column_pattern
+    return pattern
+
+
+_DIRECTION_LOOKUP = TRC_STRING_TO_DIRECTION
+
+_BINARY_DIRECTION_LOOKUP = {
+    string.encode("ascii"): direction
+    for string, direction in TRC_STRING_TO_DIRECTION.items()
+}
+
+_MESSAGE_TYPE_LOOKUP = TRC_STRING_TO_MESSAGE_TYPE
+
+# Events that are not associated with a bus have a bus number of 0
+_BUS_LOOKUP = dict({str(bus): bus for bus in range(1, 17)}, **{"-": 0})
+
+_BINARY_BUS_LOOKUP = {
+    string.encode("ascii"): bus for string, bus in _BUS_LOOKUP.items()
+}
+
+_BINARY_MESSAGE_TYPE_LOOKUP = {
+    string.encode("ascii"): message_type
+    for string, message_type in TRC_STRING_TO_MESSAGE_TYPE.items()
+}
+
+# TRC files are plain ASCII, but comments may contain paths in the system's
+# encoding. Decoding as latin-1 never fails and leaves the data rows intact.
+_BINARY_ENCODING = "latin-1"
+
+
+def _decode_text_data(data):
+    return bytearray.fromhex(data or "")
+
+
+def _decode_binary_data(data):
+    if not data:
+        return bytearray()
+    return bytearray(binascii.unhexlify(data.replace(b" ", b"")))
+
+
+def _decode_text_payload(data):
+    return bytes.fromhex(" ".join(data))
+
+
+def _decode_binary_payload(data):
+    return binascii.unhexlify(b"".join(data).replace(b" ", b""))
+
+
+def _decode_data_length(length):
+    return data_length_to_dlc(int(length))
+
+
+def _load_column_names(tokens):
+    # Columns is a list of all matches, each holding the combined string
+    return _load_columns(tokens)[-1][0].split(",")
+
+
+class _RowDecoder(object):
+    """Decode data rows of a TRC file without going through pyparsing
+
+    A regular expression is compiled once for the ``;$COLUMNS`` layout given
+    in the header. Rows that it does not match are handed to the LineData
+    grammar, so malformed rows are still reported by pyparsing.
+
+    Binary decoders take rows as bytes. Timestamps are returned as floats
+    either way.
+
+    Given a MessageFilter, ``accepts`` checks a row against it by matching
+    only the columns up to the direction, so rejected rows are skipped
+    without decoding the rest of the row.
+    """
+
+    def __init__(self, column_names, binary=False, message_filter=None):
+        pattern = _compile_row_pattern(column_names, _DECODED_COLUMNS) + r"\s*$"
+        # Stop matching after the last column needed by the filter
+        filtered_names = column_names[: column_names.index("d") + 1]
+        filter_pattern = _compile_row_pattern(filtered_names, _FILTERED_COLUMNS)
+
+        self._binary = binary
+        if binary:
+            self._regex = re.compile(pattern.encode("ascii"))
+            self._filter_regex = re.compile(filter_pattern.encode("ascii"))
+            self._direction_lookup = _BINARY_DIRECTION_LOOKUP
+            self._message_type_lookup = _BINARY_MESSAGE_TYPE_LOOKUP
+            self._bus_lookup = _BINARY_BUS_LOOKUP
+            self._decode_data = _decode_binary_data
+            self._decode_payload = _decode_binary_payload
+            self._empty_data = b""
+            self._space = b" "
+        else:
+            self._regex = re.compile(pattern)
+            self._filter_regex = re.compile(filter_pattern)
+            self._direction_lookup = _DIRECTION_LOOKUP
+            self._message_type_lookup = _MESSAGE_TYPE_LOOKUP
+            self._bus_lookup = _BUS_LOOKUP
+            self._decode_data = _decode_text_data
+            self._decode_payload = _decode_text_payload
+            self._empty_data = ""
+            self._space = " "
+        self._has_data = "D" in column_names
+        self._has_bus = "B" in column_names
+        self._message_filter = message_filter
+
+        # The number of the group capturing each column, for LazyTrcMessage
+        groups = {
+            column: index
+            for index, column in enumerate(
+                [column for column in column_names if column in _DECODED_COLUMNS], 1
+            )
+        }
+        self._timestamp_group = groups["O"]
+        self._message_type_group = groups["T"]
+        self._bus_group = groups.get("B")
+        self._arbitration_id_group = groups["I"]
+        self._direction_group = groups["d"]
+        self._dlc_group = groups.get("L", groups.get("l"))
+        # The l column holds the number of data bytes rather than the DLC
+        self._decode_dlc = int if "L" in column_names else _decode_data_length
+        self._data_group = groups.get("D")
+
+    @property
+    def message_filter(self):
+        return self._message_filter
+
+    def accepts(self, line):
+        """Whether a data row is accepted by the decoder's MessageFilter"""
+        if self._message_filter is None:
+            return True
+
+        match = self._filter_regex.match(line)
+        if match is None:
+            # Let the row be decoded, which reports the error
+            return True
+
+        message_type, arbitration_id, direction = match.groups()
+        message_filter = self._message_filter
+        return message_filter.accepts_fields(
+            int(arbitration_id, 16) if message_filter.filters_arbitration_id else None,
+            self._message_type_lookup[message_type],
+            self._direction_lookup[direction],
         )
-        result.append(msg)
-    return result
+
+    def filter_lines(self, lines):
+        """Skip the data rows that are rejected by the MessageFilter"""
+        if self._message_filter is None:
+            return lines
+        return (line for line in lines if self.accepts(line))
+
+    def fields(self, line):
+        """Decode a data row into its fields
+
+        Returns:
+            tuple: the timestamp, arbitration ID, DLC, direction, message
+                type, bus number and data
+        """
+        fields = self._raw_fields(line)
+        return fields[:6] + (self._decode_data(fields[6]),)
+
+    def _raw_fields(self, line):
+        """Decode a data row into its fields, apart from its data, which is
+        left as hexadecimal digits"""
+        match = self._regex.match(line)
+        if match is None:
+            if self._binary:
+                message = _load_binary_row(line)
+            else:
+                message = _load_row(line)
+            data = message.data.hex()
+            return (
+                message.timestamp,
+                message.arbitration_id,
+                message.dlc,
+                message.direction,
+                message.message_type,
+                message.bus_number,
+                data.encode("ascii") if self._binary else data,
+            )
+
+        # The timestamp, message type, bus, arbitration ID, direction, DLC
+        # and data columns
+        groups = match.groups()
+        if not self._has_bus:
+            # Without a bus column every message is on the first bus
+            groups = groups[:2] + (None,) + groups[2:]
+        if not self._has_data:
+            groups += (None,)
+
+        bus = groups[2]
+        return (
+            float(groups[0]),
+            int(groups[3], 16),
+            self._decode_dlc(groups[5]),
+            self._direction_lookup[groups[4]],
+            self._message_type_lookup[groups[1]],
+            1 if bus is None else self._bus_lookup[bus],
+            groups[6] or self._empty_data,
+        )
+
+    def decode_rows(self, lines):
+        """Decode a block of data rows, along with all of their data
+
+        The data of all of the rows are decoded together, by a single call,
+        into one buffer.
+
+        Returns:
+            tuple: the fields of every row (see fields) apart from their
+                data, the buffer holding the data of all rows, and the offset
+                of every row's data in it followed by the size of the buffer
+        """
+        rows = list(map(self._raw_fields, lines))
+        data = [row[6] for row in rows]
+
+        # Every byte takes up two digits, and bytes may be separated by spaces
+        space = self._space
+        sizes = [(len(digits) - digits.count(space)) // 2 for digits in data]
+        try:
+            payload = self._decode_payload(data)
+        except ValueError:
+            payload = None
+        if payload is None or len(payload) != sum(sizes):
+            # Decode the rows one at a time, which reports the malformed one
+            decoded = [self._decode_data(digits) for digits in data]
+            payload = b"".join(decoded)
+            sizes = map(len, decoded)
+        payload_offsets = array.array("L", [0])
+        payload_offsets.extend(itertools.accumulate(sizes))
+        return rows, payload, payload_offsets
+
+    def decode_block(self, lines):
+        """Decode a block of data rows into a ColumnarMessages
+
+        Returns:
+            ColumnarMessages: the messages, whose payload is decoded by
+                decode_rows
+        """
+        rows, payload, payload_offsets = self.decode_rows(lines)
+        columns = list(zip(*rows))
+        return ColumnarMessages.from_columns(
+            array.array("d", columns[0]),
+            array.array("L", columns[1]),
+            array.array("H", columns[2]),
+            array.array("B", columns[3]),
+            array.array("B", columns[4]),
+            array.array("B", columns[5]),
+            payload,
+            payload_offsets,
+        )
+
+    def build_rows(self, rows, payload, payload_offsets):
+        """Create InternalMessages out of a block of rows decoded by
+        decode_rows
+
+        The data of the messages are read-only views of the decoded buffer,
+        so no buffer is created per message.
+
+        Returns:
+            list: the InternalMessages
+        """
+        payload = memoryview(payload)
+        messages = []
+        append = messages.append
+        for (
+            (timestamp, arbitration_id, dlc, direction, message_type, bus, _),
+            start,
+            end,
+        ) in zip(rows, payload_offsets, payload_offsets[1:]):
+            message = InternalMessage(
+                arbitration_id, payload[start:end], dlc, direction, timestamp
+            )
+            message.message_type = message_type
+            message.bus_number = bus
+            append(message)
+        return messages
+
+    def __call__(self, line):
+        return self.build(self.fields(line))
+
+    def lazy(self, line):
+        """Create a LazyTrcMessage out of a data row, deferring the decoding
+        of its fields until they are accessed
+
+        Rows that the regular expression does not match are decoded right
+        away.
+        """
+        match = self._regex.match(line)
+        if match is None:
+            return self(line)
+        return LazyTrcMessage(match, self)
+
+    def decode_timestamp(self, match):
+        return float(match.group(self._timestamp_group))
+
+    def decode_message_type(self, match):
+        return self._message_type_lookup[match.group(self._message_type_group)]
+
+    def decode_bus_number(self, match):
+        if self._bus_group is None:
+            return 1
+        return self._bus_lookup[match.group(self._bus_group)]
+
+    def decode_arbitration_id(self, match):
+        return int(match.group(self._arbitration_id_group), 16)
+
+    def decode_direction(self, match):
+        return self._direction_lookup[match.group(self._direction_group)]
+
+    def decode_dlc(self, match):
+        return self._decode_dlc(match.group(self._dlc_group))
+
+    def decode_data(self, match):
+        if self._data_group is None:
+            return bytearray()
+        return self._decode_data(match.group(self._data_group))
+
+    def raw_timestamp(self, match):
+        """The timestamp column of a row as text, if it is written the same
+        way InternalMessage formats it, otherwise None"""
+        timestamp = match.group(self._timestamp_group)
+        if self._binary:
+            timestamp = timestamp.decode("ascii")
+        # Timestamps are floats, which are formatted with three decimals
+        if timestamp[-4:-3] != ".":
+            return None
+        return timestamp
+
+    def raw_data(self, match):
+        """The data column of a row as text, if it is written the same way
+        InternalMessage formats it, otherwise None"""
+        if self._data_group is None:
+            return ""
+        data = match.group(self._data_group)
+        if data is None:
+            return ""
+        if self._binary:
+            data = data.decode("ascii")
+        # Every byte must be two digits followed by a single space
+        if len(data) % 3 != 2 or data[2::3] != " " * (len(data) // 3):
+            return None
+        return data.upper()
+
+    def build(self, fields):
+        """Create an InternalMessage out of the fields of a data row"""
+        timestamp, arbitration_id, dlc, direction, message_type, bus, data = fields
+        message = InternalMessage(
+            arbitration_id=arbitration_id,
+            data=data,
+            dlc=dlc,
+            direction=direction,
+            timestamp=timestamp,
+        )
+        message.message_type = message_type
+        message.bus_number = bus
+        return message
+
+
+class LazyTrcMessage(InternalMessage):
+    """An InternalMessage that decodes the fields of its TRC data row on
+    first access
+
+    The message holds on to the regular expression match of its row, which
+    keeps the row along with the offsets of its columns. Every field is
+    decoded the first time it is accessed and cached from then on, and
+    setting a field replaces it as usual.
+
+    Fields that are only written back out in the TRC format, such as the
+    data of a row that is converted to another TRC file, are copied from the
+    row without being decoded.
+    """
+
+    __slots__ = ("_match", "_decoder")
+
+    def __init__(self, match, decoder):
+        """Create a new LazyTrcMessage
+
+        Args:
+            match (re.Match): the match of the row by the decoder's regular
+                expression
+            decoder (_RowDecoder): the decoder that matched the row
+        """
+        self._match = match
+        self._decoder = decoder
+        # None marks fields that have not been decoded yet
+        self._arbitration_id = None
+        self._data = None
+        self._dlc = None
+        self._direction = None
+        self._timestamp = None
+        self._message_type = None
+        self._bus_number = None
+
+    @property
+    def arbitration_id(self):
+        """int: the frame identifier used for arbitration on the bus."""
+        if self._arbitration_id is None:
+            self._arbitration_id = self._decoder.decode_arbitration_id(self._match)
+        return self._arbitration_id
+
+    @arbitration_id.setter
+    def arbitration_id(self, arbitration_id):
+        self._arbitration_id = arbitration_id
+
+    @property
+    def data(self):
+        """bytearray: a bytearray containing the CAN data"""
+        if self._data is None:
+            self._data = self._decoder.decode_data(self._match)
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+
+    @property
+    def data_as_trc_string(self):
+        if self._data is None:
+            data = self._decoder.raw_data(self._match)
+            if data is not None:
+                return data
+        return super(LazyTrcMessage, self).data_as_trc_string
+
+    @property
+    def dlc(self):
+        """int: the length of the CAN message"""
+        if self._dlc is None:
+            self._dlc = self._decoder.decode_dlc(self._match)
+        return self._dlc
+
+    @dlc.setter
+    def dlc(self, dlc):
+        self._dlc = dlc
+
+    @property
+    def direction(self):
+        """InternalMessageDirection: the direction of the CAN message"""
+        if self._direction is None:
+            self._direction = self._decoder.decode_direction(self._match)
+        return self._direction
+
+    @direction.setter
+    def direction(self, direction):
+        self._direction = direction
+
+    @property
+    def timestamp(self):
+        """when the messages was received"""
+        if self._timestamp is None:
+            self._timestamp = self._decoder.decode_timestamp(self._match)
+        return self._timestamp
+
+    @timestamp.setter
+    def timestamp(self, timestamp):
+        self._timestamp = timestamp
+
+    @property
+    def timestamp_as_trc_string(self):
+        if self._timestamp is None:
+            timestamp = self._decoder.raw_timestamp(self._match)
+            if timestamp is not None:
+                return timestamp
+        return super(LazyTrcMessage, self).timestamp_as_trc_string
+
+    @property
+    def message_type(self):
+        if self._message_type is None:
+            self._message_type = self._decoder.decode_message_type(self._match)
+        return self._message_type
+
+    @message_type.setter
+    def message_type(self, message_type):
+        self._message_type = message_type
+
+    @property
+    def bus_number(self):
+        """int: the number of the CAN bus, from 1, or 0 for events that are not
+        associated with a bus"""
+        if self._bus_number is None:
+            self._bus_number = self._decoder.decode_bus_number(self._match)
+        return self._bus_number
+
+    @bus_number.setter
+    def bus_number(self, bus_number):
+        self._bus_number = bus_number
+
+
+# Regular expressions for the usual form of each header keyword, mirroring
+# the HeaderLine grammar. Lines they do not match are handed to the grammar.
+_HEADER_PATTERNS = (
+    (
+        "FileVersion",
+        re.compile(r"\s*;\$FILEVERSION[ \t]*=[ \t]*(1\.[0-3]|2\.[01])\s*$"),
+    ),
+    ("StartTime", re.compile(r"\s*;\$STARTTIME[ \t]*=[ \t]*([0-9]*\.[0-9]*)\s*$")),
+    (
+        "Columns",
+        re.compile(
+            r"\s*;\$COLUMNS[ \t]*=[ \t]*((?:N,)?O,T,(?:B,)?I,d,(?:R,)?[lL],D)\s*$"
+        ),
+    ),
+    (
+        "StartTimeLineComment",
+        re.compile(
+            r"\s*;[ \t]*Start time: [ \t]*([0-9]+-[0-9]+-[0-9]+)[ \t]+"
+            r"([0-9]+:[0-9]+:[0-9]+\.[0-9]+\.[0-9]+)\s*$"
+        ),
+    ),
+)
+
+
+# The title of the table listing the connection of every bus, and a row of it
+_BUS_TABLE_PATTERN = re.compile(r"\s*;[ \t]*Bus[ \t]+Connection\b")
+_BUS_TABLE_ROW_PATTERN = re.compile(r"\s*;[ \t]*([0-9]+)[ \t]+\S")
+
+
+def _match_header_line(line):
+    """Match a header line against the usual form of the header keywords
+
+    Returns:
+        tuple: the name and value of the keyword, as they are given by the
+            HeaderLine grammar, or None
+    """
+    for name, pattern in _HEADER_PATTERNS:
+        match = pattern.match(line)
+        if match is not None:
+            if name == "Columns":
+                # A list of all matches, each holding the combined string
+                return name, [[match.group(1)]]
+            return name, " ".join(match.groups())
+    return None
+
+
+def _load_header(lines):
+    """Consume the header of a TRC file
+
+    The header is made up of the ``;$FILEVERSION``, ``;$STARTTIME`` and
+    ``;$COLUMNS`` keywords along with any number of line comments. Parsing
+    stops at the first data row. Keywords are matched with regular
+    expressions, and only unusual ones are parsed by the pyparsing grammar.
+    The numbers of the buses listed in the connection table of the comments,
+    if any, are collected as ``Buses``.
+
+    Args:
+        lines (iterator): an iterator over the lines of the TRC file
+
+    Returns:
+        tuple: a dict with the parsed header tokens, and the first data row
+            (or None if the file has no data rows)
+    """
+    header = {}
+    in_bus_table = False
+    for line in lines:
+        if not line.strip():
+            continue
+
+        stripped = line.lstrip()
+        if not stripped.startswith(";"):
+            return header, line
+
+        if in_bus_table:
+            match = _BUS_TABLE_ROW_PATTERN.match(line)
+            if match is not None:
+                header["Buses"].append(int(match.group(1)))
+                continue
+            in_bus_table = False
+        elif _BUS_TABLE_PATTERN.match(line):
+            header["Buses"] = []
+            in_bus_table = True
+            continue
+
+        keyword = _match_header_line(line)
+        if keyword is not None:
+            name, value = keyword
+            header[name] = value
+            continue
+        if not stripped.startswith(";$") and "Start time:" not in line:
+            # Regular line comment
+            continue
+
+        import pyparsing as pp
+
+        try:
+            tokens = _grammar()["HeaderLine"].parseString(line)
+        except pp.ParseException:
+            # Regular line comment
+            continue
+
+        for name in ("FileVersion", "StartTime", "Columns", "StartTimeLineComment"):
+            if name in tokens:
+                header[name] = tokens.get(name)
+    return header, None
+
+
+def _check_header(header):
+    if not _load_version(header) == "2.1":
+        raise ValueError("We only support 2.1", _load_version(header))
+
+
+def _load_row(line):
+    tokens = _grammar()["LineData"].parseString(line)
+    return _load_message(tokens.get("LineData")[0])
+
+
+# The number of data rows decoded together by the fast decoder
+_BLOCK_SIZE = 4096
+
+
+def _iter_data_lines(first_line, lines, comment=";"):
+    if first_line is not None:
+        yield first_line
+
+    for line in lines:
+        if not line.strip() or line.lstrip().startswith(comment):
+            continue
+        yield line
+
+
+def _iter_rows(lines, decode_row):
+    for line in lines:
+        yield decode_row(line)
+
+
+def _iter_blocks(lines, decoder, block_size=_BLOCK_SIZE):
+    lines = iter(lines)
+    while True:
+        block = list(itertools.islice(lines, block_size))
+        if not block:
+            return
+        yield decoder.decode_block(block)
+
+
+def _iter_block_rows(lines, decoder, stats=None, block_size=_BLOCK_SIZE):
+    lines = iter(lines)
+    while True:
+        if stats is not None:
+            stats.enter("tokenize")
+        block = list(itertools.islice(lines, block_size))
+        if not block:
+            if stats is not None:
+                stats.exit()
+            return
+
+        rows = decoder.decode_rows(block)
+        if stats is not None:
+            stats.switch("build")
+        messages = decoder.build_rows(*rows)
+        if stats is not None:
+            stats.exit()
+
+        for message in messages:
+            yield message
+
+
+def _load_binary_row(line):
+    return _load_row(line.decode(_BINARY_ENCODING))
+
+
+def _load_source(source, fast, message_filter, stats=None, lazy=False):
+    """Parse the header of a TRC source, and prepare to parse its rows
+
+    Returns:
+        tuple: a dict with the parsed header tokens, and an iterator over the
+            InternalMessages in the source
+    """
+    binary = buffer.is_buffer(source)
+    if binary:
+        header, body_offset = _load_buffer_header(source)
+        lines = _iter_data_lines(None, buffer.iter_lines(source, body_offset), b";")
+    else:
+        source = iter(source)
+        header, first_line = _load_header(source)
+        lines = _iter_data_lines(first_line, source)
+    _check_header(header)
+    if stats is not None:
+        lines = stats.timed(lines, "read")
+
+    if fast:
+        decoder = _RowDecoder(_load_column_names(header), binary, message_filter)
+        if lazy:
+            rows = _iter_rows(decoder.filter_lines(lines), decoder.lazy)
+            if stats is not None:
+                # Fields are decoded as they are written
+                rows = stats.timed(rows, "tokenize")
+            return header, rows
+        rows = _iter_block_rows(decoder.filter_lines(lines), decoder, stats)
+        return header, rows
+
+    rows = _iter_rows(lines, _load_binary_row if binary else _load_row)
+    if stats is not None:
+        # The grammar tokenizes and builds messages in one go
+        rows = stats.timed(rows, "tokenize")
+    if message_filter is not None:
+        rows = (message for message in rows if message_filter.accepts(message))
+    return header, rows
+
+
+def iter_messages(fileobj, fast=True, message_filter=None, stats=None, lazy=False):
+    """Lazily parse the messages of a TRC file
+
+    The header is parsed once up front, then every data row is parsed as it
+    is read, so memory usage does not depend on the size of the file.
+
+    The file can also be given as a byte buffer such as a memory-mapped
+    file, in which case rows are sliced out of the buffer and decoded as
+    bytes. Timestamps are floats either way.
+
+    Args:
+        fileobj (file): a file object opened in text mode, or a byte buffer
+        fast (bool): decode rows with a regular expression compiled for the
+            file's ``;$COLUMNS`` layout, only falling back to the pyparsing
+            grammar for rows it does not match
+        message_filter (MessageFilter): only return the accepted messages.
+            The fast decoder checks rows before decoding them.
+        stats (ConversionStats): record the time spent reading, tokenizing
+            and building messages
+        lazy (bool): return LazyTrcMessages, which only decode the fields
+            that are accessed. Only used by the fast decoder.
+
+    Returns:
+        iterator: an iterator over the InternalMessages in the file
+    """
+    header, rows = _load_source(fileobj, fast, message_filter, stats, lazy)
+    return rows
+
+
+def load_file(fileobj, fast=True, message_filter=None, stats=None, lazy=False):
+    """Parse the given TRC file object
+
+    Unlike load_string, the returned trace's messages are a one-shot iterator
+    that is backed by the file object, so it must remain open until the
+    messages have been consumed.
+
+    Args:
+        fileobj (file): a file object opened in text mode, any other
+            iterable of lines, or a byte buffer (see iter_messages)
+        fast (bool): see iter_messages
+        message_filter (MessageFilter): see iter_messages
+        stats (ConversionStats): see iter_messages
+        lazy (bool): see iter_messages
+
+    Returns:
+        InternalTrace
+    """
+    header, rows = _load_source(fileobj, fast, message_filter, stats, lazy)
+
+    # The rows are only read as they are consumed, so the buses are taken
+    # from the header
+    return InternalTrace(
+        messages=rows,
+        start_timestamp=_load_start_time_comment(header),
+        start_time=_load_start_datetime(header),
+        buses=_load_buses(header),
+    )
 
 
 def load_string(string):
     """Parse the given string
 
+    The messages are stored in a ColumnarMessages.
+
     Args:
         string (str): a string containing the TRC file's contents
 
     Returns:
         InternalTrace
     """
-    tokens = TrcFileFormat.parseString(string)
-    if not _load_version(tokens) == "2.1":
-        raise ValueError("We only support 2.1", _load_version(tokens))
+    lines = iter(string.splitlines(True))
+    header, first_line = _load_header(lines)
+    _check_header(header)
+
+    decoder = _RowDecoder(_load_column_names(header))
+    messages = _load_columnar(decoder, _iter_data_lines(first_line, lines))
+
+    return InternalTrace(
+        messages=messages,
+        start_timestamp=_load_start_time_comment(header),
+        start_time=_load_start_datetime(header),
+    )
+
+
+def _load_columnar(decoder, lines):
+    messages = ColumnarMessages()
+    for block in _iter_blocks(decoder.filter_lines(lines), decoder):
+        messages.extend_columns(block)
+    return messages
+
+
+def _load_buffer_header(source):
+    """Parse the header of a TRC file held in a byte buffer
+
+    Returns:
+        tuple: a dict with the parsed header tokens, and the byte offset of
+            the first data row (or of the end of the buffer)
+    """
+    offsets = []
+
+    def lines():
+        position = 0
+        while position < len(source):
+            offsets.append(position)
+            newline = source.find(b"\n", position)
+            if newline == -1:
+                newline = len(source)
+            yield source[position:newline].decode(_BINARY_ENCODING)
+            position = newline + 1
+        offsets.append(len(source))
+
+    header, first_line = _load_header(lines())
+    return header, offsets[-1]
+
+
+def _split_byte_ranges(source, start, end, count):
+    """Split [start, end) into at most count ranges that end on a newline"""
+    step = max((end - start) // count, 1)
+    ranges = []
+    position = start
+    while position < end:
+        next_position = buffer.find_line_start(source, position + step, end)
+        ranges.append((position, next_position))
+        position = next_position
+    return ranges
+
+
+def _load_byte_range(task):
+    path, column_names, message_filter, start, end = task
+    # Every worker maps the same file, sharing the page cache
+    with buffer.open_mmap(path) as source:
+        return _load_columnar(
+            _RowDecoder(column_names, binary=True, message_filter=message_filter),
+            _iter_data_lines(None, buffer.iter_lines(source, start, end), b";"),
+        )
+
+
+def load_path(path, jobs=1, chunk_size=32 * 1024 * 1024, message_filter=None):
+    """Parse the TRC file at the given path, using a pool of processes
+
+    The header is parsed once, then the remainder of the file is split at
+    newline boundaries into byte ranges of about ``chunk_size`` bytes. The
+    ranges are parsed by ``jobs`` worker processes and the results are
+    reassembled in file order.
+
+    Args:
+        path (str): the path to the TRC file
+        jobs (int): the number of worker processes. With a single job the
+            file is parsed in the current process.
+        chunk_size (int): the approximate size in bytes of each byte range
+        message_filter (MessageFilter): only load the accepted messages
+
+    Returns:
+        InternalTrace: a trace whose messages are a ColumnarMessages
+    """
+    with buffer.open_mmap(path) as source:
+        header, body_offset = _load_buffer_header(source)
+        _check_header(header)
+
+        size = len(source)
+        count = max(jobs, -(-(size - body_offset) // chunk_size))
+        ranges = _split_byte_ranges(source, body_offset, size, count)
+
+    column_names = _load_column_names(header)
+    tasks = [(path, column_names, message_filter, start, end) for start, end in ranges]
+
+    messages = ColumnarMessages()
+    if jobs > 1:
+        import multiprocessing
+
+        pool = multiprocessing.Pool(jobs)
+        try:
+            for part in pool.imap(_load_byte_range, tasks):
+                messages.extend_columns(part)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for task in tasks:
+            messages.extend_columns(_load_byte_range(task))
+
+    return InternalTrace(
+        messages=messages,
+        start_timestamp=_load_start_time_comment(header),
+        start_time=_load_start_datetime(header),
+    )
+
+
+DEFAULT_INDEX_STRIDE = 1024
+
+
+def load_numpy(path, data_width=None, **options):
+    """Parse the TRC file at the given path straight into a NumPy array
+
+    The rows are decoded into the columns of a ColumnarMessages, with the data
+    of every block of rows decoded by a single call, which are then exported
+    without creating an InternalMessage per row. Requires NumPy.
+
+    Args:
+        path (str): the path to the TRC file
+        data_width (int): the number of bytes of data stored per message.
+            Defaults to the length of the longest data.
+        options: the jobs, chunk_size and message_filter, see load_path
+
+    Returns:
+        numpy.ndarray: a record per message, see
+            canlogconvert.traces.arrays.message_dtype
+    """
+    from canlogconvert.traces.arrays import columns_to_numpy
+
+    return columns_to_numpy(load_path(path, **options).messages, data_width)
+
+
+def build_index(source, stride=DEFAULT_INDEX_STRIDE, mtime=0.0):
+    """Build a sparse timestamp index of a TRC file held in a byte buffer
+
+    Only the rows that are indexed are decoded.
+
+    Args:
+        source: a byte buffer such as a memory-mapped file
+        stride (int): the number of rows between index entries
+        mtime (float): the modification time of the file, recorded so that
+            stale indexes can be detected
+
+    Returns:
+        TimestampIndex
+    """
+    header, body_offset = _load_buffer_header(source)
+    _check_header(header)
+
+    decoder = _RowDecoder(_load_column_names(header), binary=True)
+    index = TimestampIndex(stride, body_offset, len(source), mtime)
+
+    count = 0
+    for offset, line in buffer.iter_lines_with_offsets(source, body_offset):
+        if not line.strip() or line.lstrip().startswith(b";"):
+            continue
+        if count % stride == 0:
+            index.add(decoder.fields(line)[0], offset)
+        count += 1
+    return index
+
+
+def index_file(path, stride=DEFAULT_INDEX_STRIDE):
+    """Build the timestamp index of the TRC file at the given path
+
+    The index is saved next to the file (see index.index_path).
+
+    Args:
+        path (str): the path to the TRC file
+        stride (int): the number of rows between index entries
+
+    Returns:
+        TimestampIndex
+    """
+    with buffer.open_mmap(path) as source:
+        index = build_index(source, stride, os.stat(path).st_mtime)
+    index.save(index_path(path))
+    return index
+
+
+def _load_index(path, source, stride):
+    try:
+        index = TimestampIndex.load(index_path(path))
+        if index.matches(path):
+            return index
+    except (IOError, OSError, ValueError):
+        pass
+
+    index = build_index(source, stride, os.stat(path).st_mtime)
+    try:
+        index.save(index_path(path))
+    except (IOError, OSError):
+        # The index is only a cache, the directory may not be writable
+        pass
+    return index
+
+
+def load_window(
+    path, start=None, end=None, stride=DEFAULT_INDEX_STRIDE, message_filter=None
+):
+    """Parse the messages of a TRC file within a time window
+
+    The file's timestamp index is used to seek close to the start of the
+    window, and rows are decoded until the end of the window. If the index
+    is missing or out of date, it is rebuilt and saved first. Timestamps are
+    assumed to be monotonically increasing.
+
+    Args:
+        path (str): the path to the TRC file
+        start (float): the earliest time offset in milliseconds, inclusive
+        end (float): the latest time offset in milliseconds, exclusive
+        stride (int): the number of rows between entries of a rebuilt index
+        message_filter (MessageFilter): only load the accepted messages
+
+    Returns:
+        InternalTrace: a trace whose messages are a ColumnarMessages
+    """
+    with buffer.open_mmap(path) as source:
+        header, body_offset = _load_buffer_header(source)
+        _check_header(header)
+
+        if start is None:
+            offset = body_offset
+        else:
+            offset = _load_index(path, source, stride).lookup(start)
+
+        decoder = _RowDecoder(_load_column_names(header), binary=True)
+        messages = ColumnarMessages()
+        lines = _iter_data_lines(None, buffer.iter_lines(source, offset), b";")
+        for line in lines:
+            fields = decoder.fields(line)
+            timestamp, arbitration_id, dlc, direction, message_type, bus, data = fields
+            if start is not None and timestamp < start:
+                continue
+            if end is not None and timestamp >= end:
+                break
+            if message_filter is not None and not message_filter.accepts_fields(
+                arbitration_id, message_type, direction
+            ):
+                continue
+
+            messages.append_row(*fields)
+
+    return InternalTrace(
+        messages=messages,
+        start_timestamp=_load_start_time_comment(header),
+        start_time=_load_start_datetime(header),
+    )
+
+
+class TrcParser(object):
+    """Incrementally parse TRC data that arrives in pieces
+
+    Every call to ``feed`` parses the complete rows among the bytes given so
+    far. A partial last line is kept until the rest of it arrives, so the
+    data can be split anywhere, such as into the reads of a socket.
+
+    The header is parsed once, as soon as the first data row has arrived.
+    Rows are decoded a block at a time, like by ``load_path``.
+    """
+
+    def __init__(self, message_filter=None):
+        """Create a new TrcParser
+
+        Args:
+            message_filter (MessageFilter): only return the accepted messages
+        """
+        self._message_filter = message_filter
+        # The bytes of the last line received so far, which is not complete
+        self._pending = b""
+        self._header = None
+        self._header_lines = []
+        self._decoder = None
+
+    @property
+    def header(self):
+        """dict: the parsed header tokens, or None until the first data row
+        has arrived"""
+        return self._header
+
+    @property
+    def start_timestamp(self):
+        """str: the start time of the trace, or None until the header has
+        been parsed"""
+        if self._header is None:
+            return None
+        return _load_start_time_comment(self._header)
+
+    @property
+    def start_time(self):
+        """datetime.datetime: the ``;$STARTTIME`` of the trace, or None until
+        the header has been parsed"""
+        if self._header is None:
+            return None
+        return _load_start_datetime(self._header)
+
+    @property
+    def buses(self):
+        """list: the buses listed in the header, or None if it lists none or
+        until the header has been parsed"""
+        if self._header is None:
+            return None
+        return _load_buses(self._header)
+
+    def feed(self, data):
+        """Parse the complete rows among the bytes received so far
+
+        Args:
+            data (bytes): the bytes received since the last call
+
+        Returns:
+            list: the new InternalMessages, which is empty if no complete row
+                has been received
+        """
+        end = data.rfind(b"\n")
+        if end == -1:
+            self._pending += data
+            return []
+        lines = (self._pending + data[: end + 1]).splitlines(True)
+        self._pending = data[end + 1 :]
+        return self._load_lines(lines)
+
+    def close(self):
+        """Parse the last line, once no more data will arrive
+
+        Returns:
+            list: the InternalMessages of the last line, if it is a data row
+        """
+        lines = [self._pending] if self._pending else []
+        self._pending = b""
+        messages = self._load_lines(lines)
+        if self._decoder is None and self._header_lines:
+            # There are no data rows, but the header can still be parsed
+            self._parse_header()
+        return messages
+
+    def _load_lines(self, lines):
+        if self._decoder is None:
+            lines = self._load_header(lines)
+            if self._decoder is None:
+                return []
+
+        decoder = self._decoder
+        rows = list(decoder.filter_lines(_iter_data_lines(None, lines, b";")))
+        if not rows:
+            return []
+        return decoder.build_rows(*decoder.decode_rows(rows))
+
+    def _load_header(self, lines):
+        """Collect header lines until the first data row, then parse them
+
+        Returns:
+            list: the lines after the header, which are all data rows or
+                comments
+        """
+        for number, line in enumerate(lines):
+            if line.strip() and not line.lstrip().startswith(b";"):
+                break
+            self._header_lines.append(line.decode(_BINARY_ENCODING))
+        else:
+            return []
+
+        self._parse_header()
+        return lines[number:]
+
+    def _parse_header(self):
+        self._header, first_line = _load_header(iter(self._header_lines))
+        _check_header(self._header)
+        self._decoder = _RowDecoder(
+            _load_column_names(self._header), True, self._message_filter
+        )
+        self._header_lines = None
+
+
+class TrcFollower(object):
+    """Incrementally parse a TRC file that is still being written
+
+    Every call to ``poll`` reads the bytes appended to the file since the
+    previous call, and parses the complete rows among them with a TrcParser.
+    A half-written last line is kept until the rest of it has been written,
+    and no byte of the file is read twice.
+    """
+
+    def __init__(self, fileobj, message_filter=None, block_size=1024 * 1024):
+        """Create a new TrcFollower
+
+        Args:
+            fileobj (file): the TRC file, opened in binary mode
+            message_filter (MessageFilter): only return the accepted messages
+            block_size (int): the largest number of bytes read per poll
+        """
+        self._fileobj = fileobj
+        self._block_size = block_size
+        self._position = 0
+        self._parser = TrcParser(message_filter)
+
+    @property
+    def header(self):
+        """dict: see TrcParser"""
+        return self._parser.header
+
+    @property
+    def start_timestamp(self):
+        """str: see TrcParser"""
+        return self._parser.start_timestamp
+
+    @property
+    def start_time(self):
+        """datetime.datetime: see TrcParser"""
+        return self._parser.start_time
+
+    @property
+    def buses(self):
+        """list: see TrcParser"""
+        return self._parser.buses
+
+    @property
+    def position(self):
+        """int: the number of bytes of the file read so far"""
+        return self._position
+
+    def poll(self):
+        """Parse the complete rows appended to the file since the last poll
+
+        Returns:
+            list: the new InternalMessages, which is empty if no complete row
+                has been appended
+        """
+        try:
+            size = os.fstat(self._fileobj.fileno()).st_size
+        except (AttributeError, OSError):
+            size = None
+        if size is not None and size < self._position:
+            raise ValueError(
+                "The file was truncated to {} bytes, after {} bytes had been "
+                "read".format(size, self._position)
+            )
+
+        self._fileobj.seek(self._position)
+        data = self._fileobj.read(self._block_size)
+        if not data:
+            return []
+        self._position += len(data)
+        return self._parser.feed(data)
+
+    def follow(self, poll_interval=0.5, idle_timeout=None, sleep=time.sleep):
+        """Poll the file until it stops growing
+
+        Args:
+            poll_interval (float): the number of seconds to wait between polls
+                once every byte written so far has been read
+            idle_timeout (float): stop once the file has not grown for this
+                many seconds, or never stop if None
+            sleep (callable): called with the number of seconds to wait
+
+        Returns:
+            iterator: lists of new InternalMessages, one per poll that found
+                complete rows
+        """
+        idle = 0.0
+        while True:
+            position = self._position
+            messages = self.poll()
+            if messages:
+                yield messages
+
+            read = self._position - position
+            if read:
+                idle = 0.0
+                if read == self._block_size:
+                    # There is probably more to read already
+                    continue
+            elif idle_timeout is not None and idle >= idle_timeout:
+                return
+
+            sleep(poll_interval)
+            idle += poll_interval
+
+
+# Equivalent to a single row of the trc.j2 template
+_TRC_ROW_FORMAT = "%8d%14s%3s %-2s%9.4X%3s -%3d    %s\n"
+
+# The same, for float timestamps
+_TRC_FLOAT_ROW_FORMAT = "%8d%14.3f%3s %-2s%9.4X%3s -%3d    %s\n"
+
+
+class TrcWriter(TraceWriter):
+    """Stream messages to a file object in the TRC format
+
+    The output is identical to InternalTrace.as_trc_string, followed by a
+    trailing newline. Given a start_time, it is written as the
+    ``;$STARTTIME``.
+
+    The header lists the buses the messages were sent on. Unless they are
+    given, they are collected from the messages: the rows are written to a
+    temporary file, and only copied to the file object after the header once
+    the writer is closed.
+
+    A ColumnarMessages is formatted straight from its columns, and the
+    payloads of every batch are hex-encoded together.
+    """
+
+    def __init__(self, fileobj, start_timestamp=None, buffer_size=4096, **kwargs):
+        # The file object the rows are copied to once the buses are known
+        self._output = None
+        self._row_buses = None
+        if kwargs.get("buses") is None:
+            self._output = fileobj
+            self._row_buses = set()
+            fileobj = tempfile.TemporaryFile("w+", newline="")
+        super(TrcWriter, self).__init__(fileobj, start_timestamp, buffer_size, **kwargs)
+
+    def _format_header(self):
+        if self._output is not None:
+            return ""
+
+        # Render the template without any messages to get the header
+        trace = InternalTrace(
+            start_timestamp=self._start_timestamp, messages=[], buses=self._buses
+        )
+        return trace.as_trc_string(self._start_time) + "\n"
+
+    def _format_row(self, index, message):
+        if self._row_buses is not None:
+            self._row_buses.add(message.bus_number)
+        return _TRC_ROW_FORMAT % (
+            index,
+            message.timestamp_as_trc_string,
+            MESSAGE_TYPE_TO_TRC_STRING[message.message_type],
+            message.bus_number or "-",
+            message.arbitration_id,
+            DIRECTION_TO_TRC_STRING[message.direction],
+            message.dlc,
+            message.data_as_trc_string,
+        )
+
+    def _format_columns(
+        self,
+        index,
+        timestamps,
+        arbitration_ids,
+        dlcs,
+        directions,
+        message_types,
+        buses,
+        ends,
+        payload,
+    ):
+        """Format a batch of messages given as columns
+
+        Args:
+            index (int): the number of the first row
+            ends (list): the end offset of every message's data in payload
+            payload (bytes): the data of all of the messages, back to back
+        """
+        # Every byte of the payload takes up three characters, including the
+        # space in front of it
+        hex_payload = " " + format_data(payload)
+        data = [
+            hex_payload[3 * start + 1 : 3 * end]
+            for start, end in zip(itertools.chain([0], ends), ends)
+        ]
+        values = tuple(
+            itertools.chain.from_iterable(
+                zip(
+                    range(index, index + len(timestamps)),
+                    timestamps,
+                    map(MESSAGE_TYPE_TO_TRC_STRING.__getitem__, message_types),
+                    [bus or "-" for bus in buses],
+                    arbitration_ids,
+                    map(DIRECTION_TO_TRC_STRING.__getitem__, directions),
+                    dlcs,
+                    data,
+                )
+            )
+        )
+        return (_TRC_FLOAT_ROW_FORMAT * len(timestamps)) % values
+
+    def write_messages(self, messages):
+        """Write all of the given messages
+
+        Args:
+            messages (iterable): the messages to write
+        """
+        if not isinstance(messages, ColumnarMessages):
+            super(TrcWriter, self).write_messages(messages)
+            return
+
+        offsets = messages.payload_offsets
+        for start in range(0, len(messages), self._buffer_size):
+            end = min(start + self._buffer_size, len(messages))
+            base = offsets[start]
+            self._buffer.append(
+                self._format_columns(
+                    self._count + 1,
+                    messages.timestamps[start:end],
+                    messages.arbitration_ids[start:end],
+                    messages.dlcs[start:end],
+                    messages.directions[start:end],
+                    messages.message_types[start:end],
+                    messages.buses[start:end],
+                    [offset - base for offset in offsets[start + 1 : end + 1]],
+                    messages.payload[base : offsets[end]],
+                )
+            )
+            if self._row_buses is not None:
+                self._row_buses.update(messages.buses[start:end])
+            self._count += end - start
+            self.flush()
+
+    def close(self):
+        """Finish writing the trace
 
-    messages = _load_rows(tokens)
-    start_time = _load_start_time_comment(tokens)
-    #  print(tokens.get("StartTimeLineComment"))
+        The underlying file object is left open.
+        """
+        super(TrcWriter, self).close()
+        if self._output is None:
+            return
 
-    return InternalTrace(messages=messages, start_timestamp=start_time)
+        spool = self._fileobj
+        self._fileobj, self._output = self._output, None
+        # Messages without a bus are written with "-" as their bus
+        self._buses = sorted(bus for bus in self._row_buses if bus)
+        self._fileobj.write(self._format_header())
+        spool.seek(0)
+        shutil.copyfileobj(spool, self._fileobj)
+        spool.close()
+        self._fileobj.flush()
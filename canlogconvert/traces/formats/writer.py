@@ -0,0 +1,123 @@
+"""Incremental writers for trace formats
+"""
+import itertools
+
+
+class TraceWriter(object):
+    """Base class for writers that stream messages to a file object
+
+    The header is written once, then every message is formatted into a row
+    which is buffered and written out in chunks of ``buffer_size`` rows. Only
+    a single chunk is held in memory, however many messages are written.
+
+    Subclasses implement ``_format_header`` and ``_format_row``, and may
+    implement ``_format_footer``. ``write_messages`` formats messages in
+    batches through ``_format_rows``, which subclasses can override to format
+    a whole batch at once.
+
+    Attributes:
+        binary (bool): whether the writer expects a file object opened in
+            binary mode
+    """
+
+    binary = False
+
+    def __init__(
+        self,
+        fileobj,
+        start_timestamp=None,
+        buffer_size=4096,
+        start_time=None,
+        buses=None,
+    ):
+        """Create a new TraceWriter
+
+        Args:
+            fileobj (file): a file object opened in text mode
+            start_timestamp (str): the start time of the trace
+            buffer_size (int): the number of rows to buffer between writes
+            start_time (datetime.datetime): the absolute start time of the
+                trace, for formats that record it separately
+            buses (list): the numbers of the buses the messages were sent on,
+                for formats that list them in their header
+        """
+        self._fileobj = fileobj
+        self._start_timestamp = start_timestamp
+        self._start_time = start_time
+        self._buses = buses
+        self._buffer_size = buffer_size
+        self._buffer = []
+        self._count = 0
+        self._closed = False
+
+        self._fileobj.write(self._format_header())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def count(self):
+        """int: the number of messages written so far"""
+        return self._count
+
+    def _format_header(self):
+        raise NotImplementedError
+
+    def _format_row(self, index, message):
+        raise NotImplementedError
+
+    def _format_rows(self, index, messages):
+        return [
+            self._format_row(row_index, message)
+            for row_index, message in enumerate(messages, index)
+        ]
+
+    def _format_footer(self):
+        return ""
+
+    def write(self, message):
+        """Write a single message
+
+        Args:
+            message (InternalMessage): the message to write
+        """
+        self._count += 1
+        self._buffer.append(self._format_row(self._count, message))
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def write_messages(self, messages):
+        """Write all of the given messages
+
+        Args:
+            messages (iterable): the messages to write
+        """
+        messages = iter(messages)
+        while True:
+            batch = list(itertools.islice(messages, self._buffer_size))
+            if not batch:
+                break
+
+            self._buffer.extend(self._format_rows(self._count + 1, batch))
+            self._count += len(batch)
+            self.flush()
+
+    def flush(self):
+        """Write out any buffered rows"""
+        if self._buffer:
+            self._fileobj.write("".join(self._buffer))
+            del self._buffer[:]
+        self._fileobj.flush()
+
+    def close(self):
+        """Finish writing the trace
+
+        The underlying file object is left open.
+        """
+        if not self._closed:
+            self._closed = True
+            self._buffer.append(self._format_footer())
+        self.flush()
@@ -0,0 +1,103 @@
+"""Merging of traces recorded at the same time
+
+Every trace holds the messages of one recording, with timestamps relative to
+the trace's own start time. Merging places the messages of all traces on a
+common time line, starting at the earliest start time, and interleaves them
+in time order.
+
+The traces are merged as streams through a heap holding the next message of
+every trace, so memory usage only depends on the number of traces, not on
+the number of messages.
+"""
+import heapq
+import itertools
+
+from canlogconvert.traces.formats.internal_trace import InternalMessage
+from canlogconvert.traces.formats.internal_trace import InternalTrace
+from canlogconvert.traces.formats.internal_trace import format_start_timestamp
+
+
+def _iter_shifted(index, messages, offset, bus_number):
+    """Yield the messages of a trace as heap entries on the common time line
+
+    The index of the trace breaks ties, so messages with the same timestamp
+    keep the order of the traces, and the messages are never compared.
+
+    The messages are rebased into new InternalMessages rather than in place,
+    since writing to the views of a ColumnarMessages copies its columns.
+    """
+    for message in messages:
+        timestamp = float(message.timestamp) + offset
+        shifted = InternalMessage(
+            message.arbitration_id,
+            message.data,
+            message.dlc,
+            message.direction,
+            timestamp,
+        )
+        shifted.message_type = message.message_type
+        if bus_number is None:
+            shifted.bus_number = message.bus_number
+        else:
+            shifted.bus_number = bus_number
+        yield timestamp, index, shifted
+
+
+def _iter_merged(entries):
+    for timestamp, index, message in heapq.merge(*entries):
+        yield message
+
+
+def merge(traces, buses=None):
+    """Merge traces into a single trace, in order of absolute time
+
+    The messages of every trace must be in time order, as they are in
+    recorded traces. Timestamps are rebased onto the earliest start time of
+    the traces, and become floats. Traces without a start time are assumed
+    to start at the earliest start time.
+
+    Args:
+        traces (list): the InternalTraces to merge
+        buses (list): the bus number given to the messages of every trace,
+            or None to keep the bus numbers of the messages
+
+    Returns:
+        InternalTrace: the merged trace, whose messages are a one-shot
+            iterator backed by the given traces
+    """
+    if buses is not None and len(buses) != len(traces):
+        raise ValueError(
+            "Got {} bus numbers for {} traces".format(len(buses), len(traces))
+        )
+
+    start_times = [trace.start_time for trace in traces]
+    known_start_times = [start for start in start_times if start is not None]
+    start = min(known_start_times) if known_start_times else None
+
+    entries = []
+    for index, trace in enumerate(traces):
+        if start_times[index] is None:
+            offset = 0.0
+        else:
+            offset = (start_times[index] - start).total_seconds() * 1000.0
+        entries.append(
+            _iter_shifted(
+                index, trace.messages, offset, None if buses is None else buses[index]
+            )
+        )
+
+    trace_buses = [trace.buses for trace in traces]
+    if buses is not None:
+        merged_buses = sorted(set(buses))
+    elif None not in trace_buses:
+        merged_buses = sorted(set(itertools.chain.from_iterable(trace_buses)))
+    else:
+        # Left to be collected from the merged messages
+        merged_buses = None
+
+    return InternalTrace(
+        start_timestamp=None if start is None else format_start_timestamp(start),
+        messages=_iter_merged(entries),
+        start_time=start,
+        buses=merged_buses,
+    )
@@ -0,0 +1,207 @@
+"""Extraction of signals from the data of messages
+
+A signal is a run of bits in the data of the messages with a given
+arbitration ID, such as a speed or a temperature, described the way a DBC
+file describes it: by its start bit, length and byte order, whether it is
+signed, and the scale and offset from its raw value to its physical value.
+
+The trace is exported to a NumPy array (see canlogconvert.traces.arrays)
+and its messages are grouped by arbitration ID once. The signals of every ID
+are then decoded from the data of all of its messages at once, by shifting
+and masking whole columns of bytes. Requires NumPy.
+"""
+import collections
+
+from canlogconvert.traces.arrays import _import_numpy
+
+LITTLE_ENDIAN = "little_endian"
+BIG_ENDIAN = "big_endian"
+
+
+class SignalSpec(object):
+    """A signal in the data of the messages with an arbitration ID
+
+    Bits are numbered like in DBC files, from the least significant bit of
+    the first byte of the data (bit 0) to the most significant bit of the
+    last byte. The start bit of a little endian (Intel) signal is its least
+    significant bit, and that of a big endian (Motorola) signal is its most
+    significant bit.
+
+    Attributes:
+        name (str): the name of the signal
+        arbitration_id (int): the ID of the messages holding the signal
+        start_bit (int): the number of the signal's start bit
+        length (int): the number of bits of the signal, at most 64
+        byte_order (str): LITTLE_ENDIAN or BIG_ENDIAN
+        signed (bool): whether the raw value is a two's complement integer
+        scale (float): the physical value per unit of the raw value
+        offset (float): the physical value of a raw value of 0
+        bus (int): only read the messages sent on this bus, or None to read
+            the messages of all buses
+    """
+
+    def __init__(
+        self,
+        name,
+        arbitration_id,
+        start_bit,
+        length,
+        byte_order=LITTLE_ENDIAN,
+        signed=False,
+        scale=1.0,
+        offset=0.0,
+        bus=None,
+    ):
+        """Create a new SignalSpec"""
+        if not 1 <= length <= 64:
+            raise ValueError(
+                "Signal '{}' has a length of {} bits, which is not between 1 "
+                "and 64".format(name, length)
+            )
+        if byte_order not in (LITTLE_ENDIAN, BIG_ENDIAN):
+            raise ValueError(
+                "Signal '{}' has an unknown byte order '{}'".format(name, byte_order)
+            )
+        if start_bit < 0:
+            raise ValueError(
+                "Signal '{}' has a negative start bit {}".format(name, start_bit)
+            )
+
+        self.name = name
+        self.arbitration_id = arbitration_id
+        self.start_bit = start_bit
+        self.length = length
+        self.byte_order = byte_order
+        self.signed = signed
+        self.scale = scale
+        self.offset = offset
+        self.bus = bus
+
+    def byte_shifts(self):
+        """The bytes of the data holding the signal, and how far each one is
+        shifted to the left to line it up with the raw value
+
+        Returns:
+            list: (byte, shift) tuples, where a negative shift is to the right
+        """
+        if self.byte_order == LITTLE_ENDIAN:
+            # The least significant bit of every byte is numbered 8 * byte
+            first = self.start_bit
+            last = first + self.length - 1
+            return [
+                (byte, 8 * byte - first) for byte in range(first // 8, last // 8 + 1)
+            ]
+
+        # Number the bits from the most significant bit of the first byte,
+        # in which order a big endian signal is contiguous
+        first = 8 * (self.start_bit // 8) + 7 - self.start_bit % 8
+        last = first + self.length - 1
+        return [
+            (byte, last - (8 * byte + 7)) for byte in range(first // 8, last // 8 + 1)
+        ]
+
+    def data_length(self):
+        """int: the fewest bytes of data that hold the whole signal"""
+        return self.byte_shifts()[-1][0] + 1
+
+
+def decode_signal(spec, data):
+    """Decode a signal from the data of many messages at once
+
+    Args:
+        spec (SignalSpec): the signal
+        data (numpy.ndarray): a row of bytes per message, which is at least
+            spec.data_length() bytes wide
+
+    Returns:
+        numpy.ndarray: the physical value of the signal in every message
+    """
+    numpy = _import_numpy()
+
+    raw = numpy.zeros(len(data), dtype="u8")
+    for byte, shift in spec.byte_shifts():
+        column = data[:, byte].astype("u8")
+        if shift >= 0:
+            raw |= column << numpy.uint64(shift)
+        else:
+            raw |= column >> numpy.uint64(-shift)
+    raw &= numpy.uint64((1 << spec.length) - 1)
+
+    if spec.signed:
+        # Sign extend, wrapping around, then reinterpret as two's complement
+        sign = numpy.uint64(1 << (spec.length - 1))
+        raw = ((raw ^ sign) - sign).view("i8")
+
+    return raw * spec.scale + spec.offset
+
+
+def _series(numpy, timestamps, values):
+    series = numpy.empty(len(timestamps), dtype=[("timestamp", "f8"), ("value", "f8")])
+    series["timestamp"] = timestamps
+    series["value"] = values
+    return series
+
+
+def extract_signals(trace, specs, data_width=None):
+    """Extract the time series of signals from a trace
+
+    Messages whose data is too short to hold a signal are skipped for that
+    signal.
+
+    Args:
+        trace (InternalTrace): the trace, or an array exported from one by
+            InternalTrace.to_numpy
+        specs (list): the SignalSpecs of the signals, with unique names
+        data_width (int): see InternalTrace.to_numpy
+
+    Returns:
+        dict: the name of every signal, mapped to an array of records with
+            the ``timestamp`` of every message holding the signal and its
+            physical ``value``
+    """
+    numpy = _import_numpy()
+
+    records = trace
+    if not isinstance(trace, numpy.ndarray):
+        records = trace.to_numpy(data_width)
+
+    specs_by_id = collections.OrderedDict()
+    for spec in specs:
+        specs_by_id.setdefault(spec.arbitration_id, []).append(spec)
+
+    # Sort by ID once, after which the messages of every ID are a slice
+    order = numpy.argsort(records["arbitration_id"], kind="stable")
+    sorted_ids = records["arbitration_id"][order]
+    width = records.dtype["data"].shape[0]
+
+    ids = numpy.array(list(specs_by_id), dtype=sorted_ids.dtype)
+    starts = numpy.searchsorted(sorted_ids, ids, side="left")
+    ends = numpy.searchsorted(sorted_ids, ids, side="right")
+
+    signals = {}
+    for id_specs, start, end in zip(specs_by_id.values(), starts, ends):
+        rows = order[start:end]
+        # Gather the columns of the ID's messages once for all of its signals
+        timestamps = records["timestamp"][rows]
+        lengths = records["length"][rows]
+        buses = records["bus"][rows]
+        data = records["data"][rows]
+
+        for spec in id_specs:
+            data_length = spec.data_length()
+            if data_length > width:
+                # No message of the trace holds the whole signal
+                signals[spec.name] = _series(numpy, timestamps[:0], timestamps[:0])
+                continue
+
+            selected = lengths >= data_length
+            if spec.bus is not None:
+                selected &= buses == spec.bus
+            if selected.all():
+                # Skip copying the columns again
+                selected = slice(None)
+            signals[spec.name] = _series(
+                numpy, timestamps[selected], decode_signal(spec, data[selected])
+            )
+
+    return signals
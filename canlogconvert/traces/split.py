@@ -0,0 +1,316 @@
+"""Splitting of traces into shards
+
+A trace is read once, and its messages are written to a sequence of shards
+that each hold at most a number of rows, bytes or milliseconds. Messages can
+also be grouped into shards by a key, such as their bus or the range their
+arbitration ID falls in, in which case every key has its own sequence of
+shards and the shards of all keys are written to at the same time.
+
+Every shard is a complete trace of its own. Its start time is the absolute
+time of its first message, timestamps are offsets from it, and rows are
+numbered from 1.
+"""
+import bisect
+import datetime
+import math
+
+from canlogconvert.traces.formats.internal_trace import format_start_timestamp
+
+# Messages are handed to a shard's writer in chunks of this many rows
+_CHUNK_SIZE = 1024
+
+# Shard start times are rounded to the resolution of a TRC ;$STARTTIME
+_START_TIME_RESOLUTION = 10
+
+
+def bus_key(message):
+    """Key messages by the number of their bus"""
+    return message.bus_number
+
+
+class IdRangeKey(object):
+    """Key messages by the range of arbitration IDs they fall in
+
+    Messages outside of all ranges are keyed as ``other``.
+    """
+
+    OTHER = "other"
+
+    def __init__(self, ranges):
+        """Create a new IdRangeKey
+
+        Args:
+            ranges (list): (lowest, highest) arbitration IDs of every range,
+                inclusive. Ranges may not overlap.
+        """
+        ranges = sorted(ranges)
+        for (low, high), (next_low, next_high) in zip(ranges, ranges[1:]):
+            if next_low <= high:
+                raise ValueError(
+                    "ID ranges {:X}-{:X} and {:X}-{:X} overlap".format(
+                        low, high, next_low, next_high
+                    )
+                )
+        self._lows = [low for low, high in ranges]
+        self._ranges = ranges
+        self._keys = ["{:X}-{:X}".format(low, high) for low, high in ranges]
+
+    def __call__(self, message):
+        arbitration_id = message.arbitration_id
+        index = bisect.bisect_right(self._lows, arbitration_id) - 1
+        if index >= 0 and arbitration_id <= self._ranges[index][1]:
+            return self._keys[index]
+        return self.OTHER
+
+
+class _CountingFile(object):
+    """Count the characters or bytes written through to a file object"""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return self._fileobj.write(data)
+
+    def flush(self):
+        self._fileobj.flush()
+
+
+class Shard(object):
+    """A single output of a Splitter
+
+    Attributes:
+        key: the key of the shard's messages, or None
+        index (int): the position of the shard among the shards of its key,
+            from 0
+        rows (int): the number of messages written to the shard
+        start_time (datetime.datetime): the absolute time of the first
+            message, if the trace's start time is known
+    """
+
+    def __init__(self, key, index):
+        self.key = key
+        self.index = index
+        self.rows = 0
+        self.start_time = None
+
+
+class _OpenShard(object):
+    def __init__(self, shard, writer, counter, fileobj, first_timestamp, offset):
+        self.shard = shard
+        self.writer = writer
+        self.counter = counter
+        self.fileobj = fileobj
+        self.first_timestamp = first_timestamp
+        self.offset = offset
+        self.pending = []
+        self.written_rows = 0
+        self.header_size = counter.size
+
+
+class Splitter(object):
+    """Stream messages into rolling shards
+
+    A new shard is started for a key once adding a message would exceed
+    ``max_rows`` rows, ``max_bytes`` bytes or ``max_span`` milliseconds.
+    Sizes are counted before compression and without the footer of the
+    format, and are kept to by estimating the size of the rows that have not
+    been written out yet from the rows that have.
+
+    Timestamps are rebased in place, so the messages should not be shared
+    with other consumers.
+    """
+
+    def __init__(
+        self,
+        open_shard,
+        start_timestamp=None,
+        start_time=None,
+        buses=None,
+        key=None,
+        max_rows=None,
+        max_bytes=None,
+        max_span=None,
+    ):
+        """Create a new Splitter
+
+        Args:
+            open_shard (callable): called with the key and index of a new
+                shard, and returns the writer class of the shard and the file
+                object to write it to, which is closed by the Splitter
+            start_timestamp (str): the start time of the trace, used when its
+                absolute start time is not known
+            start_time (datetime.datetime): the absolute start time of the
+                trace
+            buses (list): the buses of the trace, listed in shard headers.
+                Unless they are given, they are collected from the rows of
+                every shard, except for shards limited in bytes, which are
+                written out as they go and list bus 1.
+            key (callable): maps every message to the key of its shards, or
+                None to write every message to a single sequence of shards
+            max_rows (int): the most rows in a shard
+            max_bytes (int): the most bytes in a shard, including its header
+            max_span (float): the most milliseconds between the first and
+                the last message of a shard
+        """
+        self._open_shard = open_shard
+        self._start_timestamp = start_timestamp
+        self._start_time = start_time
+        self._buses = buses
+        self._key = key
+        self._max_rows = max_rows
+        self._max_bytes = max_bytes
+        self._max_span = max_span
+
+        self._open = {}
+        self._shards = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def shards(self):
+        """list: the Shards started so far, in the order they were started"""
+        return list(self._shards)
+
+    def write_messages(self, messages):
+        """Write the given messages to their shards
+
+        Args:
+            messages (iterable): the messages, in time order
+        """
+        key_function = self._key
+        open_shards = self._open
+        for message in messages:
+            key = None if key_function is None else key_function(message)
+            timestamp = float(message.timestamp)
+
+            current = open_shards.get(key)
+            if current is None or self._is_full(current, timestamp):
+                current = self._roll(key, current, timestamp)
+
+            message.timestamp = timestamp - current.offset
+            current.pending.append(message)
+            current.shard.rows += 1
+            if len(current.pending) >= self._chunk_size(current):
+                self._write_pending(current)
+
+    def close(self):
+        """Finish writing every shard"""
+        for current in self._open.values():
+            self._close(current)
+        self._open.clear()
+
+    def _is_full(self, current, timestamp):
+        if self._max_rows is not None and current.shard.rows >= self._max_rows:
+            return True
+        if (
+            self._max_span is not None
+            and timestamp - current.first_timestamp >= self._max_span
+        ):
+            return True
+        if self._max_bytes is not None:
+            return self._estimated_size(current) > self._max_bytes
+        return False
+
+    def _row_size(self, current):
+        if not current.written_rows:
+            return None
+        return float(current.counter.size - current.header_size) / current.written_rows
+
+    def _estimated_size(self, current):
+        """Estimate the size of a shard once another row has been added"""
+        if not current.written_rows:
+            # Write out the first rows to measure their size
+            self._write_pending(current)
+        row_size = self._row_size(current)
+        return current.counter.size + (len(current.pending) + 1) * row_size
+
+    def _chunk_size(self, current):
+        row_size = self._row_size(current)
+        if self._max_bytes is None or row_size is None:
+            return _CHUNK_SIZE
+
+        remaining = (self._max_bytes - current.counter.size) / row_size
+        # Write out well before the limit, so that the estimate is refined
+        return int(max(1, min(_CHUNK_SIZE, remaining / 2)))
+
+    def _roll(self, key, current, timestamp):
+        if current is not None:
+            self._close(current)
+
+        index = 0 if current is None else current.shard.index + 1
+        shard = Shard(key, index)
+        self._shards.append(shard)
+
+        writer_class, fileobj = self._open_shard(key, index)
+        if self._max_bytes is not None and writer_class.binary:
+            fileobj.close()
+            raise ValueError("Binary shards can't be limited in size")
+
+        offset = 0.0
+        start_timestamp = self._start_timestamp
+        if self._start_time is not None:
+            # The shard starts at its first message, rounded down so that
+            # no offset is negative
+            shard.start_time = self._start_time + datetime.timedelta(
+                microseconds=math.floor(timestamp * 1000.0 / _START_TIME_RESOLUTION)
+                * _START_TIME_RESOLUTION
+            )
+            offset = (shard.start_time - self._start_time).total_seconds() * 1000.0
+            start_timestamp = format_start_timestamp(shard.start_time)
+
+        if self._key is bus_key:
+            buses = [key]
+        elif self._buses is None and self._max_bytes is not None:
+            # The size of a shard is measured as it is written, which a
+            # writer that collects the buses from the rows holds back
+            buses = []
+        else:
+            buses = self._buses
+        counter = _CountingFile(fileobj)
+        writer = writer_class(
+            counter, start_timestamp, start_time=shard.start_time, buses=buses
+        )
+        current = _OpenShard(shard, writer, counter, fileobj, timestamp, offset)
+        self._open[key] = current
+        return current
+
+    def _write_pending(self, current):
+        current.writer.write_messages(current.pending)
+        current.written_rows += len(current.pending)
+        del current.pending[:]
+
+    def _close(self, current):
+        try:
+            self._write_pending(current)
+            current.writer.close()
+        finally:
+            current.fileobj.close()
+
+
+def split(trace, open_shard, **options):
+    """Split a trace into shards
+
+    Args:
+        trace (InternalTrace): the trace to split
+        open_shard (callable): see Splitter
+        options: the key and limits of the shards, see Splitter
+
+    Returns:
+        list: the Shards that were written
+    """
+    with Splitter(
+        open_shard,
+        start_timestamp=trace.start_timestamp,
+        start_time=trace.start_time,
+        buses=trace.buses,
+        **options
+    ) as splitter:
+        splitter.write_messages(trace.messages)
+    return splitter.shards
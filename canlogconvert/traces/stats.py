@@ -0,0 +1,245 @@
+"""Instrumentation of the conversion pipeline
+
+A ConversionStats is handed to the readers and writers that support it, and
+records the time spent in each phase of a conversion:
+
+    +-----------+-------------------------------------------------------+
+    | Phase     | Time spent                                            |
+    +===========+=======================================================+
+    | read      | reading lines out of the input                        |
+    +-----------+-------------------------------------------------------+
+    | tokenize  | splitting rows into their fields                      |
+    +-----------+-------------------------------------------------------+
+    | build     | creating messages out of the fields                   |
+    +-----------+-------------------------------------------------------+
+    | write     | formatting messages and writing them to the output    |
+    +-----------+-------------------------------------------------------+
+    | load      | loading the whole input up front, for readers that    |
+    |           | are not streamed (parallel and windowed TRC loading,  |
+    |           | and CLTB files)                                       |
+    +-----------+-------------------------------------------------------+
+
+Phases nest, such as reading lines while writing out messages, and the time
+of a phase never includes the time of the phases nested in it. Timing every
+row has a cost, so readers only instrument their rows when given a
+ConversionStats.
+"""
+from __future__ import print_function
+
+import collections
+import contextlib
+import sys
+import time
+
+from canlogconvert.traces.formats.internal_trace import ColumnarMessages
+from canlogconvert.traces.formats.internal_trace import MESSAGE_TYPE_TO_TRC_STRING
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PHASES = ["read", "tokenize", "build", "write", "load"]
+
+
+def peak_rss():
+    """The peak resident set size of the current process
+
+    Returns:
+        int: the peak in bytes, or None if it is not available
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError):
+        pass
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class ConversionStats(object):
+    """Times the phases of a conversion, and counts the messages converted"""
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self._phases = {}
+        # The phases that are running, innermost last
+        self._stack = []
+        self._started = None
+        self._elapsed = None
+        self._message_types = {}
+        self._rows = 0
+        self.input_bytes = 0
+
+    def start(self):
+        """Start timing the conversion as a whole"""
+        self._started = self._clock()
+
+    def stop(self):
+        """Stop timing the conversion as a whole"""
+        self._elapsed = self._clock() - self._started
+
+    @property
+    def elapsed(self):
+        """float: the wall time of the conversion in seconds"""
+        if self._elapsed is not None:
+            return self._elapsed
+        if self._started is not None:
+            return self._clock() - self._started
+        return sum(self._phases.values())
+
+    @property
+    def phases(self):
+        """dict: the time spent in each phase in seconds"""
+        return dict(self._phases)
+
+    @property
+    def rows(self):
+        """int: the number of messages counted"""
+        return self._rows
+
+    @property
+    def message_types(self):
+        """dict: the number of messages of each InternalMessageType"""
+        return dict(self._message_types)
+
+    def enter(self, phase):
+        """Start timing a phase, pausing the enclosing phase"""
+        now = self._clock()
+        if self._stack:
+            parent, started = self._stack[-1]
+            self._phases[parent] = self._phases.get(parent, 0.0) + now - started
+        self._stack.append((phase, now))
+
+    def exit(self):
+        """Stop timing the innermost phase, resuming the enclosing phase"""
+        now = self._clock()
+        phase, started = self._stack.pop()
+        self._phases[phase] = self._phases.get(phase, 0.0) + now - started
+        if self._stack:
+            self._stack[-1] = (self._stack[-1][0], now)
+
+    def switch(self, phase):
+        """Stop timing the innermost phase, and start timing another phase in
+        its place"""
+        now = self._clock()
+        previous, started = self._stack[-1]
+        self._phases[previous] = self._phases.get(previous, 0.0) + now - started
+        self._stack[-1] = (phase, now)
+
+    @contextlib.contextmanager
+    def phase(self, phase):
+        """Time the body of a with statement as the given phase"""
+        self.enter(phase)
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def timed(self, iterable, phase):
+        """Time the iteration over the given iterable as the given phase
+
+        Returns:
+            iterator: the items of the iterable
+        """
+        iterator = iter(iterable)
+        while True:
+            self.enter(phase)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.exit()
+            yield item
+
+    def count(self, messages):
+        """Count the given messages by type as they are iterated over
+
+        A ColumnarMessages is counted up front from its columns, and returned
+        as is.
+
+        Returns:
+            iterable: the messages
+        """
+        if isinstance(messages, ColumnarMessages):
+            for message_type, count in collections.Counter(
+                messages.message_types
+            ).items():
+                self._message_types[message_type] = (
+                    self._message_types.get(message_type, 0) + count
+                )
+            self._rows += len(messages)
+            return messages
+        return self._count(messages)
+
+    def _count(self, messages):
+        message_types = self._message_types
+        for message in messages:
+            message_type = message.message_type
+            message_types[message_type] = message_types.get(message_type, 0) + 1
+            self._rows += 1
+            yield message
+
+    def as_dict(self):
+        """dict: the statistics, ready to be serialized as JSON"""
+        elapsed = self.elapsed
+        return {
+            "elapsed_seconds": elapsed,
+            "phases": {
+                phase: self._phases[phase] for phase in PHASES if phase in self._phases
+            },
+            "rows": self._rows,
+            "input_bytes": self.input_bytes,
+            "rows_per_second": self._rows / elapsed if elapsed else None,
+            "bytes_per_second": self.input_bytes / elapsed if elapsed else None,
+            "message_types": {
+                MESSAGE_TYPE_TO_TRC_STRING[message_type]: count
+                for message_type, count in sorted(self._message_types.items())
+            },
+            "peak_rss_bytes": peak_rss(),
+        }
+
+    def write_json(self, fileobj):
+        """Write the statistics as JSON to the given text file object"""
+        import json
+
+        json.dump(self.as_dict(), fileobj, indent=2, sort_keys=True)
+        fileobj.write("\n")
+
+    def write_text(self, fileobj):
+        """Write a human readable summary to the given text file object"""
+        stats = self.as_dict()
+        elapsed = stats["elapsed_seconds"]
+        print(
+            "Converted {} rows in {:.3f}s".format(stats["rows"], elapsed), file=fileobj
+        )
+        for phase, seconds in sorted(
+            stats["phases"].items(), key=lambda item: PHASES.index(item[0])
+        ):
+            print(
+                "  {:<10}{:10.3f}s {:6.1f}%".format(
+                    phase, seconds, 100.0 * seconds / elapsed if elapsed else 0.0
+                ),
+                file=fileobj,
+            )
+        if stats["rows_per_second"] is not None:
+            print(
+                "  {:.0f} rows/s, {:.0f} bytes/s".format(
+                    stats["rows_per_second"], stats["bytes_per_second"]
+                ),
+                file=fileobj,
+            )
+        for message_type, count in sorted(stats["message_types"].items()):
+            print("  {:<10}{:10d}".format(message_type, count), file=fileobj)
+        if stats["peak_rss_bytes"] is not None:
+            print(
+                "  Peak RSS {:.1f} MiB".format(stats["peak_rss_bytes"] / 1048576.0),
+                file=fileobj,
+            )
@@ -19,12 +19,15 @@ setup(
     classifiers=[],
     keywords=["can"],
     url="https://github.com/karlding/canlogconvert",
-    packages=find_packages(exclude=["tests"]),
+    packages=find_packages(exclude=["tests", "benchmarks"]),
+    # Module level __getattr__ (PEP 562) needs Python 3.7
+    python_requires=">=3.7",
     install_requires=["pyparsing>=2.3.1", "Jinja2>=2.10.1"],
     # pip install -e .[docs]
     extras_require={
         "docs": ["m2r>=0.2.0", "Sphinx>=2.0.0", "sphinx-rtd-theme>=0.4.0"],
         "dev": ["black==19.3b0"],
+        "numpy": ["numpy>=1.16"],
     },
     test_suite="tests",
     entry_points={"console_scripts": ["canlogconvert=canlogconvert.__init__:_main"]},
@@ -0,0 +1,35 @@
+import unittest
+
+from benchmarks import generate
+from canlogconvert.traces.formats.internal_trace import InternalMessageType
+from canlogconvert.traces.formats.trc import load_string
+
+
+class GenerateTest(unittest.TestCase):
+    def test_generate_string(self):
+        options = generate.TraceOptions(
+            rows=500, buses=3, ids=20, extended_share=0.5, fd_share=0.25, seed=1
+        )
+
+        string = generate.generate_string(options)
+        # The same options always generate the same trace
+        self.assertEqual(string, generate.generate_string(options))
+        self.assertNotEqual(
+            string, generate.generate_string(generate.TraceOptions(rows=500, seed=2))
+        )
+
+        db = load_string(string)
+        self.assertEqual(len(db.messages), 500)
+        self.assertLessEqual(len(set(db.messages.arbitration_ids)), 20)
+        self.assertTrue(any(i > 0x7FF for i in db.messages.arbitration_ids))
+        self.assertIn(InternalMessageType.DT, db.messages.message_types)
+        self.assertTrue(
+            set(db.messages.message_types)
+            & {InternalMessageType.FD, InternalMessageType.FB}
+        )
+        timestamps = list(db.messages.timestamps)
+        self.assertEqual(timestamps, sorted(timestamps))
+
+
+if __name__ == "__main__":
+    unittest.main()
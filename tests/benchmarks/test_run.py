@@ -0,0 +1,19 @@
+import unittest
+
+from benchmarks import run
+
+
+class RunTest(unittest.TestCase):
+    def test_import_times_defers_modules(self):
+        times = run.import_times("canlogconvert")
+        self.assertIn("canlogconvert.traces.formats.trc", times)
+        self.assertGreater(times["canlogconvert"], 0)
+
+        # Only loaded once a conversion needs them
+        self.assertEqual(
+            [module for module in run.DEFERRED_MODULES if module in times], []
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import argparse
+import os
+import shutil
+import tempfile
+import unittest
+
+from canlogconvert.subparsers import convert
+from canlogconvert.traces.formats import asc
+from canlogconvert.traces.formats import trc
+
+TRC = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+       1        39.488 DT 1      0401 Rx -  6    0A 00 66 98 0B 00
+       2        40.012 DT 1      04A7 Tx -  0
+"""
+
+
+class ConvertTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.infile = os.path.join(self.directory, "in.trc")
+        with open(self.infile, "w") as fout:
+            fout.write(TRC)
+
+    def _args(self, outfile):
+        parser = argparse.ArgumentParser()
+        subparsers = parser.add_subparsers()
+        convert.add_subparser(subparsers)
+        return parser.parse_args(["convert", "-I", self.infile, "-O", outfile])
+
+    def test_convert(self):
+        outfile = os.path.join(self.directory, "out.asc")
+        args = self._args(outfile)
+        args.func(args)
+
+        with open(outfile) as fin:
+            messages = asc.load_string(fin.read()).messages
+        self.assertEqual([m.arbitration_id for m in messages], [0x401, 0x4A7])
+
+    def test_convert_keeps_start_time_and_buses(self):
+        with open(self.infile, "w") as fout:
+            fout.write(TRC.replace("DT 1      04A7", "DT 3      04A7"))
+
+        # Through a CLTB file and back
+        cltb_file = os.path.join(self.directory, "out.cltb")
+        args = self._args(cltb_file)
+        args.func(args)
+        self.infile = cltb_file
+        outfile = os.path.join(self.directory, "out.trc")
+        args = self._args(outfile)
+        args.func(args)
+
+        with open(outfile) as fin:
+            output = fin.read()
+        self.assertIn(";$STARTTIME=43474.7738065227\n", output)
+        self.assertEqual(trc.load_string(output).buses, [1, 3])
+
+    def test_convert_multi_bus_header(self):
+        with open(self.infile, "w") as fout:
+            fout.write(
+                TRC.replace("DT 1      0401", "DT 2      0401").replace(
+                    "DT 1      04A7", "DT 3      04A7"
+                )
+            )
+
+        # Streamed from a TRC file, then from an ASC file
+        for extension in ("trc", "asc"):
+            outfile = os.path.join(self.directory, "out." + extension)
+            args = self._args(outfile)
+            args.func(args)
+            self.infile = outfile
+
+        with open(os.path.join(self.directory, "out.trc")) as fin:
+            output = fin.read()
+        self.assertIn(";   2    Connection2  ", output)
+        self.assertIn(";   3    Connection3  ", output)
+        self.assertNotIn("Connection1", output)
+        self.assertEqual(trc.load_string(output).buses, [2, 3])
+
+    def test_convert_rejects_input_as_output(self):
+        for outfile in (self.infile, os.path.join(self.directory, ".", "in.trc")):
+            args = self._args(outfile)
+            self.assertRaises(ValueError, args.func, args)
+
+            # The input is left as it was
+            with open(self.infile) as fin:
+                self.assertEqual(fin.read(), TRC)
+
+
+if __name__ == "__main__":
+    unittest.main()
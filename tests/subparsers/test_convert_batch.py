@@ -0,0 +1,109 @@
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+from canlogconvert.subparsers import convert_batch
+
+TRC = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+       1        39.488 DT 1      0401 Rx -  6    0A 00 66 98 0B 00
+       2        40.012 DT 1      04A7 Tx -  0
+"""
+
+
+class ConvertBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.input_dir = os.path.join(self.directory, "in")
+        os.mkdir(self.input_dir)
+        for name, contents in [
+            ("a.trc", TRC),
+            ("b.trc", TRC),
+            ("broken.trc", u"not a trace\n"),
+            ("notes.txt", u""),
+        ]:
+            with open(os.path.join(self.input_dir, name), "w") as fout:
+                fout.write(contents)
+
+    def _args(self, workers, pattern="{stem}.asc", output_dir=None):
+        parser = argparse.ArgumentParser()
+        subparsers = parser.add_subparsers()
+        convert_batch.add_subparser(subparsers)
+        return parser.parse_args(
+            [
+                "convert-batch",
+                self.input_dir,
+                "-O",
+                output_dir or os.path.join(self.directory, "out"),
+                "--pattern",
+                pattern,
+                "-w",
+                str(workers),
+            ]
+        )
+
+    def test_convert_batch_continues_past_errors(self):
+        for workers in (1, 2):
+            args = self._args(workers)
+            self.assertRaises(ValueError, args.func, args)
+
+            outputs = sorted(os.listdir(os.path.join(self.directory, "out")))
+            self.assertEqual(outputs, ["a.asc", "b.asc"])
+            shutil.rmtree(os.path.join(self.directory, "out"))
+
+    def test_convert_batch_output_collision(self):
+        args = self._args(1, pattern="{parent}.trc")
+        self.assertRaises(ValueError, args.func, args)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "out")))
+
+    def test_convert_batch_rejects_input_as_output(self):
+        args = self._args(1, pattern="{name}", output_dir=self.input_dir)
+        self.assertRaises(ValueError, args.func, args)
+        with open(os.path.join(self.input_dir, "a.trc")) as fin:
+            self.assertEqual(fin.read(), TRC)
+
+    def test_convert_batch_picks_up_asc(self):
+        os.remove(os.path.join(self.input_dir, "broken.trc"))
+        with open(os.path.join(self.input_dir, "c.asc"), "w") as fout:
+            fout.write(u"base hex  timestamps absolute\n")
+
+        args = self._args(1, pattern="{stem}.cltb")
+        args.func(args)
+        outputs = sorted(os.listdir(os.path.join(self.directory, "out")))
+        self.assertEqual(outputs, ["a.cltb", "b.cltb", "c.cltb"])
+
+    @unittest.skipUnless(
+        multiprocessing.get_start_method() == "fork",
+        "Workers only inherit the crash when they are forked",
+    )
+    def test_convert_batch_reports_crashed_workers(self):
+        convert_file = convert_batch._convert.convert_file
+
+        def crash(args):
+            if "broken" in args.infile:
+                os._exit(1)
+            convert_file(args)
+
+        convert_batch._convert.convert_file = crash
+        self.addCleanup(setattr, convert_batch._convert, "convert_file", convert_file)
+
+        args = self._args(2)
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            self.assertRaises(ValueError, args.func, args)
+        self.assertIn("broken.trc: error: worker crashed", stderr.getvalue())
+        self.assertFalse(
+            os.path.exists(os.path.join(self.directory, "out", "broken.asc"))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from canlogconvert.subparsers import convert
+from canlogconvert.subparsers import index
+from canlogconvert.traces.formats import trc
+from canlogconvert.traces.formats.index import TimestampIndex
+from canlogconvert.traces.formats.index import index_path
+
+HEADER = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+"""
+
+
+class IndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.infile = os.path.join(self.directory, "in.trc")
+        with open(self.infile, "w") as fout:
+            fout.write(HEADER)
+            for row in range(10):
+                fout.write(
+                    u"%8d%14.3f DT 1      %04X Rx -  1    %02X\n"
+                    % (row + 1, row * 10.0, 0x100 + row, row)
+                )
+
+    def _run(self, *arguments):
+        parser = argparse.ArgumentParser()
+        subparsers = parser.add_subparsers()
+        convert.add_subparser(subparsers)
+        index.add_subparser(subparsers)
+        args = parser.parse_args(arguments)
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            args.func(args)
+        return output.getvalue()
+
+    def test_index_then_convert_window(self):
+        output = self._run("index", "-I", self.infile, "--stride", "3")
+        self.assertEqual(
+            output, "Wrote 4 entries to {}\n".format(index_path(self.infile))
+        )
+
+        outfile = os.path.join(self.directory, "out.trc")
+        self._run(
+            "convert", "-I", self.infile, "-O", outfile, "--start", "35", "--end", "70"
+        )
+
+        db = trc.load_path(outfile)
+        self.assertEqual([m.arbitration_id for m in db.messages], [0x104, 0x105, 0x106])
+        # The index that was built is used rather than rebuilt
+        self.assertEqual(TimestampIndex.load(index_path(self.infile)).stride, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from canlogconvert.subparsers import split
+from canlogconvert.traces.formats import asc
+from canlogconvert.traces.formats import trc
+
+ROWS = "".join(
+    "%8d%14.3f DT %-2d%9s Rx -  1    %02X\n"
+    % (i + 1, i * 10.0, i % 2 + 1, "%04X" % (0x100 + i), i)
+    for i in range(10)
+)
+
+TRACE = (
+    u";$FILEVERSION=2.1\n"
+    u";$STARTTIME=43474.7738065227\n"
+    u";$COLUMNS=N,O,T,B,I,d,R,L,D\n"
+    u";   Start time: 2019-01-09 18:34:16.883.5\n" + ROWS
+)
+
+
+class SplitTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.infile = os.path.join(self.directory, "drive.trc")
+        with open(self.infile, "w") as fout:
+            fout.write(TRACE)
+        self.output_dir = os.path.join(self.directory, "shards")
+
+    def _split(self, *arguments):
+        parser = argparse.ArgumentParser()
+        subparsers = parser.add_subparsers()
+        split.add_subparser(subparsers)
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            args = parser.parse_args(
+                ["split", self.infile, "-O", self.output_dir] + list(arguments)
+            )
+            args.func(args)
+        return stderr.getvalue()
+
+    def _load(self, name):
+        with open(os.path.join(self.output_dir, name)) as fin:
+            return trc.load_string(fin.read())
+
+    def test_split_by_bus_and_rows(self):
+        output = self._split("--by-bus", "--rows", "3")
+        self.assertEqual(output, "Wrote 4 shards\n")
+        self.assertEqual(
+            sorted(os.listdir(self.output_dir)),
+            [
+                "drive_1_0000.trc",
+                "drive_1_0001.trc",
+                "drive_2_0000.trc",
+                "drive_2_0001.trc",
+            ],
+        )
+
+        shard = self._load("drive_2_0001.trc")
+        self.assertEqual(list(shard.messages.arbitration_ids), [0x107, 0x109])
+        self.assertEqual(list(shard.messages.buses), [2, 2])
+        self.assertEqual(list(shard.messages.timestamps), [0.0, 20.0])
+
+    def test_split_pattern_picks_format(self):
+        self._split("--rows", "6", "--pattern", "{stem}-{shard}.asc", "--start", "10")
+        self.assertEqual(
+            sorted(os.listdir(self.output_dir)), ["drive-0.asc", "drive-1.asc"]
+        )
+        with open(os.path.join(self.output_dir, "drive-1.asc")) as fin:
+            messages = asc.load_string(fin.read()).messages
+        self.assertEqual(list(messages.arbitration_ids), [0x107, 0x108, 0x109])
+
+    def test_split_needs_a_limit(self):
+        self.assertRaises(ValueError, self._split)
+        self.assertRaises(SystemExit, self._split, "--bytes", "5X")
+
+
+if __name__ == "__main__":
+    unittest.main()
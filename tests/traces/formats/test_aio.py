@@ -0,0 +1,115 @@
+import asyncio
+import socket
+import unittest
+
+from canlogconvert.traces.formats import asc
+from canlogconvert.traces.formats import trc
+from canlogconvert.traces.formats.aio import read_asc
+from canlogconvert.traces.formats.aio import read_trc
+from canlogconvert.traces.formats.aio import write_trace
+
+TRC = (
+    b";$FILEVERSION=2.1\n"
+    b";$STARTTIME=43474.7738065227\n"
+    b";$COLUMNS=N,O,T,B,I,d,R,L,D\n"
+    b";   Start time: 2019-01-09 18:34:16.883.5\n"
+    b"       1        39.488 DT 1      0401 Rx -  6    0A 00 66 98 0B 00\n"
+    b"       2        40.012 DT 2  18FEF100 Tx -  0\n"
+    b"       3        41.100 DT 1      0100 Rx -  2    FF 01"
+)
+
+ASC = (
+    b"date Wed Jan 09 06:34:16.883 pm 2019\n"
+    b"base hex  timestamps absolute\n"
+    b"   0.039488 1  401             Rx   d 6 0A 00 66 98 0B 00\n"
+    b"   0.040012 2  18FEF100x       Tx   d 0\n"
+    b"   0.041100 1  100             Rx   d 2 FF 01\n"
+)
+
+
+def _as_tuples(messages):
+    return [
+        (
+            round(float(m.timestamp), 3),
+            m.arbitration_id,
+            m.dlc,
+            m.direction,
+            bytes(m.data),
+        )
+        for m in messages
+    ]
+
+
+async def _feed(reader, data, chunk_size):
+    # Split the data anywhere, including within lines
+    for start in range(0, len(data), chunk_size):
+        reader.feed_data(data[start : start + chunk_size])
+        await asyncio.sleep(0)
+    reader.feed_eof()
+
+
+async def _read(read, data, chunk_size=7):
+    reader = asyncio.StreamReader()
+    feeder = asyncio.ensure_future(_feed(reader, data, chunk_size))
+    trace = read(reader, read_size=5)
+    header = await trace.read_header()
+    messages = [message async for message in trace]
+    await feeder
+    return header, trace.start_timestamp, messages
+
+
+class AioTest(unittest.TestCase):
+    def test_read_trc(self):
+        header, start_timestamp, messages = asyncio.run(_read(read_trc, TRC))
+        self.assertEqual(header["FileVersion"], "2.1")
+        self.assertEqual(start_timestamp, "2019-01-09 18:34:16.883.5")
+        self.assertEqual(
+            _as_tuples(messages),
+            _as_tuples(trc.load_string(TRC.decode("ascii")).messages),
+        )
+        self.assertEqual([m.bus_number for m in messages], [1, 2, 1])
+
+    def test_read_asc(self):
+        header, start_timestamp, messages = asyncio.run(_read(read_asc, ASC))
+        self.assertEqual(header["base"], "hex")
+        self.assertEqual(start_timestamp, "2019-01-09 18:34:16.883.0")
+        self.assertEqual(
+            _as_tuples(messages),
+            _as_tuples(asc.load_string(ASC.decode("ascii")).messages),
+        )
+
+    def test_concurrent_feeds(self):
+        async def read_all():
+            return await asyncio.gather(
+                *[_read(read_trc, TRC, chunk_size) for chunk_size in range(1, 41)]
+            )
+
+        expected = _as_tuples(trc.load_string(TRC.decode("ascii")).messages)
+        for header, start_timestamp, messages in asyncio.run(read_all()):
+            self.assertEqual(_as_tuples(messages), expected)
+
+    def test_write_trace(self):
+        async def forward():
+            # Write the trace to one of a connected pair of sockets
+            sender, receiver = socket.socketpair()
+            _, writer = await asyncio.open_connection(sock=sender)
+            output_reader, _ = await asyncio.open_connection(sock=receiver)
+
+            reader = asyncio.StreamReader()
+            feeder = asyncio.ensure_future(_feed(reader, TRC, 16))
+            count = await write_trace(read_trc(reader), writer, trc.TrcWriter)
+            writer.close()
+            await writer.wait_closed()
+            await feeder
+            return count, await output_reader.read()
+
+        count, output = asyncio.run(forward())
+        self.assertEqual(count, 3)
+        self.assertEqual(
+            _as_tuples(trc.load_string(output.decode("ascii")).messages),
+            _as_tuples(trc.load_string(TRC.decode("ascii")).messages),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,316 @@
+import io
+import unittest
+
+from canlogconvert.traces.formats.asc import AscWriter
+from canlogconvert.traces.formats.asc import iter_messages
+from canlogconvert.traces.formats.asc import load_file
+from canlogconvert.traces.formats.asc import load_string
+from canlogconvert.traces.formats.internal_trace import ColumnarMessages
+from canlogconvert.traces.formats.internal_trace import InternalTrace
+from canlogconvert.traces.formats.internal_trace import InternalMessage
+from canlogconvert.traces.formats.internal_trace import InternalMessageDirection
+from canlogconvert.traces.formats.internal_trace import InternalMessageType
+from canlogconvert.traces.formats.internal_trace import MessageFilter
+
+
+class AscTest(unittest.TestCase):
+    def test_asc_writer_matches_as_asc_string(self):
+        messages = [
+            InternalMessage(
+                arbitration_id=0x401,
+                data=bytearray([0x0A, 0x00, 0x66, 0x98, 0x0B, 0x00]),
+                dlc=6,
+                direction=InternalMessageDirection.RX,
+                timestamp="39.488",
+            ),
+            InternalMessage(
+                arbitration_id=0x4A7,
+                data=bytearray(),
+                dlc=0,
+                direction=InternalMessageDirection.TX,
+                timestamp="40.012",
+            ),
+        ]
+        internal_trace = InternalTrace(
+            messages=messages, start_timestamp="2019-01-09 18:34:16.883.5"
+        )
+
+        output = io.StringIO()
+        with AscWriter(output, internal_trace.start_timestamp) as writer:
+            writer.write_messages(internal_trace.messages)
+
+        self.assertEqual(output.getvalue(), internal_trace.as_asc_string() + "\n")
+
+    def test_asc_writer_error_and_remote_frames(self):
+        # Error and remote frames are written without their data
+        messages = ColumnarMessages()
+        messages.append_row(
+            42.0,
+            0,
+            5,
+            InternalMessageDirection.RX,
+            InternalMessageType.ER,
+            1,
+            b"\x01\x02\x03\x04\x05",
+        )
+        messages.append_row(
+            43.0,
+            0x402,
+            2,
+            InternalMessageDirection.TX,
+            InternalMessageType.RR,
+            2,
+            b"\xff\x01",
+        )
+        messages.append_row(
+            43.25,
+            0x7FF,
+            1,
+            InternalMessageDirection.TX,
+            InternalMessageType.DT,
+            1,
+            b"\x0a",
+        )
+        internal_trace = InternalTrace(
+            messages=messages, start_timestamp="2019-01-09 18:34:16.883.5"
+        )
+        expected = internal_trace.as_asc_string() + "\n"
+        self.assertIn("   0.042000 1  ErrorFrame\n", expected)
+        self.assertIn("   0.043000 2  402             Tx   r 2\n", expected)
+
+        for source in (messages, list(messages)):
+            output = io.StringIO()
+            with AscWriter(output, internal_trace.start_timestamp) as writer:
+                writer.write_messages(source)
+            self.assertEqual(output.getvalue(), expected)
+
+    def test_asc_writer_can_fd(self):
+        message = InternalMessage(
+            arbitration_id=0x18FEF100,
+            data=bytearray(range(12)),
+            dlc=9,
+            direction=InternalMessageDirection.TX,
+            timestamp=41.1,
+        )
+        message.message_type = InternalMessageType.FB
+        message.bus_number = 2
+        internal_trace = InternalTrace(
+            messages=[message], start_timestamp="2019-01-09 18:34:16.883.5"
+        )
+
+        output = io.StringIO()
+        with AscWriter(output, internal_trace.start_timestamp) as writer:
+            writer.write_messages(internal_trace.messages)
+
+        self.assertEqual(output.getvalue(), internal_trace.as_asc_string() + "\n")
+        self.assertIn(
+            "   0.041100 CANFD   2 Tx   18FEF100x  1 0 9 12 "
+            "00 01 02 03 04 05 06 07 08 09 0A 0B\n",
+            output.getvalue(),
+        )
+        loaded = load_string(output.getvalue()).messages[0]
+        self.assertEqual(
+            (loaded.message_type, loaded.dlc, bytes(loaded.data)),
+            (InternalMessageType.FB, 9, bytes(range(12))),
+        )
+
+        # Frames whose data doesn't match their DLC are refused
+        message.dlc = 10
+        with AscWriter(io.StringIO()) as writer:
+            self.assertRaises(ValueError, writer.write_messages, [message])
+
+    def test_asc_writer(self):
+        messages = ColumnarMessages()
+        rows = [
+            (39.488, 0x401, 6, InternalMessageDirection.RX, InternalMessageType.DT),
+            (
+                40.012,
+                0x18FEF100,
+                0,
+                InternalMessageDirection.TX,
+                InternalMessageType.DT,
+            ),
+            (41.1, 0x402, 8, InternalMessageDirection.RX, InternalMessageType.RR),
+            (41.5, 0, 0, InternalMessageDirection.RX, InternalMessageType.ST),
+            (42.0, 0, 0, InternalMessageDirection.RX, InternalMessageType.ER),
+            (43.25, 0x7FF, 2, InternalMessageDirection.TX, InternalMessageType.DT),
+        ]
+        payloads = [b"\x0a\x00\x66\x98\x0b\x00", b"", b"", b"", b"", b"\xff\x01"]
+        for (timestamp, arbitration_id, dlc, direction, message_type), data in zip(
+            rows, payloads
+        ):
+            messages.append_row(
+                timestamp, arbitration_id, dlc, direction, message_type, 1, data
+            )
+        internal_trace = InternalTrace(
+            messages=messages, start_timestamp="2019-01-09 18:34:16.883.5"
+        )
+
+        expected = """\
+date Wed Jan 09 06:34:16.883 pm 2019
+base hex  timestamps absolute
+no internal events logged
+// version 7.0.0
+Begin Triggerblock Wed Jan 09 06:34:16.883 pm 2019
+   0.000000 Start of measurement
+   0.039488 1  401             Rx   d 6 0A 00 66 98 0B 00
+   0.040012 1  18FEF100x       Tx   d 0
+   0.041100 1  402             Rx   r 8
+   0.042000 1  ErrorFrame
+   0.043250 1  7FF             Tx   d 2 FF 01
+End TriggerBlock
+"""
+        self.assertEqual(internal_trace.as_asc_string() + "\n", expected)
+
+        # Columns, and messages in batches of varying size
+        for source in (messages, list(messages)):
+            for buffer_size in (1, 4, 4096):
+                output = io.StringIO()
+                with AscWriter(
+                    output, internal_trace.start_timestamp, buffer_size=buffer_size
+                ) as writer:
+                    writer.write_messages(source)
+                self.assertEqual(writer.count, 6)
+                self.assertEqual(output.getvalue(), expected)
+
+        # The output can be read back
+        db = load_string(expected)
+        self.assertEqual(db.start_timestamp, "2019-01-09 18:34:16.883.0")
+        self.assertEqual(
+            list(db.messages.arbitration_ids), [0x401, 0x18FEF100, 0x402, 0, 0x7FF]
+        )
+        self.assertEqual(bytes(db.messages.payload), b"".join(payloads))
+
+    def test_iter_messages(self):
+        input_string = """\
+date Wed Jan 09 06:34:16.883 pm 2019
+base hex  timestamps absolute
+no internal events logged
+// version 7.0.0
+Begin Triggerblock Wed Jan 09 06:34:16.883 pm 2019
+   0.000000 Start of measurement
+   0.039488 1  401             Rx   d 6 0A 00 66 98 0B 00
+   0.040012 2  18FEF100x       Tx   d 0
+   0.041100 1  402             Rx   r
+   0.041500 1  Statistic: D 0 R 0 XD 0 XR 0 E 0 O 0 B 0.00%
+   0.042000 1  ErrorFrame
+End TriggerBlock
+"""
+
+        def as_tuples(messages):
+            return [
+                (
+                    round(m.timestamp, 3),
+                    m.bus,
+                    m.arbitration_id,
+                    m.direction,
+                    m.message_type,
+                    m.dlc,
+                    bytes(m.data),
+                )
+                for m in messages
+            ]
+
+        expected = [
+            (
+                39.488,
+                1,
+                0x401,
+                InternalMessageDirection.RX,
+                InternalMessageType.DT,
+                6,
+                b"\x0a\x00\x66\x98\x0b\x00",
+            ),
+            (
+                40.012,
+                2,
+                0x18FEF100,
+                InternalMessageDirection.TX,
+                InternalMessageType.DT,
+                0,
+                b"",
+            ),
+            (
+                41.1,
+                1,
+                0x402,
+                InternalMessageDirection.RX,
+                InternalMessageType.RR,
+                0,
+                b"",
+            ),
+            (42.0, 1, 0, InternalMessageDirection.RX, InternalMessageType.ER, 0, b""),
+        ]
+
+        self.assertEqual(as_tuples(iter_messages(io.StringIO(input_string))), expected)
+        self.assertEqual(
+            as_tuples(iter_messages(input_string.encode("ascii"))), expected
+        )
+        self.assertEqual(as_tuples(load_string(input_string).messages), expected)
+
+        db = load_file(io.StringIO(input_string))
+        self.assertEqual(db.start_timestamp, "2019-01-09 18:34:16.883.0")
+
+        message_filter = MessageFilter(directions=[InternalMessageDirection.TX])
+        messages = iter_messages(
+            io.StringIO(input_string), message_filter=message_filter
+        )
+        self.assertEqual(as_tuples(messages), expected[1:2])
+
+    def test_iter_messages_decimal_relative(self):
+        input_string = """\
+date Wed Jan 9 18:34:16 2019
+base dec  timestamps relative
+   0.500000 1  1025            Rx   d 2 10 255
+   0.250000 1  1026            Tx   d 1 7
+"""
+
+        messages = list(iter_messages(io.StringIO(input_string)))
+        self.assertEqual([m.timestamp for m in messages], [500.0, 750.0])
+        self.assertEqual([m.arbitration_id for m in messages], [0x401, 0x402])
+        self.assertEqual(messages[0].data, bytearray([10, 255]))
+        self.assertEqual(
+            load_file(io.StringIO(input_string)).start_timestamp,
+            "2019-01-09 18:34:16.000.0",
+        )
+
+    def test_iter_messages_can_fd(self):
+        input_string = """\
+date Wed Jan 09 06:34:16.883 pm 2019
+base hex  timestamps absolute
+   0.039488 1  401             Rx   d 6 0A 00 66 98 0B 00 Length = 1 BitCount = 2
+   0.043000 CANFD   1 Rx        403  1 0 9 12 01 02 03 04 05 06 07 08 09 0A 0B 0C 0 0 1000 0
+   0.044000 CANFD   2 Tx   18FEF100x  Name 0 1 2 2 AA BB
+   0.045000 CANFD   1 Rx ErrorFrame
+"""
+
+        messages = list(iter_messages(io.StringIO(input_string)))
+        self.assertEqual(
+            [(m.bus, m.arbitration_id, m.message_type, m.dlc) for m in messages],
+            [
+                (1, 0x401, InternalMessageType.DT, 6),
+                (1, 0x403, InternalMessageType.FB, 9),
+                (2, 0x18FEF100, InternalMessageType.FE, 2),
+                (1, 0, InternalMessageType.ER, 0),
+            ],
+        )
+        self.assertEqual(messages[1].data, bytearray(range(1, 13)))
+        self.assertEqual(messages[2].data, bytearray([0xAA, 0xBB]))
+
+    def test_iter_messages_rejects_data_it_cannot_represent(self):
+        header = "base hex  timestamps absolute\n"
+        for row in [
+            # More data than a classic frame holds
+            "   0.039488 1  401             Rx   d 8 " + "00 " * 12,
+            "   0.039488 1  401             Rx   d 6 0A 00",
+            # A data length that does not match the DLC
+            "   0.043000 CANFD   1 Rx        403  1 0 9 8 " + "00 " * 8,
+            "   0.043000 CANFD   1 Rx        403  1 0 9 12 00 00",
+        ]:
+            self.assertRaises(
+                ValueError, list, iter_messages(io.StringIO(header + row + "\n"))
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+
+from canlogconvert.traces.formats.buffer import find_line_start
+from canlogconvert.traces.formats.buffer import iter_lines
+
+
+class BufferTest(unittest.TestCase):
+    def test_iter_lines(self):
+        source = b"first\nsecond\r\n\nlast"
+        for block_size in (1, 4, 1024):
+            self.assertEqual(
+                list(iter_lines(source, block_size=block_size)),
+                [b"first", b"second\r", b"", b"last"],
+            )
+
+    def test_iter_lines_range(self):
+        source = b"first\nsecond\nthird\n"
+        self.assertEqual(list(iter_lines(source, 6, 13)), [b"second"])
+
+    def test_find_line_start(self):
+        source = b"first\nsecond\nthird\n"
+        self.assertEqual(find_line_start(source, 0), 0)
+        self.assertEqual(find_line_start(source, 3), 6)
+        self.assertEqual(find_line_start(source, 6), 6)
+        self.assertEqual(find_line_start(source, 14), len(source))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import datetime
+import io
+import unittest
+
+from canlogconvert.traces.formats.cltb import CltbWriter
+from canlogconvert.traces.formats.cltb import load_buffer
+from canlogconvert.traces.formats.internal_trace import InternalMessage
+from canlogconvert.traces.formats.internal_trace import InternalMessageDirection
+
+
+class CltbTest(unittest.TestCase):
+    def setUp(self):
+        self.messages = [
+            InternalMessage(
+                arbitration_id=0x401,
+                data=bytearray([0x0A, 0x00, 0x66, 0x98, 0x0B, 0x00]),
+                dlc=6,
+                direction=InternalMessageDirection.RX,
+                timestamp="39.488",
+            ),
+            InternalMessage(
+                arbitration_id=0x18FEF100,
+                data=bytearray(),
+                dlc=0,
+                direction=InternalMessageDirection.TX,
+                timestamp="40.012",
+            ),
+            InternalMessage(
+                arbitration_id=0x4A7,
+                data=bytearray([0xFF]),
+                dlc=1,
+                direction=InternalMessageDirection.RX,
+                timestamp="41.1",
+            ),
+        ]
+
+    def _write(self, start_timestamp, buffer_size=65536, **kwargs):
+        output = io.BytesIO()
+        with CltbWriter(
+            output, start_timestamp, buffer_size=buffer_size, **kwargs
+        ) as writer:
+            writer.write_messages(self.messages)
+        return output.getvalue()
+
+    def test_round_trip(self):
+        source = self._write("2019-01-09 18:34:16.883.5", buffer_size=2)
+
+        for copy in (False, True):
+            db = load_buffer(source, copy=copy)
+            self.assertEqual(db.start_timestamp, "2019-01-09 18:34:16.883.5")
+            self.assertEqual(len(db.messages), 3)
+            for expected, message in zip(self.messages, db.messages):
+                self.assertEqual(message.arbitration_id, expected.arbitration_id)
+                self.assertEqual(bytearray(message.data), expected.data)
+                self.assertEqual(message.dlc, expected.dlc)
+                self.assertEqual(message.direction, expected.direction)
+                self.assertEqual(message.timestamp, float(expected.timestamp))
+
+    def test_start_time_and_buses(self):
+        start_time = datetime.datetime(2019, 1, 9, 18, 34, 16, 883550)
+        self.messages[1].bus_number = 3
+        db = load_buffer(self._write(None, start_time=start_time, buses=[1, 5]))
+        self.assertEqual(db.start_time, start_time)
+        self.assertEqual(db.buses, [1, 3, 5])
+
+        # Buses outside of the bitmask are collected from the messages
+        self.messages[1].bus_number = 20
+        db = load_buffer(self._write(None))
+        self.assertIsNone(db.start_time)
+        self.assertEqual(db.buses, [1, 20])
+
+    def test_empty_trace(self):
+        self.messages = []
+        db = load_buffer(self._write(None))
+        self.assertIsNone(db.start_timestamp)
+        self.assertEqual(len(db.messages), 0)
+
+    def test_invalid_file(self):
+        self.assertRaises(ValueError, load_buffer, b"TRC")
+        self.assertRaises(ValueError, load_buffer, b"\0" * 64)
+        self.assertRaises(ValueError, load_buffer, self._write(None)[:-8])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import argparse
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
+import unittest
+
+from canlogconvert.subparsers import convert
+from canlogconvert.traces.formats import compression
+
+TRC = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+       1        39.488 DT 1      0401 Rx -  6    0A 00 66 98 0B 00
+       2        40.012 DT 1      04A7 Tx -  0
+"""
+
+
+class CompressionTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _convert(self, infile, outfile):
+        parser = argparse.ArgumentParser()
+        subparsers = parser.add_subparsers()
+        convert.add_subparser(subparsers)
+        args = parser.parse_args(["convert", "-I", infile, "-O", outfile])
+        convert.convert_file(args)
+
+    def test_split_extension(self):
+        self.assertEqual(
+            compression.split_extension("logs/trace.trc.gz"),
+            ("logs/trace", ".trc", compression.GZIP),
+        )
+        self.assertEqual(
+            compression.split_extension("trace.asc.XZ"),
+            ("trace", ".asc", compression.XZ),
+        )
+        self.assertEqual(
+            compression.split_extension("trace.trc"), ("trace", ".trc", None)
+        )
+
+    def test_detect_compression_from_magic_bytes(self):
+        with gzip.open(self._path("trace.trc"), "wt") as fout:
+            fout.write(TRC)
+        with open(self._path("plain.trc"), "w") as fout:
+            fout.write(TRC)
+
+        self.assertEqual(
+            compression.detect_compression(self._path("trace.trc")), compression.GZIP
+        )
+        self.assertIsNone(compression.detect_compression(self._path("plain.trc")))
+
+    def test_convert_compressed_round_trip(self):
+        with lzma.open(self._path("trace.trc.xz"), "wt") as fout:
+            fout.write(TRC)
+        self._convert(self._path("trace.trc.xz"), self._path("trace.asc.gz"))
+        self._convert(self._path("trace.asc.gz"), self._path("plain.asc"))
+
+        with gzip.open(self._path("trace.asc.gz"), "rt") as fin:
+            compressed = fin.read()
+        with open(self._path("plain.asc")) as fin:
+            self.assertEqual(fin.read(), compressed)
+        self.assertIn("401             Rx   d 6 0A 00 66 98 0B 00", compressed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from canlogconvert.traces.formats.index import TimestampIndex
+
+
+class TimestampIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = TimestampIndex(stride=10, body_offset=100)
+        self.index.add(0.5, 100)
+        self.index.add(10.0, 400)
+        self.index.add(20.0, 700)
+
+    def test_lookup(self):
+        self.assertEqual(self.index.lookup(0.0), 100)
+        self.assertEqual(self.index.lookup(0.5), 100)
+        self.assertEqual(self.index.lookup(10.0), 100)
+        self.assertEqual(self.index.lookup(15.0), 400)
+        self.assertEqual(self.index.lookup(25.0), 700)
+
+    def test_save_and_load(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "trace.trc.idx")
+
+        self.index.save(path)
+        index = TimestampIndex.load(path)
+        self.assertEqual(index.stride, 10)
+        self.assertEqual(index.body_offset, 100)
+        self.assertEqual(list(index.timestamps), [0.5, 10.0, 20.0])
+        self.assertEqual(list(index.offsets), [100, 400, 700])
+
+        with open(path, "wb") as fout:
+            fout.write(b"TRC")
+        self.assertRaises(ValueError, TimestampIndex.load, path)
+
+
+if __name__ == "__main__":
+    unittest.main()
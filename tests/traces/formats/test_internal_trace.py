@@ -1,9 +1,19 @@
+import array
+import os
+import shutil
+import tempfile
 import unittest
 from canlogconvert.traces.formats.trc import load_string
 
+from canlogconvert.traces.formats import internal_trace
+
+from canlogconvert.traces.formats.internal_trace import ColumnarMessages
 from canlogconvert.traces.formats.internal_trace import InternalTrace
 from canlogconvert.traces.formats.internal_trace import InternalMessage
 from canlogconvert.traces.formats.internal_trace import InternalMessageDirection
+from canlogconvert.traces.formats.internal_trace import InternalMessageType
+from canlogconvert.traces.formats.internal_trace import MessageFilter
+from canlogconvert.traces.formats.internal_trace import get_template
 
 
 class TestInternalTrace(unittest.TestCase):
@@ -53,3 +63,127 @@ class TestInternalTrace(unittest.TestCase):
        2             0 DT 1      04A7 Rx -  8    00 00 00 00 00 00 00 00"""
         self.maxDiff = None
         self.assertEqual(expected, internal_trace.as_trc_string())
+
+    def test_render(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        os.environ[internal_trace.TEMPLATE_CACHE_VARIABLE] = directory
+        self.addCleanup(os.environ.pop, internal_trace.TEMPLATE_CACHE_VARIABLE)
+        internal_trace._environment.cache_clear()
+        self.addCleanup(internal_trace._environment.cache_clear)
+
+        template = get_template("asc.j2")
+        self.assertIs(template, get_template("asc.j2"))
+        # The compiled template is shared with other processes
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+        excerpts = [
+            InternalTrace(
+                messages=[
+                    InternalMessage(
+                        0x100 + index,
+                        bytearray([index]),
+                        1,
+                        InternalMessageDirection.TX,
+                        10.0 * index,
+                    )
+                ],
+                start_timestamp="2019-01-09 18:34:16.883.5",
+            )
+            for index in range(3)
+        ]
+        for excerpt in excerpts:
+            self.assertEqual(excerpt.render(template), excerpt.as_asc_string())
+            self.assertEqual(
+                excerpt.render(get_template("trc.j2")), excerpt.as_trc_string()
+            )
+
+
+class TestColumnarMessages(unittest.TestCase):
+    def test_append_and_getitem(self):
+        messages = ColumnarMessages(
+            [
+                InternalMessage(
+                    arbitration_id=0x401,
+                    data=bytearray([0x0A, 0x00, 0x66]),
+                    dlc=3,
+                    direction=InternalMessageDirection.RX,
+                    timestamp="39.488",
+                ),
+                InternalMessage(
+                    arbitration_id=0x4A7,
+                    data=bytearray(),
+                    dlc=0,
+                    direction=InternalMessageDirection.TX,
+                    timestamp="40.012",
+                ),
+            ]
+        )
+
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(list(messages.arbitration_ids), [0x401, 0x4A7])
+        self.assertEqual(list(messages.payload_offsets), [0, 3, 3])
+        self.assertEqual(messages[0].data, bytearray([0x0A, 0x00, 0x66]))
+        self.assertEqual(messages[0].timestamp, 39.488)
+        self.assertEqual(messages[0].timestamp_as_trc_string, "39.488")
+        self.assertEqual(messages[-1].direction, InternalMessageDirection.TX)
+        self.assertEqual(messages[-1].data, bytearray())
+        self.assertRaises(IndexError, messages.__getitem__, 2)
+
+    def test_setters_write_through(self):
+        payload = bytearray([0x0A, 0x00, 0x66, 0xFF])
+        messages = ColumnarMessages.from_columns(
+            memoryview(array.array("d", [39.488, 40.012])),
+            array.array("L", [0x401, 0x4A7]),
+            array.array("H", [3, 1]),
+            array.array("B", [InternalMessageDirection.RX] * 2),
+            array.array("B", [InternalMessageType.DT] * 2),
+            array.array("B", [1, 1]),
+            memoryview(bytes(payload)),
+            array.array("L", [0, 3, 4]),
+        )
+
+        message = messages[0]
+        message.timestamp = "41"
+        message.arbitration_id = 0x123
+        message.direction = InternalMessageDirection.TX
+        message.bus = 2
+        message.data = bytearray([0x01])
+        message.dlc = 1
+
+        self.assertEqual(message.timestamp, 41.0)
+        self.assertEqual(
+            (
+                messages[0].timestamp,
+                messages[0].arbitration_id,
+                messages[0].direction,
+                messages[0].bus_number,
+                messages[0].dlc,
+                bytes(messages[0].data),
+            ),
+            (41.0, 0x123, InternalMessageDirection.TX, 2, 1, b"\x01"),
+        )
+        # The payloads of the following messages are moved along
+        self.assertEqual(list(messages.payload_offsets), [0, 1, 2])
+        self.assertEqual(bytes(messages[1].data), b"\xFF")
+
+
+class TestMessageFilter(unittest.TestCase):
+    def test_accepts(self):
+        message = InternalMessage(
+            0x18FEF100, bytearray(), 0, InternalMessageDirection.TX, "1.0"
+        )
+
+        self.assertTrue(MessageFilter().accepts(message))
+        self.assertTrue(MessageFilter(arbitration_ids=[0x18FEF100]).accepts(message))
+        self.assertFalse(MessageFilter(arbitration_ids=[0x100]).accepts(message))
+        self.assertTrue(
+            MessageFilter(arbitration_ids=[0xFEF100], id_mask=0xFFFF00).accepts(message)
+        )
+        self.assertTrue(
+            MessageFilter(message_types=[InternalMessageType.DT]).accepts(message)
+        )
+        self.assertFalse(
+            MessageFilter(directions=[InternalMessageDirection.RX]).accepts(message)
+        )
+        self.assertRaises(ValueError, MessageFilter, id_mask=0xFF)
@@ -1,7 +1,22 @@
+import io
+import os
+import shutil
+import tempfile
 import unittest
 
+import pyparsing as pp
+
+from canlogconvert.traces.formats.asc import AscWriter
+from canlogconvert.traces.formats.trc import iter_messages
+from canlogconvert.traces.formats.trc import load_file
+from canlogconvert.traces.formats.trc import load_path
+from canlogconvert.traces.formats.trc import load_window
 from canlogconvert.traces.formats.trc import load_string
+from canlogconvert.traces.formats.trc import TrcFollower
+from canlogconvert.traces.formats.trc import TrcWriter
 from canlogconvert.traces.formats.internal_trace import InternalMessageDirection
+from canlogconvert.traces.formats.internal_trace import InternalMessageType
+from canlogconvert.traces.formats.internal_trace import MessageFilter
 
 
 class TrcTest(unittest.TestCase):
@@ -63,6 +78,423 @@ class TrcTest(unittest.TestCase):
 
         self.assertRaises(ValueError, load_string, input_string)
 
+    def test_iter_messages(self):
+        input_string = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+;
+;   Start time: 2019-01-09 18:34:16.883.5
+;---+--- ------+------ +- +- --+----- +- +- +--- +- -- -- -- -- -- -- --
+       1        39.488 DT 1      0401 Rx -  6    0A 00 66 98 0B 00
+; A comment between rows
+       2        40.012 DT 1      04A7 Tx -  0
+"""
+
+        messages = iter_messages(io.StringIO(input_string))
+        message = next(messages)
+        self.assertEqual(message.arbitration_id, 0x0401)
+        self.assertEqual(message.timestamp, 39.488)
+        message = next(messages)
+        self.assertEqual(message.arbitration_id, 0x04A7)
+        self.assertEqual(message.data, bytearray())
+        self.assertEqual(message.direction, InternalMessageDirection.TX)
+        self.assertRaises(StopIteration, next, messages)
+
+    def test_load_file(self):
+        input_string = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+;   Start time: 2019-01-09 18:34:16.883.5
+       1        39.488 DT 1      0401 Rx -  6    0A 00 66 98 0B 00
+"""
+
+        db = load_file(io.StringIO(input_string))
+        self.assertEqual(db.start_timestamp, "2019-01-09 18:34:16.883.5")
+        self.assertIsNone(db.buses)
+        self.assertEqual([m.dlc for m in db.messages], [6])
+
+        # The buses listed in the header's connection table
+        bus_table = u"""\
+;   Bus  Connection   Net Connection     Protocol  Bit rate
+;   3    Connection3  Untitled@pcan_usb  CAN       500 kBit/s
+;   2    Connection2  Untitled@pcan_usb  CAN       500 kBit/s
+;-------------------------------------------------------------------------------
+;   |          |       |  |    |      |  |  |    |
+"""
+        db = load_file(
+            io.StringIO(input_string.replace("       1 ", bus_table + "       1 "))
+        )
+        self.assertEqual(db.buses, [2, 3])
+
+    def test_iter_messages_fast_path_matches_grammar(self):
+        input_string = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+       1        39.488 DT 1      0401 Rx -  6    0A 00 66 98 0B 00
+       2        40.012 DT 16 18FEF100 Tx -  0
+"""
+
+        def as_tuples(messages):
+            return [
+                (m.arbitration_id, m.data, m.dlc, m.direction, m.timestamp)
+                for m in messages
+            ]
+
+        self.assertEqual(
+            as_tuples(iter_messages(io.StringIO(input_string), fast=True)),
+            as_tuples(iter_messages(io.StringIO(input_string), fast=False)),
+        )
+
+    def test_iter_messages_buffer(self):
+        input_string = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+;   Start time: 2019-01-09 18:34:16.883.5
+       1        39.488 DT 1      0401 Rx -  6    0A 00 66 98 0B 00
+; A comment between rows
+       2        40.012 DT 16 18FEF100 Tx -  0
+"""
+
+        def as_tuples(messages):
+            return [
+                (m.arbitration_id, m.data, m.dlc, m.direction, float(m.timestamp))
+                for m in messages
+            ]
+
+        expected = as_tuples(iter_messages(io.StringIO(input_string)))
+        for fast in (True, False):
+            messages = iter_messages(input_string.encode("ascii"), fast=fast)
+            self.assertEqual(as_tuples(messages), expected)
+
+        db = load_file(bytearray(input_string.encode("ascii")))
+        self.assertEqual(db.start_timestamp, "2019-01-09 18:34:16.883.5")
+        self.assertEqual(len(list(db.messages)), 2)
+
+    def test_iter_messages_lazy(self):
+        input_string = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+;   Start time: 2019-01-09 18:34:16.883.5
+       1        39.488 DT 1      0401 Rx -  6    0a 00 66 98 0B 00
+       2        40.012 DT -  18FEF100 Tx -  0
+       3        41.100 DT 2      0100 Rx -  2    FF01
+"""
+
+        def as_tuples(messages):
+            return [
+                (
+                    m.arbitration_id,
+                    m.data,
+                    m.dlc,
+                    m.direction,
+                    m.message_type,
+                    m.bus_number,
+                    float(m.timestamp),
+                )
+                for m in messages
+            ]
+
+        expected = as_tuples(iter_messages(io.StringIO(input_string), fast=False))
+        for source in (io.StringIO(input_string), input_string.encode("ascii")):
+            self.assertEqual(as_tuples(iter_messages(source, lazy=True)), expected)
+
+        # Writing the rows back out leaves their data undecoded
+        for source in (io.StringIO(input_string), input_string.encode("ascii")):
+            messages = list(iter_messages(source, lazy=True))
+            messages[1].arbitration_id = 0x401
+            output = io.StringIO()
+            with TrcWriter(output, "2019-01-09 18:34:16.883.5") as writer:
+                writer.write_messages(messages)
+            self.assertIsNone(messages[0]._data)
+            self.assertEqual(
+                output.getvalue().splitlines()[-3:],
+                load_string(input_string.replace("18FEF100", "0401"))
+                .as_trc_string()
+                .splitlines()[-3:],
+            )
+
+    def test_iter_messages_shared_payload(self):
+        input_string = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+       1        39.488 DT 1      0401 Rx -  6    0A 00 66 98 0B 00
+       2        40.012 DT 1      04A7 Tx -  0
+       3        41.100 DT 1      0100 Rx -  2    FF01
+"""
+
+        for source in (io.StringIO(input_string), input_string.encode("ascii")):
+            messages = list(iter_messages(source))
+            self.assertEqual(
+                [bytes(m.data) for m in messages],
+                [b"\x0a\x00\x66\x98\x0b\x00", b"", b"\xff\x01"],
+            )
+            # The data of every row is a view of the same decoded block
+            self.assertIs(messages[0].data.obj, messages[2].data.obj)
+
+        # A malformed payload is reported by the row it is in
+        messages = iter_messages(io.StringIO(input_string.replace("FF01", "FF0")))
+        self.assertRaises(ValueError, list, messages)
+
+        # Every byte is two digits, rather than digits run together across
+        # the separators
+        malformed = input_string.replace("FF01", "F F")
+        for source in (io.StringIO(malformed), malformed.encode("ascii")):
+            self.assertRaises(ValueError, list, iter_messages(source))
+
+    def test_iter_messages_fast_path_column_layout(self):
+        # Only the fast path supports the optional columns being left out
+        input_string = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=O,T,I,d,l,D
+        39.488 DT     0401 Rx  6    0A 00 66 98 0B 00
+"""
+
+        messages = list(iter_messages(io.StringIO(input_string)))
+        self.assertEqual(messages[0].arbitration_id, 0x0401)
+        self.assertEqual(messages[0].dlc, 6)
+        self.assertEqual(
+            messages[0].data, bytearray([0x0A, 0x00, 0x66, 0x98, 0x0B, 0x00])
+        )
+
+    def test_iter_messages_data_length_column(self):
+        # The l column holds the number of data bytes, which is mapped to the
+        # DLC of CAN FD frames
+        input_string = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,l,D
+       1        39.488 FD 1      0401 Rx - 24    %s
+       2        40.012 DT 1      04A7 Tx -  2    FF 01
+""" % " ".join(
+            ["AB"] * 24
+        )
+
+        for lazy in (False, True):
+            messages = list(iter_messages(io.StringIO(input_string), lazy=lazy))
+            self.assertEqual([m.dlc for m in messages], [12, 2])
+            self.assertEqual(bytes(messages[0].data), b"\xab" * 24)
+
+        db = load_string(input_string)
+        self.assertEqual(list(db.messages.dlcs), [12, 2])
+        self.assertIn(" FD 1      0401 Rx - 12    AB AB ", db.as_trc_string())
+        output = io.StringIO()
+        with AscWriter(output, db.start_timestamp) as writer:
+            writer.write_messages(db.messages)
+        self.assertIn(" 0 0 C 24 AB AB ", output.getvalue())
+
+        # Lengths that no DLC stands for
+        messages = iter_messages(io.StringIO(input_string.replace(" 24 ", " 10 ")))
+        self.assertRaises(ValueError, list, messages)
+
+    def test_iter_messages_malformed_row(self):
+        # Rows the fast path rejects are reported by the grammar
+        input_string = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+       1        39.488 XX 1      0401 Rx -  6    0A 00 66 98 0B 00
+"""
+
+        messages = iter_messages(io.StringIO(input_string))
+        self.assertRaises(pp.ParseException, list, messages)
+
+    def test_iter_messages_unsupported_version_1_1(self):
+        input_string = u"""\
+;$FILEVERSION=1.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+"""
+
+        self.assertRaises(ValueError, iter_messages, io.StringIO(input_string))
+
+    def test_trc_writer_matches_as_trc_string(self):
+        input_string = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+;   Start time: 2019-01-09 18:34:16.883.5
+       1        39.488 DT 1      0401 Rx -  6    0A 00 66 98 0B 00
+       2        40.012 DT 1      04A7 Tx -  0
+       3        41.100 DT 1      0100 Rx -  1    FF
+"""
+        db = load_string(input_string)
+
+        output = io.StringIO()
+        with TrcWriter(output, db.start_timestamp, buffer_size=2) as writer:
+            writer.write_messages(db.messages)
+
+        self.maxDiff = None
+        self.assertEqual(writer.count, 3)
+        self.assertEqual(output.getvalue(), db.as_trc_string() + "\n")
+
+    def test_trc_writer_collects_buses(self):
+        input_string = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+       1        39.488 DT 3      0401 Rx -  6    0A 00 66 98 0B 00
+       2        40.012 DT 2      04A7 Tx -  0
+"""
+        db = load_string(input_string)
+
+        # Columns, and a one-shot iterator whose buses aren't known up front
+        for messages in (db.messages, iter(list(db.messages))):
+            output = io.StringIO()
+            with TrcWriter(output, db.start_timestamp, buffer_size=1) as writer:
+                writer.write_messages(messages)
+            self.assertEqual(output.getvalue(), db.as_trc_string() + "\n")
+            self.assertEqual(load_string(output.getvalue()).buses, [2, 3])
+            self.assertIn(";   2    Connection2  ", output.getvalue())
+
+    def test_load_path_byte_ranges(self):
+        rows = "".join(
+            "%8d%14.3f DT 1  %8X Rx -  2    %02X 00\n" % (i, i * 1.5, i, i)
+            for i in range(1, 101)
+        )
+        input_string = (
+            ";$FILEVERSION=2.1\n"
+            ";$STARTTIME=43474.7738065227\n"
+            ";$COLUMNS=N,O,T,B,I,d,R,L,D\n"
+            ";   Start time: 2019-01-09 18:34:16.883.5\n" + rows
+        )
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "trace.trc")
+        with open(path, "w") as fout:
+            fout.write(input_string)
+
+        expected = load_string(input_string)
+        for jobs in (1, 2):
+            db = load_path(path, jobs=jobs, chunk_size=256)
+            self.assertEqual(db.start_timestamp, "2019-01-09 18:34:16.883.5")
+            self.assertEqual(len(db.messages), 100)
+            self.assertEqual(db.messages.timestamps, expected.messages.timestamps)
+            self.assertEqual(
+                db.messages.arbitration_ids, expected.messages.arbitration_ids
+            )
+            self.assertEqual(db.messages.payload, expected.messages.payload)
+            self.assertEqual(
+                db.messages.payload_offsets, expected.messages.payload_offsets
+            )
+
+    def test_load_window(self):
+        rows = "".join(
+            "%8d%14.3f DT 1  %8X Rx -  1    %02X\n" % (i, i * 10.0, i, i)
+            for i in range(100)
+        )
+        input_string = (
+            ";$FILEVERSION=2.1\n"
+            ";$STARTTIME=43474.7738065227\n"
+            ";$COLUMNS=N,O,T,B,I,d,R,L,D\n" + rows
+        )
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "trace.trc")
+        with open(path, "w") as fout:
+            fout.write(input_string)
+
+        db = load_window(path, start=205.0, end=500.0, stride=8)
+        self.assertEqual(list(db.messages.arbitration_ids), list(range(21, 50)))
+        # The index is saved alongside the trace and reused
+        self.assertTrue(os.path.exists(path + ".idx"))
+        db = load_window(path, start=990.0, stride=8)
+        self.assertEqual(list(db.messages.arbitration_ids), [99])
+        db = load_window(path, end=20.0)
+        self.assertEqual(list(db.messages.arbitration_ids), [0, 1])
+
+    def test_trc_follower(self):
+        header = (
+            b";$FILEVERSION=2.1\n"
+            b";$STARTTIME=43474.7738065227\n"
+            b";$COLUMNS=N,O,T,B,I,d,R,L,D\n"
+            b";   Start time: 2019-01-09 18:34:16.883.5\n"
+        )
+        rows = [
+            b"       1        39.488 DT 1      0401 Rx -  6    0A 00 66 98 0B 00\n",
+            b"       2        40.012 DT 1      04A7 Tx -  0\n",
+            b"       3        41.100 DT 1      0402 Rx -  1    FF\n",
+        ]
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "trace.trc")
+        with open(path, "wb", buffering=0) as fout, open(path, "rb") as fin:
+            follower = TrcFollower(fin)
+            fout.write(header)
+            self.assertEqual(follower.poll(), [])
+            self.assertIsNone(follower.start_timestamp)
+
+            # The second row is only half written
+            fout.write(rows[0] + rows[1][:20])
+            messages = follower.poll()
+            self.assertEqual([m.arbitration_id for m in messages], [0x401])
+            self.assertEqual(messages[0].timestamp, 39.488)
+            self.assertEqual(follower.start_timestamp, "2019-01-09 18:34:16.883.5")
+
+            fout.write(rows[1][20:] + rows[2])
+            batches = list(follower.follow(0.1, idle_timeout=0.2, sleep=lambda _: None))
+            self.assertEqual(
+                [[m.arbitration_id for m in batch] for batch in batches],
+                [[0x4A7, 0x402]],
+            )
+            self.assertEqual(follower.position, os.path.getsize(path))
+
+    def test_iter_messages_message_filter(self):
+        input_string = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+       1        39.488 DT 1      0401 Rx -  6    0A 00 66 98 0B 00
+       2        40.012 DT 16 18FEF100 Tx -  0
+       3        41.100 RR 1      0402 Rx -  1
+       4        42.200 DT 1      0501 Tx -  1    FF
+"""
+
+        filters = [
+            (MessageFilter(arbitration_ids=[0x401, 0x18FEF100]), [1, 2]),
+            (MessageFilter(arbitration_ids=[0x400], id_mask=0x7F0), [1, 3]),
+            (MessageFilter(message_types=[InternalMessageType.RR]), [3]),
+            (MessageFilter(directions=[InternalMessageDirection.TX]), [2, 4]),
+            (
+                MessageFilter(
+                    arbitration_ids=[0x400],
+                    id_mask=0x700,
+                    message_types=[InternalMessageType.DT],
+                    directions=[InternalMessageDirection.RX],
+                ),
+                [1],
+            ),
+        ]
+        numbers = {0x401: 1, 0x18FEF100: 2, 0x402: 3, 0x501: 4}
+        for message_filter, expected in filters:
+            for fast in (True, False):
+                for source in (io.StringIO(input_string), input_string.encode("ascii")):
+                    messages = iter_messages(
+                        source, fast=fast, message_filter=message_filter
+                    )
+                    self.assertEqual(
+                        [numbers[m.arbitration_id] for m in messages], expected
+                    )
+
+            db = load_string(input_string)
+            self.assertEqual(
+                [
+                    numbers[m.arbitration_id]
+                    for m in db.messages
+                    if message_filter.accepts(m)
+                ],
+                expected,
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
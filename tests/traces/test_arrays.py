@@ -0,0 +1,76 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from canlogconvert.traces.formats import cltb
+from canlogconvert.traces.formats import trc
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TRACE = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+;   Start time: 2019-01-09 18:34:16.883.5
+       1        39.488 DT 1      0401 Rx -  6    0A 00 66 98 0B 00
+       2        40.012 DT 2  18FEF100 Tx -  0
+       3        41.100 FD 1      0100 Rx -  2    FF 01
+"""
+
+
+@unittest.skipUnless(numpy, "NumPy is not installed")
+class ArraysTest(unittest.TestCase):
+    def _assert_records(self, records):
+        self.assertEqual(list(records["timestamp"]), [39.488, 40.012, 41.1])
+        self.assertEqual(list(records["arbitration_id"]), [0x401, 0x18FEF100, 0x100])
+        self.assertEqual(list(records["dlc"]), [6, 0, 2])
+        self.assertEqual(list(records["message_type"]), [1, 1, 2])
+        self.assertEqual(list(records["direction"]), [1, 2, 1])
+        self.assertEqual(list(records["bus"]), [1, 2, 1])
+        self.assertEqual(list(records["length"]), [6, 0, 2])
+        self.assertEqual(
+            records["data"].tolist(),
+            [
+                [0x0A, 0x00, 0x66, 0x98, 0x0B, 0x00],
+                [0, 0, 0, 0, 0, 0],
+                [0xFF, 0x01, 0, 0, 0, 0],
+            ],
+        )
+
+    def test_to_numpy(self):
+        # Columnar messages, and messages that are stored in columns first
+        self._assert_records(trc.load_string(TRACE).to_numpy())
+        self._assert_records(trc.load_file(io.StringIO(TRACE)).to_numpy())
+
+        records = trc.load_string(TRACE).to_numpy(data_width=8)
+        self.assertEqual(records["data"].shape, (3, 8))
+        self.assertRaises(ValueError, trc.load_string(TRACE).to_numpy, data_width=4)
+
+    def test_to_numpy_cltb(self):
+        db = trc.load_string(TRACE)
+        output = io.BytesIO()
+        with cltb.CltbWriter(output, db.start_timestamp) as writer:
+            writer.write_messages(db.messages)
+
+        # Columns that are views of the buffer, and columns copied out of it
+        self._assert_records(cltb.load_buffer(output.getvalue()).to_numpy())
+        self._assert_records(cltb.load_buffer(output.getvalue(), copy=True).to_numpy())
+
+    def test_load_numpy(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "trace.trc")
+        with open(path, "w") as f:
+            f.write(TRACE)
+
+        self._assert_records(trc.load_numpy(path))
+        self._assert_records(trc.load_numpy(path, jobs=2, chunk_size=64))
+
+
+if __name__ == "__main__":
+    unittest.main()
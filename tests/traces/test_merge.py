@@ -0,0 +1,112 @@
+import datetime
+import io
+import unittest
+
+from canlogconvert.traces.formats import cltb
+from canlogconvert.traces.formats import trc
+from canlogconvert.traces.merge import merge
+
+FIRST = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+;   Start time: 2019-01-09 18:34:16.883.5
+       1        10.000 DT 1      0401 Rx -  1    01
+       2        20.000 DT 1      0402 Rx -  1    02
+       3        30.000 DT 1      0403 Rx -  1    03
+"""
+
+# Starts 15 ms after FIRST
+SECOND = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738066963
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+;   Start time: 2019-01-09 18:34:16.898.5
+       1         0.000 DT 2      0501 Tx -  1    11
+       2        14.000 DT 2      0502 Tx -  1    12
+"""
+
+
+class MergeTest(unittest.TestCase):
+    def _load(self, string):
+        return trc.load_file(io.StringIO(string))
+
+    def test_merge_on_absolute_time(self):
+        merged = merge([self._load(SECOND), self._load(FIRST)], buses=[4, 3])
+
+        self.assertEqual(merged.start_timestamp, "2019-01-09 18:34:16.883.5")
+        self.assertEqual(merged.buses, [3, 4])
+        self.assertEqual(
+            [
+                (m.arbitration_id, round(m.timestamp, 3), m.bus_number)
+                for m in merged.messages
+            ],
+            [
+                (0x401, 10.0, 3),
+                (0x501, 15.0, 4),
+                (0x402, 20.0, 3),
+                (0x502, 29.0, 4),
+                (0x403, 30.0, 3),
+            ],
+        )
+
+    def test_merge_keeps_bus_numbers(self):
+        merged = merge([self._load(FIRST), self._load(SECOND)])
+        self.assertIsNone(merged.buses)
+        output = io.StringIO()
+        with trc.TrcWriter(output, merged.start_timestamp) as writer:
+            writer.write_messages(merged.messages)
+
+        db = trc.load_string(output.getvalue())
+        self.assertEqual([m.bus_number for m in db.messages], [1, 2, 1, 2, 1])
+        # The header lists the buses collected from the merged messages
+        self.assertIn(";   2    Connection2  ", output.getvalue())
+
+        self.assertRaises(
+            ValueError, merge, [self._load(FIRST), self._load(SECOND)], buses=[1]
+        )
+
+    def test_merge_leaves_inputs_unchanged(self):
+        traces = []
+        for string in (FIRST, SECOND):
+            output = io.BytesIO()
+            db = trc.load_string(string)
+            with cltb.CltbWriter(
+                output, db.start_timestamp, start_time=db.start_time
+            ) as writer:
+                writer.write_messages(db.messages)
+            traces.append(cltb.load_buffer(output.getvalue()))
+
+        merged = merge(traces, buses=[4, 3])
+        self.assertEqual(
+            [(round(m.timestamp, 3), m.bus_number) for m in merged.messages],
+            [(10.0, 4), (15.0, 3), (20.0, 4), (29.0, 3), (30.0, 4)],
+        )
+
+        # The columns are still views of the loaded buffers, not copies
+        for trace in traces:
+            self.assertIsInstance(trace.messages.timestamps, memoryview)
+            self.assertIsInstance(trace.messages.buses, memoryview)
+        self.assertEqual(list(traces[1].messages.timestamps), [0.0, 14.0])
+
+    def test_trc_writer_start_time(self):
+        merged = merge([self._load(FIRST), self._load(SECOND)], buses=[1, 2])
+        output = io.StringIO()
+        with trc.TrcWriter(
+            output,
+            merged.start_timestamp,
+            start_time=merged.start_time,
+            buses=merged.buses,
+        ) as writer:
+            writer.write_messages(merged.messages)
+
+        db = trc.load_string(output.getvalue())
+        self.assertEqual(
+            db.start_time, datetime.datetime(2019, 1, 9, 18, 34, 16, 883560)
+        )
+        self.assertEqual(db.buses, [1, 2])
+        self.assertIn(";   2    Connection2  ", output.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
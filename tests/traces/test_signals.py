@@ -0,0 +1,120 @@
+import random
+import unittest
+
+from canlogconvert.traces.formats import trc
+from canlogconvert.traces.signals import BIG_ENDIAN
+from canlogconvert.traces.signals import SignalSpec
+from canlogconvert.traces.signals import extract_signals
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TRACE = u"""\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+;   Start time: 2019-01-09 18:34:16.883.5
+       1        10.000 DT 1      0100 Rx -  4    34 12 F0 FF
+       2        20.000 DT 1      0200 Rx -  2    12 34
+       3        30.000 DT 2      0100 Rx -  4    35 12 0F 80
+       4        40.000 DT 1      0100 Rx -  1    36
+"""
+
+
+def _reference(spec, data):
+    """Decode a signal bit by bit"""
+    bits = []
+    if spec.byte_order == BIG_ENDIAN:
+        position = spec.start_bit
+        for _ in range(spec.length):
+            bits.append((data[position // 8] >> (position % 8)) & 1)
+            # Move on to the next less significant bit
+            position = position - 1 if position % 8 else position + 15
+        bits.reverse()
+    else:
+        for position in range(spec.start_bit, spec.start_bit + spec.length):
+            bits.append((data[position // 8] >> (position % 8)) & 1)
+
+    raw = sum(bit << index for index, bit in enumerate(bits))
+    if spec.signed and bits[-1]:
+        raw -= 1 << spec.length
+    return raw * spec.scale + spec.offset
+
+
+@unittest.skipUnless(numpy, "NumPy is not installed")
+class SignalsTest(unittest.TestCase):
+    def test_extract_signals(self):
+        specs = [
+            SignalSpec("word", 0x100, 0, 16),
+            SignalSpec("scaled", 0x100, 16, 16, signed=True, scale=0.5, offset=1.0),
+            SignalSpec("nibble", 0x100, 4, 8, bus=2),
+            SignalSpec("motorola", 0x200, 7, 16, byte_order=BIG_ENDIAN),
+            SignalSpec("missing", 0x300, 0, 8),
+            SignalSpec("too_long", 0x100, 0, 64),
+        ]
+        signals = extract_signals(trc.load_string(TRACE), specs)
+
+        def series(name):
+            return [tuple(record) for record in signals[name].tolist()]
+
+        # Frames that are too short to hold a signal are skipped
+        self.assertEqual(series("word"), [(10.0, 0x1234), (30.0, 0x1235)])
+        self.assertEqual(series("scaled"), [(10.0, -7.0), (30.0, -16375.5)])
+        self.assertEqual(series("nibble"), [(30.0, 0x23)])
+        self.assertEqual(series("motorola"), [(20.0, 0x1234)])
+        self.assertEqual(series("missing"), [])
+        self.assertEqual(series("too_long"), [])
+
+    def test_extract_signals_matches_reference(self):
+        generator = random.Random(0)
+        payloads = [
+            bytearray(generator.getrandbits(8) for _ in range(8)) for _ in range(50)
+        ]
+        rows = "".join(
+            "%8d%14.3f DT 1      0100 Rx -  8    %s\n"
+            % (index + 1, index * 10.0, " ".join("%02X" % byte for byte in data))
+            for index, data in enumerate(payloads)
+        )
+        trace = trc.load_string(TRACE.split("       1", 1)[0] + rows)
+
+        specs = []
+        for index in range(100):
+            length = generator.randint(1, 64)
+            byte_order = generator.choice(["little_endian", BIG_ENDIAN])
+            spec = SignalSpec(
+                str(index),
+                0x100,
+                0,
+                length,
+                byte_order=byte_order,
+                signed=generator.random() < 0.5,
+            )
+            # Pick a start bit from which the signal fits in 8 bytes
+            spec.start_bit = generator.choice(
+                [
+                    start_bit
+                    for start_bit in range(64)
+                    if SignalSpec("", 0, start_bit, length, byte_order).data_length()
+                    <= 8
+                ]
+            )
+            specs.append(spec)
+
+        signals = extract_signals(trace.to_numpy(), specs)
+        for spec in specs:
+            self.assertEqual(
+                list(signals[spec.name]["value"]),
+                [_reference(spec, data) for data in payloads],
+                spec.name,
+            )
+
+    def test_signal_spec_validation(self):
+        self.assertRaises(ValueError, SignalSpec, "a", 0x100, 0, 0)
+        self.assertRaises(ValueError, SignalSpec, "a", 0x100, 0, 65)
+        self.assertRaises(ValueError, SignalSpec, "a", 0x100, 0, 8, "middle_endian")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import datetime
+import io
+import unittest
+
+from canlogconvert.traces.formats import trc
+from canlogconvert.traces.split import IdRangeKey
+from canlogconvert.traces.split import bus_key
+from canlogconvert.traces.split import split
+
+ROWS = "".join(
+    "%8d%14.3f DT %-2d%9s Rx -  1    %02X\n"
+    % (i + 1, i * 10.0, i % 2 + 1, "%04X" % (0x100 * (i % 4)), i)
+    for i in range(10)
+)
+
+TRACE = (
+    u";$FILEVERSION=2.1\n"
+    u";$STARTTIME=43474.7738065227\n"
+    u";$COLUMNS=N,O,T,B,I,d,R,L,D\n"
+    u";   Start time: 2019-01-09 18:34:16.883.5\n" + ROWS
+)
+
+
+class _ShardFile(io.StringIO):
+    def __init__(self, outputs, key, index):
+        super(_ShardFile, self).__init__()
+        self._outputs = outputs
+        self._name = (key, index)
+
+    def close(self):
+        self._outputs[self._name] = self.getvalue()
+        super(_ShardFile, self).close()
+
+
+class SplitTest(unittest.TestCase):
+    def _split(self, **options):
+        self.outputs = {}
+
+        def open_shard(key, index):
+            return trc.TrcWriter, _ShardFile(self.outputs, key, index)
+
+        trace = trc.load_file(io.StringIO(TRACE))
+        shards = split(trace, open_shard, **options)
+        return (
+            shards,
+            {name: trc.load_string(output) for name, output in self.outputs.items()},
+        )
+
+    def test_split_rows_rebases_start_time(self):
+        shards, outputs = self._split(max_rows=4)
+        self.assertEqual([shard.rows for shard in shards], [4, 4, 2])
+
+        second = outputs[(None, 1)]
+        self.assertEqual(
+            second.start_time, datetime.datetime(2019, 1, 9, 18, 34, 16, 923560)
+        )
+        self.assertEqual(second.start_timestamp, "2019-01-09 18:34:16.923.5")
+        self.assertEqual(list(second.messages.timestamps), [0.0, 10.0, 20.0, 30.0])
+        self.assertEqual(list(second.messages.payload), [4, 5, 6, 7])
+
+    def test_split_span(self):
+        shards, outputs = self._split(max_span=25.0)
+        self.assertEqual([shard.rows for shard in shards], [3, 3, 3, 1])
+
+    def test_split_by_key(self):
+        shards, outputs = self._split(key=bus_key, max_rows=3)
+        self.assertEqual(
+            [(shard.key, shard.index, shard.rows) for shard in shards],
+            [(1, 0, 3), (2, 0, 3), (1, 1, 2), (2, 1, 2)],
+        )
+        self.assertEqual(outputs[(2, 1)].buses, [2])
+        self.assertEqual(list(outputs[(2, 1)].messages.payload), [7, 9])
+
+        shards, outputs = self._split(key=IdRangeKey([(0x0, 0x1FF), (0x300, 0x3FF)]))
+        self.assertEqual(
+            sorted((shard.key, shard.rows) for shard in shards),
+            [("0-1FF", 6), ("300-3FF", 2), ("other", 2)],
+        )
+        self.assertRaises(ValueError, IdRangeKey, [(0x0, 0x1FF), (0x100, 0x3FF)])
+
+    def test_split_bytes(self):
+        # Room for the header and three rows
+        shards, outputs = self._split(max_rows=1)
+        max_bytes = len(self.outputs[(None, 0)]) + 2 * 55
+
+        shards, outputs = self._split(max_bytes=max_bytes)
+        self.assertEqual([shard.rows for shard in shards], [3, 3, 3, 1])
+        self.assertEqual(sum(shard.rows for shard in shards), 10)
+        for output in self.outputs.values():
+            self.assertLessEqual(len(output), max_bytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import io
+import json
+import unittest
+
+from canlogconvert.traces.formats import trc
+from canlogconvert.traces.formats.internal_trace import InternalMessageType
+from canlogconvert.traces.stats import ConversionStats
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ConversionStatsTest(unittest.TestCase):
+    def test_nested_phases(self):
+        clock = FakeClock()
+        stats = ConversionStats(clock=clock)
+
+        stats.start()
+        with stats.phase("write"):
+            clock.now += 1.0
+            with stats.phase("read"):
+                clock.now += 2.0
+            stats.enter("tokenize")
+            clock.now += 4.0
+            stats.switch("build")
+            clock.now += 8.0
+            stats.exit()
+            clock.now += 16.0
+        stats.stop()
+
+        self.assertEqual(
+            stats.phases, {"write": 17.0, "read": 2.0, "tokenize": 4.0, "build": 8.0}
+        )
+        self.assertEqual(stats.elapsed, 31.0)
+
+    def test_iter_messages(self):
+        input_string = """\
+;$FILEVERSION=2.1
+;$STARTTIME=43474.7738065227
+;$COLUMNS=N,O,T,B,I,d,R,L,D
+       1        39.488 DT 1      0401 Rx -  6    0A 00 66 98 0B 00
+       2        40.012 DT 1      04A7 Tx -  0
+       3        41.100 RR 1      0402 Rx -  1
+"""
+
+        for fast in (True, False):
+            stats = ConversionStats()
+            stats.input_bytes = len(input_string)
+            stats.start()
+            messages = trc.iter_messages(
+                io.StringIO(input_string), fast=fast, stats=stats
+            )
+            self.assertEqual(len(list(stats.count(messages))), 3)
+            stats.stop()
+
+            self.assertIn("read", stats.phases)
+            self.assertIn("tokenize", stats.phases)
+            self.assertEqual(
+                stats.message_types,
+                {InternalMessageType.DT: 2, InternalMessageType.RR: 1},
+            )
+
+            output = io.StringIO()
+            stats.write_json(output)
+            report = json.loads(output.getvalue())
+            self.assertEqual(report["rows"], 3)
+            self.assertEqual(report["message_types"], {"DT": 2, "RR": 1})
+            self.assertEqual(report["input_bytes"], len(input_string))
+
+        # Columns are counted without iterating over them
+        stats = ConversionStats()
+        messages = trc.load_string(input_string).messages
+        self.assertIs(stats.count(messages), messages)
+        self.assertEqual(stats.rows, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()